@@ -1,8 +1,10 @@
+import argparse
 import tkinter as tk
 from tkinter import filedialog
 import time
 #============= 系统自定义模块 =============
 from config.PATH import TSHARK_PATH, Temp_img, Temp_result_1
+from utils.result_store import ResultStore
 #=========================================
 
 '''系统核心模块调用'''
@@ -12,6 +14,12 @@ from pcap_analysis.report_generator import *
 from utils.logger import system_logger
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="步骤一：pcap 文件解析")
+    parser.add_argument('--reuse-requests', action='store_true',
+                        help="把解析出的HTTP请求（含证件图片）保存到抓包文件旁的 <抓包文件>.reqs，"
+                             "之后的运行直接复用；默认不保存")
+    opts = parser.parse_args()
+
     system_logger.info("=== 程序启动 ===")
     try:
         # 创建隐藏的根窗口
@@ -21,7 +29,7 @@ if __name__ == "__main__":
         # 弹出文件选择对话框
         input_pcap = filedialog.askopenfilename(
             title="选择PCAP文件",
-            filetypes=[("PCAP文件", "*.pcap"), ("所有文件", "*.*")]
+            filetypes=[("PCAP文件", "*.pcap *.pcapng *.pcap.gz *.pcap.zst"), ("所有文件", "*.*")]
         )
         
         # 未选择文件
@@ -37,8 +45,11 @@ if __name__ == "__main__":
         try:
             # 路径设置
             csv_output_file, image_output_dir=Temp_result_1, Temp_img
-            # 处理大文件
-            process_large_pcap(input_pcap, TSHARK_PATH, csv_output_file, image_output_dir)
+            # 处理大文件（网络流结果同时写入结果库，供Step_3关联）
+            result_store = ResultStore()
+            process_large_pcap(input_pcap, TSHARK_PATH, csv_output_file, image_output_dir,
+                               result_store=result_store, reuse_requests=opts.reuse_requests)
+            result_store.close()
         except Exception as e:
             error_msg = f"分析失败 | 错误类型: {type(e).__name__} | 原因: {str(e)}"
             print(f"❌ {error_msg}")
@@ -1,10 +1,17 @@
 import time
+import argparse
 #============= 系统自定义模块 =============
 from config.PATH import  Temp_img, Temp_result_2
-from image_ocr.parallel import optimized_parallel_process
+from image_ocr.parallel import resident_parallel_process, autotune_layout
+from utils.result_store import ResultStore
 #=========================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="步骤二：图片 OCR 识别")
+    parser.add_argument('--autotune', action='store_true',
+                        help="识别前先用校准批次比较候选进程布局，最优布局按主机缓存为默认布局")
+    opts = parser.parse_args()
+
     print(f'\n\033[1;35m╭{"─"*10} 光学字符识别(OCR)引擎 {"─"*10}╮')
     print(f'│            🎯 正在处理图片数据            │')
     print(f'╰{"─"*43}╯\033[0m')
@@ -15,11 +22,17 @@ if __name__ == "__main__":
         input_folder = Temp_img
         output_path = Temp_result_2
 
-        # 执行处理
-        result_df = optimized_parallel_process(input_folder, num_processes=8)
+        # 自动调优进程布局（python Step_2.py --autotune，结果按主机缓存）
+        if opts.autotune:
+            autotune_layout(input_folder)
 
-        # 保存结果
-        result_df.to_csv(output_path, index=False)
+        # 执行处理（进程数×线程数按物理核心与本机调优结果确定）
+        # 识别结果随批次完成写入结果库，供Step_3关联
+        result_store = ResultStore()
+        # 结果按记录批次写出（格式按扩展名推断，.parquet/.arrow为列式文件）
+        result_df = resident_parallel_process(input_folder, result_store=result_store,
+                                              output_path=output_path)
+        result_store.close()
 
         # 输出统计信息
         elapsed_time = time.time() - start_time
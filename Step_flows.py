@@ -0,0 +1,108 @@
+import os
+import time
+import argparse
+#============= 系统自定义模块 =============
+from config.PATH import Temp_img, Temp_result_1
+from pcap_analysis.flow_index import build_flow_index, open_flow_index, reextract_flows
+from utils.result_store import ResultStore
+from utils.image_manifest import reset_manifest
+from utils.image_pack import reset_pack
+from utils.columnar import TableWriter, FLOW_COLUMNS
+#=========================================
+
+# 日志初始化
+from utils.logger import system_logger
+
+
+def load_index(pcap_file, rebuild=False):
+    """打开与抓包文件匹配的流索引，不存在（或要求重建）时先建立索引"""
+    index = None if rebuild else open_flow_index(pcap_file)
+    if index is None:
+        start_time = time.time()
+        path = build_flow_index(pcap_file)
+        print(f"已建立流索引: {path}（{time.time() - start_time:.2f}秒）")
+        index = open_flow_index(pcap_file)
+        if index is None:
+            raise RuntimeError("流索引写入失败（抓包文件所在目录与缓存目录均不可写）")
+    return index
+
+
+def print_flows(entries):
+    for entry in entries:
+        uris = ', '.join(entry['uris'][:3]) + (' ...' if len(entry['uris']) > 3 else '')
+        phones = ','.join(entry['phones']) or '-'
+        print(f"[{entry['stream_id']:>6}] {entry['src_ip']}:{entry['src_port']} -> "
+              f"{entry['dst_ip']}:{entry['dst_port']} | {entry['first_ts']:.3f}~{entry['last_ts']:.3f} | "
+              f"{entry['packets']} 包 | {phones} | {uris}")
+
+
+def extract_flows(pcap_file, entries, index, output_path, image_output_dir, result_store=None):
+    """只重新处理选中的网络流
+    参数：
+        pcap_file: 抓包文件路径
+        entries: FlowIndex.select的结果
+        index: FlowIndex
+        output_path: 结果路径（.csv/.parquet/.arrow），同Step_1的输出
+        image_output_dir: 图片输出目录（清空后重新写入图片包与清单，供Step_2识别）
+        result_store: 结果库，默认None表示不写入（写入前清空，Step_3只关联选中网络流的结果）
+    流程：
+        1. 按索引中的偏移直接读取选中网络流的数据包，逐流重组并提取敏感信息、输出证件图片
+        2. 结果写入结果文件，并按手机号upsert到结果库
+    返回：
+        网络流结果数
+    """
+    os.makedirs(image_output_dir, exist_ok=True)
+    reset_manifest(image_output_dir)
+    reset_pack(image_output_dir)
+    if result_store is not None:
+        result_store.reset()
+    infos = [info for _, info in reextract_flows(pcap_file, index, entries, image_output_dir)]
+    if result_store is not None:
+        result_store.upsert_flows(infos)
+    with TableWriter(output_path, FLOW_COLUMNS) as writer:
+        writer.write_rows(infos)
+    return len(infos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="网络流索引：建立索引后按手机号或流ID只重新处理选中的网络流")
+    parser.add_argument('command', choices=['index', 'list', 'extract'],
+                        help="index: 建立/重建索引；list: 列出匹配的网络流；extract: 重新处理匹配的网络流")
+    parser.add_argument('pcap_file', help="抓包文件路径（pcap/pcapng，未压缩）")
+    parser.add_argument('--phone', action='append', default=[], help="手机号（可重复指定）")
+    parser.add_argument('--stream', action='append', type=int, default=[], help="流ID（tcp.stream，可重复指定）")
+    parser.add_argument('--uri', default=None, help="URI前缀")
+    parser.add_argument('--output', default=Temp_result_1, help="结果路径（.csv/.parquet/.arrow）")
+    parser.add_argument('--images', default=Temp_img, help="图片输出目录")
+    parser.add_argument('--no-store', action='store_true', help="不写入分步流程结果库")
+    opts = parser.parse_args()
+
+    system_logger.info(f"=== 流索引 {opts.command} 启动 ===")
+    try:
+        start_time = time.time()
+        index = load_index(opts.pcap_file, rebuild=opts.command == 'index')
+        if opts.command == 'index':
+            print(f"共索引 {len(index.select())} 个网络流")
+        else:
+            if opts.command == 'extract' and not (opts.phone or opts.stream or opts.uri):
+                parser.error("extract 需要指定 --phone、--stream 或 --uri")
+            entries = index.select(opts.phone, opts.stream, opts.uri)
+            if opts.command == 'list':
+                print_flows(entries)
+                print(f"匹配 {len(entries)} 个网络流")
+            else:
+                result_store = None if opts.no_store else ResultStore()
+                try:
+                    count = extract_flows(opts.pcap_file, entries, index, opts.output, opts.images,
+                                          result_store)
+                finally:
+                    if result_store is not None:
+                        result_store.close()
+                print(f"重新处理 {len(entries)} 个网络流，输出 {count} 条结果到 {opts.output}")
+        index.close()
+        print(f"总耗时: {time.time() - start_time:.2f}秒")
+        exit(0)
+    except Exception as e:
+        system_logger.critical(f"流索引流程异常: {str(e)}", exc_info=True)
+        print(f"❌ 处理失败 | 错误类型: {type(e).__name__} | 原因: {str(e)}")
+        exit(1)
@@ -0,0 +1,93 @@
+import os
+import time
+import tkinter as tk
+from tkinter import filedialog
+from multiprocessing import Manager
+#============= 系统自定义模块 =============
+from config.PATH import TSHARK_PATH, Final_result
+from pcap_analysis.report_generator import process_large_pcap
+from pcap_analysis.image_sink import SharedMemoryImageSink
+from image_ocr.ocr_service import OcrService
+from image_ocr.ocr_cache import OcrCache
+from image_ocr.process_utils import ResultJoiner
+from utils.shared_frames import SharedFramePool
+from utils.columnar import TableWriter, RESULT_COLUMNS
+#=========================================
+
+# 日志初始化
+from utils.logger import system_logger
+
+# 共享内存帧池配置（每个OCR进程4个在途槽位，单槽8MB，超出的图像随队列序列化传递）
+FRAME_SLOTS_PER_WORKER = 4
+FRAME_SLOT_SIZE = 8 * 1024 * 1024
+
+
+def run_fused_pipeline(input_pcap, output_path, num_ocr_workers=None, use_cache=True):
+    """一体化流水线：pcap解析与OCR识别并行，结果在内存中关联
+    参数：
+        input_pcap: PCAP文件路径
+        output_path: 最终结果路径（.csv/.parquet/.arrow）
+        num_ocr_workers: OCR进程数 (None表示按CPU核心数自动计算)
+        use_cache: 是否使用持久化识别结果缓存
+    流程：
+        1. 启动常驻OCR进程，经有界共享内存帧池接收裁剪图
+        2. process_flow裁剪出的证件图直接写入帧池（不编码JPEG、不落盘）
+        3. OCR结果随完成随时按手机号累积到ResultJoiner
+        4. pcap阶段结束后等待在途图片识别完成，内连接输出最终结果
+    """
+    num_ocr_workers = num_ocr_workers or max(2, (os.cpu_count() or 4) // 2)
+    joiner = ResultJoiner()
+
+    with Manager() as manager, SharedFramePool(
+            manager, num_ocr_workers * FRAME_SLOTS_PER_WORKER, FRAME_SLOT_SIZE) as frames:
+        service = OcrService(
+            frames.channel, manager.Queue(), num_ocr_workers,
+            on_result=lambda meta, number, validated: joiner.add_card(
+                meta['phone'], meta['card_type'], number, validated),
+            cache=OcrCache() if use_cache else None
+        )
+        service.start()
+        try:
+            flow_results = process_large_pcap(
+                input_pcap, TSHARK_PATH, csv_output_file=None,
+                image_output_dir=SharedMemoryImageSink(frames.channel)
+            )
+        finally:
+            service.stop()
+        joiner.add_flows(flow_results)
+        print(f"识别图片 {service.recognized} 张")
+
+    # 输出最终结果（按记录批次写出，格式按扩展名推断）
+    with TableWriter(output_path, RESULT_COLUMNS) as writer:
+        writer.write_rows(joiner.rows())
+    return writer.rows
+
+
+if __name__ == "__main__":
+    system_logger.info("=== 一体化流程启动 ===")
+    try:
+        # 创建隐藏的根窗口并选择文件
+        root = tk.Tk()
+        root.withdraw()
+        input_pcap = filedialog.askopenfilename(
+            title="选择PCAP文件",
+            filetypes=[("PCAP文件", "*.pcap *.pcapng *.pcap.gz *.pcap.zst"), ("所有文件", "*.*")]
+        )
+        root.destroy()
+        if not input_pcap:
+            print("未选择文件，程序退出")
+            exit(1)
+
+        print('\n\033[1;36m╔══════════════════════════════════╗')
+        print(f'║    🚀 一体化分析（解析 + OCR）   ║')
+        print('╚══════════════════════════════════╝\033[0m')
+
+        start_time = time.time()
+        rows = run_fused_pipeline(input_pcap, Final_result)
+        print(f"\n处理完成！共输出 {rows} 条记录，结果已保存到 {Final_result}")
+        print(f"总耗时: {time.time() - start_time:.2f}秒")
+        exit(0)
+    except Exception as e:
+        system_logger.critical(f"一体化流程异常: {str(e)}", exc_info=True)
+        print(f"❌ 分析失败 | 错误类型: {type(e).__name__} | 原因: {str(e)}")
+        exit(1)
@@ -0,0 +1,104 @@
+import os
+import time
+import argparse
+from multiprocessing import Manager
+#============= 系统自定义模块 =============
+from config.PATH import Final_result
+from pcap_analysis.live_stream import stream_capture, DEFAULT_IDLE_TIMEOUT
+from pcap_analysis.image_sink import SharedMemoryImageSink
+from image_ocr.ocr_service import OcrService
+from image_ocr.ocr_cache import OcrCache
+from image_ocr.process_utils import StreamJoiner
+from utils.shared_frames import SharedFramePool
+from utils.columnar import TableWriter, RESULT_COLUMNS
+#=========================================
+
+# 日志初始化
+from utils.logger import system_logger
+
+# 共享内存帧池配置（同一体化流程）
+FRAME_SLOTS_PER_WORKER = 4
+FRAME_SLOT_SIZE = 8 * 1024 * 1024
+
+
+def run_stream_pipeline(source, output_path, num_ocr_workers=None, use_cache=True,
+                        idle_timeout=DEFAULT_IDLE_TIMEOUT, follow=True, follow_idle=None,
+                        settle=10.0, stop_event=None):
+    """流式流水线：跟随抓包输入，流结束后立即解析、识别并追加输出结果
+    参数：
+        source: 抓包文件路径（跟随文件增长）、FIFO路径或'-'（标准输入）
+        output_path: 结果路径（.csv/.parquet/.arrow）；CSV每秒刷新，可边写边读
+        num_ocr_workers: OCR进程数 (None表示按CPU核心数自动计算)
+        use_cache: 是否使用持久化识别结果缓存
+        idle_timeout: 连接空闲超时（秒）
+        follow/follow_idle: 普通文件的跟随方式（见live_stream.CaptureFollower）
+        settle: 证件号码不全时等待更新的时间（秒，见StreamJoiner）
+        stop_event: threading.Event，置位后停止（None表示直到输入结束或Ctrl+C）
+    流程：
+        1. 启动常驻OCR进程，经有界共享内存帧池接收裁剪图（同一体化流程）
+        2. live_stream.stream_capture增量解析输入，每个TCP连接结束（FIN/RST/空闲超时）后
+           立即由进程池执行process_flow，证件图直接写入帧池
+        3. 网络流结果与OCR结果随到随关联，可输出的行每秒追加写出
+        4. 输入结束后等待在途图片识别完成，输出剩余的关联结果
+    返回：
+        输出的记录数
+    """
+    num_ocr_workers = num_ocr_workers or max(2, (os.cpu_count() or 4) // 2)
+    joiner = StreamJoiner(settle=settle)
+
+    with Manager() as manager, SharedFramePool(
+            manager, num_ocr_workers * FRAME_SLOTS_PER_WORKER, FRAME_SLOT_SIZE) as frames, \
+            TableWriter(output_path, RESULT_COLUMNS) as writer:
+        service = OcrService(
+            frames.channel, manager.Queue(), num_ocr_workers,
+            on_result=lambda meta, number, validated: joiner.add_card(
+                meta['phone'], meta['card_type'], number, validated),
+            cache=OcrCache() if use_cache else None
+        )
+
+        def flush():
+            writer.write_rows(joiner.ready_rows())
+            writer.flush()
+
+        service.start()
+        try:
+            stream_capture(source, SharedMemoryImageSink(frames.channel),
+                           on_flow=lambda flow_key, info: joiner.add_flows([info]),
+                           on_tick=flush, idle_timeout=idle_timeout, follow=follow,
+                           follow_idle=follow_idle, stop_event=stop_event)
+        finally:
+            service.stop()
+        writer.write_rows(joiner.ready_rows(final=True))
+        print(f"识别图片 {service.recognized} 张")
+    return writer.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流式分析：跟随增长中的抓包文件，或从标准输入/FIFO读取")
+    parser.add_argument('source', help="抓包文件路径、FIFO路径，或 - 表示标准输入"
+                                       "（如 tcpdump -U -w - | python Step_stream.py -）")
+    parser.add_argument('--output', default=Final_result, help="结果路径（.csv/.parquet/.arrow）")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="连接空闲超时（秒）")
+    parser.add_argument('--no-follow', action='store_true', help="普通文件读到当前末尾即结束")
+    parser.add_argument('--follow-idle', type=float, default=None,
+                        help="文件连续多少秒没有增长即结束（默认一直跟随，Ctrl+C结束）")
+    parser.add_argument('--ocr-workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true', help="不使用OCR识别结果缓存")
+    opts = parser.parse_args()
+
+    system_logger.info("=== 流式流程启动 ===")
+    print('\n\033[1;36m╔══════════════════════════════════╗')
+    print(f'║    🚀 流式分析（解析 + OCR）     ║')
+    print('╚══════════════════════════════════╝\033[0m')
+    try:
+        start_time = time.time()
+        rows = run_stream_pipeline(opts.source, opts.output, opts.ocr_workers, not opts.no_cache,
+                                   opts.idle_timeout, not opts.no_follow, opts.follow_idle)
+        print(f"\n处理完成！共输出 {rows} 条记录，结果已保存到 {opts.output}")
+        print(f"总耗时: {time.time() - start_time:.2f}秒")
+        exit(0)
+    except Exception as e:
+        system_logger.critical(f"流式流程异常: {str(e)}", exc_info=True)
+        print(f"❌ 分析失败 | 错误类型: {type(e).__name__} | 原因: {str(e)}")
+        exit(1)
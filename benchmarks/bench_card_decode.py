@@ -0,0 +1,149 @@
+"""
+证件照片解码基准
+
+用法:
+    python -m benchmarks.bench_card_decode [--folder 照片目录] [--synthetic 20] [--repeat 3]
+
+对一组大尺寸JPEG（指定目录中的*.jpg/*.jpeg，或生成的4000x3000合成照片，
+其中一半带重启标记），分别按银行卡/身份证裁剪参数对比：
+    旧版：全分辨率cv2.imdecode + 按比例裁剪 + 缩放到OCR输入尺度
+    新版：card_decoder.decode_card_region（按头部尺寸缩小解码，带重启标记时只解码裁剪条带）
+输出每张图片的中位耗时、各自独立子进程中的峰值RSS，以及两者裁剪图的平均像素差
+"""
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+import cv2
+import numpy as np
+#============= 系统自定义模块 =============
+from pcap_analysis.card_decoder import decode_card_region
+from pcap_analysis.flow_processor import CARD_CROP_PROFILES, crop_region
+#=========================================
+
+try:
+    import resource  # 仅Unix
+except ImportError:
+    resource = None
+try:
+    import psutil  # 可选依赖：Windows上读取峰值工作集
+except ImportError:
+    psutil = None
+
+
+def legacy_decode(data, profile):
+    """旧版实现（仅用于对比）：全分辨率解码后裁剪，再缩放到与新版相同的输出宽度"""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    crop = crop_region(img, *profile['box'], color=profile['color'])
+    if crop.shape[1] > profile['max_width']:
+        height = max(1, round(crop.shape[0] * profile['max_width'] / crop.shape[1]))
+        crop = cv2.resize(crop, (profile['max_width'], height), interpolation=cv2.INTER_AREA)
+    return crop
+
+
+def reduced_decode(data, profile):
+    return decode_card_region(data, profile['box'], profile['color'], profile['max_width'])
+
+
+STRATEGIES = {'legacy': legacy_decode, 'reduced': reduced_decode}
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回None"""
+    try:
+        # Linux：VmHWM随exec重置（ru_maxrss会继承父进程的峰值，spawn子进程中不可用）
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), 'peak_wset', 0) / 1024 ** 2 or None
+    return None
+
+
+def run_strategy(args):
+    """子进程：按一种策略解码全部图片，返回 (每张耗时列表, 峰值RSS, 各裁剪图)"""
+    strategy, card_type, paths, repeat = args
+    decode, profile = STRATEGIES[strategy], CARD_CROP_PROFILES[card_type]
+    latencies, crops = [], []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            crop = decode(data, profile)
+            best = min(best, time.perf_counter() - start)
+        latencies.append(best)
+        crops.append(crop)
+    return latencies, peak_rss_mb(), crops
+
+
+def make_synthetic(folder, count):
+    """生成4000x3000的合成证件照片（偶数序号带重启标记）"""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        img = cv2.resize(rng.integers(0, 255, (60, 80, 3), dtype=np.uint8), (4000, 3000),
+                         interpolation=cv2.INTER_CUBIC)
+        cv2.putText(img, f"6222 0212 3456 {i:04d}", (400, 1800), cv2.FONT_HERSHEY_SIMPLEX,
+                    8, (255, 255, 255), 20)
+        params = [cv2.IMWRITE_JPEG_QUALITY, 92]
+        if i % 2 == 0:
+            params += [cv2.IMWRITE_JPEG_RST_INTERVAL, 250]
+        path = os.path.join(folder, f"card_{i:03d}.jpg")
+        cv2.imwrite(path, img, params)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="证件照片全尺寸解码 / 缩小解码对比")
+    parser.add_argument('--folder', help="JPEG照片目录（不指定时生成合成照片）")
+    parser.add_argument('--synthetic', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    opts = parser.parse_args()
+
+    work_dir = None
+    if opts.folder:
+        paths = sorted(glob.glob(os.path.join(opts.folder, '*.jp*g')))
+    else:
+        work_dir = tempfile.mkdtemp(prefix='bench_card_')
+        paths = make_synthetic(work_dir, opts.synthetic)
+    print(f"{len(paths)} 张照片")
+
+    try:
+        ctx = get_context('spawn')
+        for card_type in CARD_CROP_PROFILES:
+            results = {}
+            for strategy in STRATEGIES:
+                # 每种策略在独立子进程中运行，峰值RSS互不影响
+                with ctx.Pool(1) as pool:
+                    results[strategy] = pool.apply(run_strategy, ((strategy, card_type, paths, opts.repeat),))
+            diffs = []
+            for old, new in zip(results['legacy'][2], results['reduced'][2]):
+                if old.shape != new.shape:
+                    new = cv2.resize(new, (old.shape[1], old.shape[0]), interpolation=cv2.INTER_AREA)
+                diffs.append(float(np.abs(old.astype(np.int16) - new.astype(np.int16)).mean()))
+            print(f"[{card_type}]")
+            for strategy, (latencies, peak, _) in results.items():
+                peak_text = f"{peak:.0f} MB" if peak is not None else "未知"
+                print(f"  {strategy:>7}: {statistics.median(latencies) * 1000:.1f} ms/张 | 峰值RSS {peak_text}")
+            print(f"  平均像素差: {statistics.mean(diffs):.2f}")
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+压缩抓包文件读取基准
+
+用法:
+    python -m benchmarks.bench_compressed_capture <capture.pcap> [--frames 16] [--repeat 3]
+
+把同一抓包文件压缩为单成员gzip、多成员gzip与多帧zstd（未安装zstandard时跳过），
+每种文件分别对比：
+    先解压到磁盘：解压为临时.pcap文件后再mmap遍历数据包（原先的处理方式）
+    流式解压：iter_decompressed边解压边交给PcapStreamParser解析（同iter_capture_packets），
+              解压线程数分别为1与DECOMPRESS_WORKERS
+输出耗时、按原始大小计算的吞吐量，并校验数据包与原文件一致、capture_size与原始大小一致
+"""
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+#============= 系统自定义模块 =============
+from pcap_analysis.compressed_capture import iter_decompressed, capture_size, DECOMPRESS_WORKERS
+from pcap_analysis.pcap_reader import mapped_capture, iter_packets, PcapStreamParser
+#=========================================
+
+
+def make_variants(raw, work_dir, frames):
+    """生成压缩文件，返回 {名称: 路径}"""
+    parts = [raw[i * len(raw) // frames:(i + 1) * len(raw) // frames] for i in range(frames)]
+    variants = {
+        'gzip': gzip.compress(raw, compresslevel=6),
+        f'gzip x{frames}': b''.join(gzip.compress(part, compresslevel=6) for part in parts),
+    }
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=3)
+        variants[f'zstd x{frames}'] = b''.join(compressor.compress(part) for part in parts)
+    paths = {}
+    for i, (name, data) in enumerate(variants.items()):
+        paths[name] = os.path.join(work_dir, f'capture_{i}.pcap.cmp')
+        with open(paths[name], 'wb') as f:
+            f.write(data)
+    return paths
+
+
+def count_plain(path):
+    with mapped_capture(path) as buf:
+        return sum(1 for _ in iter_packets(buf))
+
+
+def via_disk(path, work_dir):
+    """解压到临时文件后遍历数据包"""
+    plain = os.path.join(work_dir, 'decompressed.pcap')
+    with open(plain, 'wb') as f:
+        for block in iter_decompressed(path, workers=1):
+            f.write(block)
+    try:
+        return count_plain(plain)
+    finally:
+        os.remove(plain)
+
+
+def streamed(path, workers):
+    parser = PcapStreamParser()
+    return sum(len(parser.feed(block)) for block in iter_decompressed(path, workers))
+
+
+def best_time(func, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩抓包文件：先解压到磁盘 / 流式解压 对比")
+    parser.add_argument('pcap_file')
+    parser.add_argument('--frames', type=int, default=16, help="多成员gzip/多帧zstd的分段数")
+    parser.add_argument('--repeat', type=int, default=3)
+    opts = parser.parse_args()
+
+    with open(opts.pcap_file, 'rb') as f:
+        raw = f.read()
+    size_mb = len(raw) / 1024 ** 2
+    expected = count_plain(opts.pcap_file)
+    workers = DECOMPRESS_WORKERS
+    work_dir = tempfile.mkdtemp(prefix='sds_bench_')
+    try:
+        for name, path in make_variants(raw, work_dir, opts.frames).items():
+            ratio = len(raw) / os.path.getsize(path)
+            print(f"[{name}] 压缩比 {ratio:.2f} | capture_size "
+                  f"{'一致' if capture_size(path) == len(raw) else '不一致'}")
+            cases = [('先解压到磁盘', lambda: via_disk(path, work_dir)),
+                     ('流式解压 1线程', lambda: streamed(path, 1)),
+                     (f'流式解压 {workers}线程', lambda: streamed(path, workers))]
+            for label, func in cases:
+                elapsed, count = best_time(func, opts.repeat)
+                check = '一致' if count == expected else f'不一致（{count}/{expected}）'
+                print(f"  {label:<14} {elapsed:8.3f} 秒 | {size_mb / elapsed:8.1f} MB/s | 数据包 {check}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
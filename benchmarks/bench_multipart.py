@@ -0,0 +1,115 @@
+"""
+multipart解析微基准
+
+用法:
+    python -m benchmarks.bench_multipart [--image-mb 3] [--repeat 20]
+
+对比旧版（hex输入，split/strip逐级复制）与新版（bytes输入，memoryview+find偏移）
+parse_multipart_data，
+输出每MB耗时与tracemalloc统计的峰值分配量，并校验两者的字段与图片输出一致
+"""
+import argparse
+import os
+import time
+import tracemalloc
+#============= 系统自定义模块 =============
+from pcap_analysis.data_processor import parse_multipart_data
+#=========================================
+
+
+def legacy_parse_multipart_data(body_hex):
+    """旧版实现（仅用于对比）"""
+    fields, images = {}, []
+    try:
+        data = bytes.fromhex(body_hex)
+    except ValueError:
+        return fields, images
+    boundary_line = data.split(b'\r\n', 1)[0].strip(b'-')
+    for part in data.split(boundary_line):
+        part = part.strip(b'\r\n-')
+        if not part:
+            continue
+        try:
+            headers_raw, content = part.split(b'\r\n\r\n', 1)
+        except ValueError:
+            continue
+        headers = {}
+        for line in headers_raw.split(b'\r\n'):
+            line_decoded = line.decode('utf-8', errors='replace')
+            if ':' in line_decoded:
+                key, value = line_decoded.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        if 'content-disposition' not in headers:
+            continue
+        field_name = filename = None
+        for item in headers['content-disposition'].split(";"):
+            item = item.strip()
+            if item.startswith("name="):
+                field_name = item.split("=", 1)[1].strip('"')
+            elif item.startswith("filename="):
+                filename = item.split("=", 1)[1].strip('"')
+        if not field_name:
+            continue
+        if filename:
+            if headers.get('content-type', '').startswith('image/'):
+                images.append((filename, content))
+        else:
+            try:
+                fields[field_name] = content.decode('utf-8').strip()
+            except UnicodeDecodeError:
+                pass
+    return fields, images
+
+
+def build_body(image_bytes):
+    """构造与/survey.php相同结构的multipart请求体（手机号字段 + 一张图片）"""
+    boundary = b'----WebKitFormBoundary7MA4YWxkTrZu0gW'
+    # 伪JPEG数据：以FFD8开头、FFD9结尾，中间为随机字节
+    image = b'\xff\xd8' + os.urandom(image_bytes - 4) + b'\xff\xd9'
+    return (b'--' + boundary + b'\r\n'
+            b'Content-Disposition: form-data; name="phone"\r\n\r\n13800138000\r\n'
+            b'--' + boundary + b'\r\n'
+            b'Content-Disposition: form-data; name="bankcard"; filename="card.jpg"\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + image + b'\r\n'
+            b'--' + boundary + b'--\r\n')
+
+
+def measure(func, arg, repeat):
+    """返回 (平均耗时秒, 峰值分配字节)"""
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="multipart解析微基准")
+    parser.add_argument('--image-mb', type=float, default=3.0)
+    parser.add_argument('--repeat', type=int, default=20)
+    opts = parser.parse_args()
+
+    body = build_body(int(opts.image_mb * 1024 ** 2))
+    body_mb = len(body) / 1024 ** 2
+    body_hex = body.hex()
+
+    expected = legacy_parse_multipart_data(body_hex)
+    for name, func, arg in (
+        ('旧版(hex)', legacy_parse_multipart_data, body_hex),
+        ('新版(bytes)', parse_multipart_data, body),
+    ):
+        fields, images = func(arg)
+        same = (fields == expected[0] and
+                [(n, bytes(c)) for n, c in images] == [(n, bytes(c)) for n, c in expected[1]])
+        elapsed, peak = measure(func, arg, opts.repeat)
+        print(f"{name:<12} {elapsed * 1000 / body_mb:8.2f} ms/MB | "
+              f"峰值分配 {peak / 1024 ** 2:7.2f} MB ({peak / len(body):.1f}x 请求体) | "
+              f"输出一致: {'是' if same else '否'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+证件号码定位基准
+
+用法:
+    python -m benchmarks.bench_number_locator [--count 60] [--width 1600] [--repeat 3]
+
+生成带已知号码位置的合成证件照片（银行卡/身份证，各分为"对齐"、"留边"
+（证件缩小并随机平移到背景上）与"歪斜"（±6°旋转并平移）三组），分别对比：
+    固定比例：CARD_CROP_PROFILES中的box
+    定位：number_locator.locate_number_band（搜索框window内定位，失败回退box）
+输出各组的命中率（裁剪框完整覆盖号码，覆盖率≥98%）、平均覆盖率、
+裁剪面积/号码面积（OCR输入像素的相对大小），以及定位与完整解码（decode_card_region）的每张耗时
+"""
+import argparse
+import statistics
+import time
+import cv2
+import numpy as np
+#============= 系统自定义模块 =============
+from pcap_analysis.card_decoder import decode_card_region, box_pixels
+from pcap_analysis.flow_processor import CARD_CROP_PROFILES
+from pcap_analysis.number_locator import locate_number_band
+#=========================================
+
+GROUPS = ('aligned', 'padded', 'skewed')
+HIT_COVERAGE = 0.98
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _text(img, text, x, y, height, color, thickness_ratio=0.12):
+    """按目标字高绘制文字，返回文字包围框 (x1, y1, x2, y2)"""
+    scale = height / cv2.getTextSize('0', FONT, 1.0, 1)[0][1]
+    thickness = max(1, int(height * thickness_ratio))
+    (w, h), _ = cv2.getTextSize(text, FONT, scale, thickness)
+    cv2.putText(img, text, (int(x), int(y + h)), FONT, scale, color, thickness, cv2.LINE_AA)
+    return x, y, x + w, y + h + thickness
+
+
+def draw_bankcard(rng, width):
+    """合成银行卡（深色渐变底、浅色凸印卡号），返回 (图像, 号码框)"""
+    height = int(width * 0.63)
+    base = rng.integers(40, 140, 3)
+    ramp = np.linspace(0.7, 1.3, width)[None, :, None]
+    img = np.clip(base[None, None, :] * ramp + rng.normal(0, 6, (height, width, 3)), 0, 255).astype(np.uint8)
+    light = (235, 235, 235)
+    _text(img, "CHINA BANK", width * 0.08, height * 0.08, height * 0.06, light)
+    cv2.rectangle(img, (int(width * 0.08), int(height * 0.28)), (int(width * 0.2), int(height * 0.4)),
+                  (60, 190, 220), -1)  # 芯片
+    digits = ''.join(str(d) for d in rng.integers(0, 10, 16))
+    number = ' '.join(digits[i:i + 4] for i in range(0, 16, 4))
+    top = height * rng.uniform(0.5, 0.56)
+    box = _text(img, number, width * rng.uniform(0.07, 0.12), top, height * 0.075, light, 0.16)
+    _text(img, "VALID THRU 08/29", width * 0.3, height * 0.7, height * 0.04, light)
+    _text(img, "ZHANG SAN", width * 0.08, height * 0.82, height * 0.05, light)
+    return img, box
+
+
+def draw_idcard(rng, width):
+    """合成身份证人像面（浅色底、深色文字、右侧头像），返回 (图像, 号码框)"""
+    height = int(width * 0.63)
+    img = np.clip(rng.normal(225, 8, (height, width, 3)), 0, 255).astype(np.uint8)
+    dark = (30, 30, 30)
+    for i, line in enumerate(("NAME  LI SI", "SEX  M   NATION  HAN", "BORN  1990 01 01",
+                              "ADDRESS  NO.1 ROAD", "  DISTRICT CITY")):
+        _text(img, line, width * 0.06, height * (0.1 + i * 0.11), height * 0.045, dark)
+    cv2.rectangle(img, (int(width * 0.64), int(height * 0.12)), (int(width * 0.9), int(height * 0.68)),
+                  (150, 160, 170), -1)  # 头像
+    _text(img, "ID NUMBER", width * 0.06, height * 0.82, height * 0.045, dark)
+    digits = ''.join(str(d) for d in rng.integers(0, 10, 18))
+    box = _text(img, digits, width * rng.uniform(0.33, 0.36), height * rng.uniform(0.8, 0.83),
+                height * 0.055, dark, 0.14)
+    return img, box
+
+
+DRAWERS = {'bankcard': draw_bankcard, 'idcard': draw_idcard}
+
+
+def distort(rng, img, box, group):
+    """
+    按分组对证件图像做平移/缩放/旋转，返回 (照片, 号码在照片中的包围框)
+    留边与歪斜组把证件放在同尺寸的杂色背景上（相当于拍照时留出桌面）
+    """
+    height, width = img.shape[:2]
+    if group == 'aligned':
+        return img, box
+    scale = rng.uniform(0.78, 0.92)
+    angle = rng.uniform(-6, 6) if group == 'skewed' else 0.0
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, scale)
+    margin_x, margin_y = width * (1 - scale) / 2, height * (1 - scale) / 2
+    matrix[:, 2] += (rng.uniform(-0.8, 0.8) * margin_x, rng.uniform(-0.8, 0.8) * margin_y)
+    background = cv2.resize(rng.integers(90, 170, (12, 16, 3), dtype=np.uint8), (width, height),
+                            interpolation=cv2.INTER_CUBIC)
+    photo = cv2.warpAffine(img, matrix, (width, height), dst=background, borderMode=cv2.BORDER_TRANSPARENT)
+    x1, y1, x2, y2 = box
+    corners = np.array([[x1, y1, 1], [x2, y1, 1], [x1, y2, 1], [x2, y2, 1]]) @ matrix.T
+    return photo, (*corners.min(axis=0), *corners.max(axis=0))
+
+
+def coverage(roi, box):
+    """号码框被裁剪框覆盖的比例，以及裁剪面积与号码面积之比"""
+    ix = max(0.0, min(roi[2], box[2]) - max(roi[0], box[0]))
+    iy = max(0.0, min(roi[3], box[3]) - max(roi[1], box[1]))
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    return ix * iy / area, (roi[2] - roi[0]) * (roi[3] - roi[1]) / area
+
+
+def fixed_roi(img, profile):
+    height, width = img.shape[:2]
+    return box_pixels(profile['box'], width, height, 0, img.shape)
+
+
+def located_roi(img, profile):
+    """与decode_card_region相同的定位流程（全分辨率坐标），定位失败回退box"""
+    height, width = img.shape[:2]
+    x1, y1, x2, y2 = fixed_roi(img, profile)
+    wx1, wy1, wx2, wy2 = box_pixels(profile['window'], width, height, 0, img.shape)
+    region = img[wy1:wy2, wx1:wx2]
+    if not profile['color']:
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    found = locate_number_band(region, (x1 - wx1, y1 - wy1, x2 - wx1, y2 - wy1))
+    if found is None:
+        return (x1, y1, x2, y2), False
+    return (found[0] + wx1, found[1] + wy1, found[2] + wx1, found[3] + wy1), True
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="证件号码 固定比例裁剪 / 定位裁剪 对比")
+    parser.add_argument('--count', type=int, default=60, help="每种证件每组的照片数")
+    parser.add_argument('--width', type=int, default=1600, help="合成照片宽度（像素）")
+    parser.add_argument('--repeat', type=int, default=3)
+    opts = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for card_type, draw in DRAWERS.items():
+        profile = CARD_CROP_PROFILES[card_type]
+        print(f"[{card_type}]")
+        locate_times, decode_fixed, decode_located = [], [], []
+        for group in GROUPS:
+            stats = {'fixed': [], 'located': []}
+            fallbacks = 0
+            for _ in range(opts.count):
+                photo, box = distort(rng, *draw(rng, opts.width), group)
+                roi, found = located_roi(photo, profile)
+                fallbacks += not found
+                stats['fixed'].append(coverage(fixed_roi(photo, profile), box))
+                stats['located'].append(coverage(roi, box))
+
+                locate_times.append(best_time(lambda: located_roi(photo, profile), opts.repeat))
+                data = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+                decode_fixed.append(best_time(lambda: decode_card_region(
+                    data, profile['box'], profile['color'], profile['max_width']), opts.repeat))
+                decode_located.append(best_time(lambda: decode_card_region(
+                    data, profile['box'], profile['color'], profile['max_width'],
+                    profile['window'], locate_number_band), opts.repeat))
+            print(f"  {group}（定位失败回退 {fallbacks}/{opts.count}）")
+            for name, values in stats.items():
+                hits = sum(c >= HIT_COVERAGE for c, _ in values)
+                print(f"    {name:>7}: 命中 {hits / len(values):6.1%} | "
+                      f"平均覆盖率 {statistics.mean(c for c, _ in values):6.1%} | "
+                      f"裁剪面积/号码面积 {statistics.mean(a for _, a in values):5.2f}")
+        print(f"  定位耗时 {statistics.median(locate_times) * 1000:.2f} ms/张 | "
+              f"解码+裁剪 固定 {statistics.median(decode_fixed) * 1000:.2f} ms/张, "
+              f"定位 {statistics.median(decode_located) * 1000:.2f} ms/张")
+
+
+if __name__ == '__main__':
+    main()
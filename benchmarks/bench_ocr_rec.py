@@ -0,0 +1,64 @@
+"""
+证件OCR识别基准
+
+用法:
+    python -m benchmarks.bench_ocr_rec [--folder Temp/Temp_img] [--limit 200]
+
+对Step_1输出的证件裁剪图，对比逐张检测+识别（recognize）与
+仅识别批量快速通道（recognize_batch），输出各证件类型的图片/秒与号码一致率
+（需要已安装paddleocr并放置OCR_model模型）
+"""
+import argparse
+import time
+import cv2
+#============= 系统自定义模块 =============
+from config.PATH import Temp_img
+from utils.image_manifest import load_image_entries
+from utils.image_pack import read_entry_bytes
+from image_ocr.card_processor import OptimizedCardProcessor, CARD_PATTERNS, MODEL_CASCADE
+#=========================================
+
+
+def load_images(folder, card_type, limit):
+    """读取指定类型的裁剪图"""
+    entries = [e for e in load_image_entries(folder) if e.card_type == card_type]
+    images = []
+    for entry in entries[:limit]:
+        img = cv2.imdecode(read_entry_bytes(folder, entry), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append(img)
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="证件OCR识别基准")
+    parser.add_argument('--folder', default=Temp_img)
+    parser.add_argument('--limit', type=int, default=200)
+    opts = parser.parse_args()
+
+    processor = OptimizedCardProcessor()
+    for card_type in ("idcard", "bankcard"):
+        images = load_images(opts.folder, card_type, opts.limit)
+        if not images:
+            print(f"{card_type}: 没有图片，跳过")
+            continue
+        processor.load_models(MODEL_CASCADE)  # 模型加载不计入耗时
+
+        start = time.perf_counter()
+        full = [processor.recognize(img, card_type, CARD_PATTERNS) for img in images]
+        full_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = processor.recognize_batch(images, card_type, CARD_PATTERNS)
+        fast_elapsed = time.perf_counter() - start
+
+        same = sum(a[0] == b[0] for a, b in zip(full, fast))
+        validated = sum(v for _, v in fast)
+        print(f"{card_type:<9} {len(images)} 张 | "
+              f"检测+识别 {len(images) / full_elapsed:7.1f} 张/秒 | "
+              f"仅识别批量 {len(images) / fast_elapsed:7.1f} 张/秒 | "
+              f"号码一致 {same}/{len(images)} | 通过校验 {validated}/{len(images)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+PCAP解析后端对比基准
+
+用法:
+    python -m benchmarks.bench_pcap_backends <capture.pcap> [--repeat N]
+
+对同一抓包文件分别运行tshark与native后端，输出耗时与吞吐量，
+并校验两种后端提取出的 {flow_key: [请求]} 结构是否一致
+（未安装tshark时仅测试native后端）
+"""
+import argparse
+import os
+import time
+#============= 系统自定义模块 =============
+from config.PATH import TSHARK_PATH
+from pcap_analysis.pcap_parser import extract_http_requests, BACKEND_TSHARK, BACKEND_NATIVE
+#=========================================
+
+
+def run_backend(pcap_file, backend, repeat):
+    """运行指定后端repeat次，返回 (最短耗时, 解析结果)"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extract_http_requests(pcap_file, TSHARK_PATH, backend)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tshark / native 解析后端对比")
+    parser.add_argument('pcap_file')
+    parser.add_argument('--repeat', type=int, default=3)
+    opts = parser.parse_args()
+
+    size_mb = os.path.getsize(opts.pcap_file) / 1024 ** 2
+    backends = [BACKEND_NATIVE]
+    if os.path.exists(TSHARK_PATH):
+        backends.insert(0, BACKEND_TSHARK)
+
+    outputs = {}
+    for backend in backends:
+        elapsed, result = run_backend(opts.pcap_file, backend, opts.repeat)
+        if result is None:
+            print(f"{backend:>6}: 解析失败")
+            continue
+        outputs[backend] = dict(result)
+        requests = sum(len(v) for v in outputs[backend].values())
+        print(f"{backend:>6}: {elapsed:.3f}s | {size_mb / elapsed:.1f} MB/s | "
+              f"{len(outputs[backend])} 个流 / {requests} 个请求")
+
+    if len(outputs) == 2:
+        same = outputs[BACKEND_TSHARK] == outputs[BACKEND_NATIVE]
+        print(f"输出一致: {'是' if same else '否'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+常驻tshark会话基准
+
+用法:
+    python -m benchmarks.bench_tshark_session <capture.pcap> [--chunks 16] [--tshark PATH]
+
+先按TCP流把抓包切分为若干分片（同process_large_pcap的大文件流程），
+再分别以"每个分片启动一次tshark"与"一个常驻会话依次解析全部分片"两种方式解析，
+输出总耗时、平均每个分片耗时与由差值估算的每次启动开销，并校验两种方式提取的请求是否一致
+（常驻会话中tcp.stream编号跨分片连续递增，比较时忽略流ID）
+"""
+import argparse
+import shutil
+import tempfile
+import time
+#============= 系统自定义模块 =============
+from config.PATH import TSHARK_PATH
+from pcap_analysis.flow_sharder import shard_pcap_by_flow
+from pcap_analysis.pcap_parser import iter_chunk_requests, BACKEND_TSHARK
+from pcap_analysis.tshark_session import close_sessions
+#=========================================
+
+
+def parse_chunks(chunks, tshark_path, session):
+    """解析全部分片，返回 (耗时, 各分片的请求列表)"""
+    start = time.perf_counter()
+    outputs = []
+    for chunk in chunks:
+        outputs.append(sorted((flow_key[0], request['uri'], bytes(request['body']))
+                              for flow_key, request in
+                              iter_chunk_requests(chunk, tshark_path, BACKEND_TSHARK, session)))
+    elapsed = time.perf_counter() - start
+    close_sessions()
+    return elapsed, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tshark 单次运行 / 常驻会话对比")
+    parser.add_argument('pcap_file')
+    parser.add_argument('--chunks', type=int, default=16)
+    parser.add_argument('--tshark', default=TSHARK_PATH)
+    opts = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_tshark_')
+    try:
+        chunks = shard_pcap_by_flow(opts.pcap_file, work_dir, opts.chunks)
+        per_chunk, per_chunk_out = parse_chunks(chunks, opts.tshark, session=False)
+        session, session_out = parse_chunks(chunks, opts.tshark, session=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    count = len(chunks)
+    requests = sum(len(out) for out in per_chunk_out)
+    print(f"{count} 个分片 / {requests} 个请求")
+    print(f"  单次运行: {per_chunk:.3f}s | 每个分片 {per_chunk / count * 1000:.1f} ms")
+    print(f"  常驻会话: {session:.3f}s | 每个分片 {session / count * 1000:.1f} ms")
+    print(f"  估算每次启动开销: {(per_chunk - session) / max(1, count - 1) * 1000:.1f} ms")
+    print(f"输出一致: {'是' if per_chunk_out == session_out else '否'}")
+
+
+if __name__ == '__main__':
+    main()
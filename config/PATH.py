@@ -13,11 +13,26 @@ Temp_path = os.path.join(BASE_DIR, 'Temp')
 Temp_result_1 = os.path.join(Temp_path, "Temp_result_1.csv")
 Temp_result_2 = os.path.join(Temp_path, "Temp_result_2.csv")
 
+# 分步流程结果库（解析与OCR结果按手机号upsert，Step_3从中关联输出）
+Result_store = os.path.join(Temp_path, "result_store.sqlite3")
+
+# 检查点目录（中断后重新运行时恢复已完成的处理单元）
+Checkpoint_path = os.path.join(Temp_path, "checkpoints")
+
 # 临时图片缓存目录
 Temp_img = os.path.join(Temp_path, "Temp_img")
 
 # OCR模型路径
 OCR_model = os.path.join(BASE_DIR,'image_ocr' ,'OCR_model')
 
+# 持久缓存目录（不随Temp清理）
+Cache_path = os.path.join(BASE_DIR, 'Cache')
+
+# OCR进程布局调优缓存
+OCR_layout_cache = os.path.join(Cache_path, "ocr_layout.json")
+
+# OCR识别结果缓存（按图片内容哈希）
+OCR_cache = os.path.join(Cache_path, "ocr_cache.sqlite3")
+
 # 最终结果目录
 Final_result = os.path.join(BASE_DIR, 'Final_result', "Result.csv")
\ No newline at end of file
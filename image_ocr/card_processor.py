@@ -1,54 +1,150 @@
 import gc
 import os
 import re
+import hashlib
 import cv2
 import numpy as np
 from paddleocr import PaddleOCR
 from collections import defaultdict
 from config.PATH import OCR_model
+from image_ocr.validators import is_valid_number, iter_candidates
+from image_ocr.ocr_cache import OcrCache
+from utils.image_pack import read_entry_bytes
+
+# 证件号码正则表达式
+CARD_PATTERNS = {
+    "idcard": r"(\d{17}[\dXx]|\d{15}[\dXx])",  # 身份证规则：15位或17位数字（末位允许X）
+    "bankcard": r"\d{16,20}",                   # 银行卡规则：16-20位连续数字
+}
+
+# 仅识别快速通道参数
+REC_BATCH_SIZE = 16             # 单次识别调用的裁剪图数量
+REC_CONFIDENCE_THRESHOLD = 0.8  # 低于该置信度时回退到检测+识别完整流程
+REC_IMAGE_HEIGHT = {            # 识别模型输入高度（PP-OCRv3为48，server v2.0为32）
+    "light": 48,
+    "server": 32,
+}
+
+# 模型级联顺序：先用PP-OCRv3轻量模型，号码校验失败的图片再交给server v2.0模型
+MODEL_CASCADE = ("light", "server")
+
+# 各级模型目录（位于OCR_model下）：(检测模型, 识别模型)
+MODEL_DIRS = {
+    "light": ("ch_PP-OCRv3_det_infer", "ch_PP-OCRv3_rec_infer"),
+    "server": ("ch_ppocr_server_v2.0_det_infer", "ch_ppocr_server_v2.0_rec_infer"),
+}
+CLS_MODEL_DIR = "ch_ppocr_mobile_v2.0_cls_infer"
+
+# 号码选取规则版本（修改选取、校验或级联逻辑时递增，使识别结果缓存中的旧条目失效）
+CASCADE_REVISION = 1
+
+
+def cascade_version():
+    """
+    功能: 计算模型级联版本（识别结果缓存的键之一）
+    输出: 16位十六进制字符串
+    说明:
+        由CASCADE_REVISION、级联顺序、置信度阈值、识别输入高度，以及各级模型目录中
+        文件的名称、大小与修改时间得出；只读取文件元数据，不加载模型。
+        替换模型文件或调整规则后，缓存中按旧版本保存的结果不再命中
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(repr((CASCADE_REVISION, MODEL_CASCADE, REC_CONFIDENCE_THRESHOLD,
+                        sorted(REC_IMAGE_HEIGHT.items()))).encode())
+    for tier in MODEL_CASCADE:
+        for name in MODEL_DIRS[tier]:
+            directory = os.path.join(OCR_model, name)
+            digest.update(name.encode())
+            try:
+                with os.scandir(directory) as it:
+                    for entry in sorted(it, key=lambda e: e.name):
+                        if entry.is_file():
+                            stat = entry.stat()
+                            digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+            except OSError:  # 模型目录不存在
+                pass
+    return digest.hexdigest()
 
 
 class OptimizedCardProcessor:
     """证件处理器"""
 
-    def __init__(self):
-        self.id_ocr = None
-        self.bank_ocr = None
-
-    def _load_id_model(self):
-        """加载身份证专用模型"""
-        self.id_ocr = PaddleOCR(
-            use_angle_cls=False,  # 关闭方向分类（身份证无需角度检测）
-            cls_model_dir=os.path.join(OCR_model, 'ch_ppocr_mobile_v2.0_cls_infer'),  # 移动端分类模型
-            det_model_dir=os.path.join(OCR_model, 'ch_PP-OCRv3_det_infer'),  # 轻量版检测模型
-            rec_model_dir=os.path.join(OCR_model, 'ch_PP-OCRv3_rec_infer'),  # 轻量版识别模型
+    def __init__(self, cpu_threads=None, cache=None):
+        """
+        参数:
+            cpu_threads (int): 每个模型的CPU推理线程数（None表示使用PaddleOCR默认值），
+                由image_ocr.scheduler按进程布局确定，避免多进程时线程超额占用核心
+            cache (OcrCache): 识别结果缓存（None表示不使用缓存）
+        """
+        self.light_ocr = None   # PP-OCRv3轻量模型（级联第一级）
+        self.server_ocr = None  # server v2.0模型（级联第二级）
+        self.cpu_threads = cpu_threads
+        self.cache = cache
+        self._cache_version = None  # 模型级联版本（首次查询缓存时计算）
+
+    def _thread_options(self):
+        """推理线程数参数（未指定时不传，保持PaddleOCR默认值）"""
+        return {} if self.cpu_threads is None else {'cpu_threads': self.cpu_threads}
+
+    def _load_light_model(self):
+        """加载轻量模型（身份证与银行卡共用的级联第一级）"""
+        self.light_ocr = PaddleOCR(
+            use_angle_cls=False,  # 关闭方向分类（旋转的银行卡校验失败后由服务端模型处理）
+            cls_model_dir=os.path.join(OCR_model, CLS_MODEL_DIR),  # 移动端分类模型
+            det_model_dir=os.path.join(OCR_model, MODEL_DIRS['light'][0]),  # 轻量版检测模型
+            rec_model_dir=os.path.join(OCR_model, MODEL_DIRS['light'][1]),  # 轻量版识别模型
             det_db_thresh=0.3,  # 文本检测阈值（低值提升召回率）
             det_db_box_thresh=0.5,  # 文本框置信度阈值
+            rec_batch_num=REC_BATCH_SIZE,  # 识别批大小（与快速通道批次一致）
             enable_mkldnn=True,  # 启用Intel数学加速库
             use_tensorrt=False,  # 禁用NVIDIA加速（默认配置）
-            show_log=False  # 关闭调试日志
+            show_log=False,  # 关闭调试日志
+            **self._thread_options()
         )
         # 模型预热
         dummy_img = np.zeros((100, 100, 3), dtype=np.uint8)
-        self.id_ocr.ocr(dummy_img, cls=False)
-        return self.id_ocr
+        self.light_ocr.ocr(dummy_img, cls=False)
+        return self.light_ocr
 
-    def _load_bank_model(self):
-        """加载银行卡专用模型"""
-        self.bank_ocr = PaddleOCR(
+    def _load_server_model(self):
+        """加载服务端模型（级联第二级，仅在轻量模型结果校验失败时使用）"""
+        self.server_ocr = PaddleOCR(
             use_angle_cls=True,  # 启用方向分类（银行卡可能存在旋转）
-            cls_model_dir=os.path.join(OCR_model, 'ch_ppocr_mobile_v2.0_cls_infer'),  # 移动端分类模型
-            det_model_dir=os.path.join(OCR_model, 'ch_ppocr_server_v2.0_det_infer'),  # 服务端检测模型
-            rec_model_dir=os.path.join(OCR_model, 'ch_ppocr_server_v2.0_rec_infer'),  # 服务端识别模型
+            cls_model_dir=os.path.join(OCR_model, CLS_MODEL_DIR),  # 移动端分类模型
+            det_model_dir=os.path.join(OCR_model, MODEL_DIRS['server'][0]),  # 服务端检测模型
+            rec_model_dir=os.path.join(OCR_model, MODEL_DIRS['server'][1]),  # 服务端识别模型
             det_db_unclip_ratio=2.0,  # 文本框扩展比例（适应长文本）
+            rec_batch_num=REC_BATCH_SIZE,  # 识别批大小（与快速通道批次一致）
             enable_mkldnn=True,  # 启用Intel加速
             use_tensorrt=False,  # 保持与身份证模型一致
-            show_log=False  # 统一日志配置
+            show_log=False,  # 统一日志配置
+            **self._thread_options()
         )
         # 模型预热
         dummy_img = np.zeros((100, 100, 3), dtype=np.uint8)
-        self.bank_ocr.ocr(dummy_img, cls=True)
-        return self.bank_ocr
+        self.server_ocr.ocr(dummy_img, cls=True)
+        return self.server_ocr
+
+    def _model(self, tier):
+        """按级联层级取得模型，未加载时按需加载"""
+        if tier == 'light':
+            return self.light_ocr if self.light_ocr is not None else self._load_light_model()
+        return self.server_ocr if self.server_ocr is not None else self._load_server_model()
+
+    def load_models(self, tiers=MODEL_CASCADE[:1]):
+        """
+        加载并预热指定层级的OCR模型（已加载的模型不会重复加载）
+
+        参数:
+            tiers (iterable): 需要常驻的模型层级，'light' 和/或 'server'
+
+        注意事项:
+            - 供常驻工作进程在初始化时调用，模型在进程生命周期内保留
+            - 默认只预热轻量模型；服务端模型在首次有图片需要升级时才加载，
+              大多数进程不会持有server v2.0模型
+        """
+        for tier in tiers:
+            self._model(tier)
 
     def _release_model(self, model_type):
         """
@@ -56,8 +152,8 @@ class OptimizedCardProcessor:
         
         参数:
             model_type (str): 模型类型标识
-                - 'id'  释放身份证识别模型
-                - 'bank' 释放银行卡识别模型
+                - 'light'  释放轻量模型
+                - 'server' 释放服务端模型
         
         功能:
             1. 删除模型实例引用
@@ -69,12 +165,12 @@ class OptimizedCardProcessor:
             - 需显式调用gc.collect()确保立即回收
             - 参数校验已在调用前完成
         """
-        if model_type == 'id' and self.id_ocr:
-            del self.id_ocr
-            self.id_ocr = None
-        elif model_type == 'bank' and self.bank_ocr:
-            del self.bank_ocr
-            self.bank_ocr = None
+        if model_type == 'light' and self.light_ocr:
+            del self.light_ocr
+            self.light_ocr = None
+        elif model_type == 'server' and self.server_ocr:
+            del self.server_ocr
+            self.server_ocr = None
         gc.collect()
 
     @staticmethod
@@ -98,13 +194,217 @@ class OptimizedCardProcessor:
                 return matched_str[:16]
             return matched_str
 
+    def select_number(self, text, card_type, patterns):
+        """
+        从OCR文本中选出证件号码并校验
+
+        参数:
+            text (str): OCR识别文本
+            card_type (str): 'idcard' 或 'bankcard'
+            patterns (dict): 正则表达式模式字典
+
+        返回:
+            tuple: (号码, 是否通过校验)
+
+        处理流程:
+            1. 依次尝试文本中的候选号码（各数字串、相邻分组拼接、误识字符替换），
+               采用第一个通过校验的候选（银行卡Luhn校验，身份证GB 11643校验）
+            2. 否则用extract_number按原有规则提取（含金卡处理），通过校验则采用
+            3. 都未通过时返回extract_number的结果并标记为未校验
+        """
+        for candidate in iter_candidates(text, card_type):
+            if is_valid_number(candidate, card_type):
+                return candidate, True
+        try:
+            number = self.extract_number(text, patterns[card_type])
+        except AttributeError:  # 文本中没有符合规则的号码
+            number = ''
+        return number, is_valid_number(number, card_type)
+
+
+    def _recognize_full(self, img, card_type, patterns, tier):
+        """
+        使用指定层级的模型执行检测+识别完整流程，
+        返回 (号码, 是否通过校验, 置信度)，置信度取各文本行的平均值
+        """
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        ocr_result = self._model(tier).ocr(img, cls=False)
+        lines = ocr_result[0] or []
+        ocr_text = " ".join([line[1][0] for line in lines])
+        score = sum(line[1][1] for line in lines) / len(lines) if lines else 0.0
+        return (*self.select_number(ocr_text, card_type, patterns), score)
+
+    def recognize(self, img, card_type, patterns):
+        """
+        对内存中的证件裁剪图执行OCR识别并提取号码（检测+识别完整流程，按模型级联）
+
+        参数:
+            img (numpy.ndarray): 证件裁剪图（BGR三通道或灰度单通道）
+            card_type (str): 'idcard' 或 'bankcard'
+            patterns (dict): 正则表达式模式字典
+
+        返回:
+            tuple: (号码, 是否通过校验)
+
+        注意事项:
+            - 轻量模型结果通过校验时不再调用服务端模型
+            - 对应模型未加载时按需加载，且不会主动释放（适用于常驻OCR进程）
+            - 灰度图会转换为三通道，与从JPEG文件以彩色模式读取的结果一致
+        """
+        best = ''
+        for tier in MODEL_CASCADE:
+            number, validated, _ = self._recognize_full(img, card_type, patterns, tier)
+            if validated:
+                return number, True
+            best = number or best
+        return best, False
+
+    @staticmethod
+    def _prepare_rec_input(img, height):
+        """等比缩放到识别模型输入高度，灰度图转为三通道"""
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        h, w = img.shape[:2]
+        width = max(1, round(w * height / h))
+        return cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+
+    def recognize_batch(self, images, card_type, patterns):
+        """
+        仅识别快速通道：跳过文本检测，对一批证件裁剪图直接执行文本识别，按模型级联升级
+
+        参数:
+            images (list[numpy.ndarray]): 证件裁剪图列表（号码区域已由flow_processor裁出）
+            card_type (str): 'idcard' 或 'bankcard'
+            patterns (dict): 正则表达式模式字典
+
+        返回:
+            list[tuple]: 与images一一对应的 (号码, 是否通过校验)，识别失败的号码为空字符串
+
+        处理流程（对MODEL_CASCADE中的每一级模型）:
+            1. 裁剪图等比缩放到该模型的识别输入高度
+            2. 每REC_BATCH_SIZE张调用一次识别器（text_recognizer，不经过检测模型）
+            3. 置信度达到REC_CONFIDENCE_THRESHOLD且号码通过校验的图片直接采用
+            4. 其余图片用同一模型执行检测+识别，仍未通过校验的交给下一级模型
+
+        注意事项:
+            - 大多数图片在轻量模型一级即可通过校验，不会触发服务端模型加载
+            - 所有层级都未通过校验时，保留最后得到的非空号码并标记为未校验
+            - 识别器返回的结果数与输入不一致时抛出RuntimeError，由调用方按整批失败处理
+        """
+        return [(number, validated) for number, validated, _ in
+                self._recognize_batch_scored(images, card_type, patterns)]
+
+    def _recognize_batch_scored(self, images, card_type, patterns):
+        """recognize_batch的实现，返回 (号码, 是否通过校验, 置信度)，供写入识别结果缓存"""
+        results = [('', False, 0.0)] * len(images)
+        pending = list(range(len(images)))
+        for tier in MODEL_CASCADE:
+            if not pending:
+                break
+            ocr = self._model(tier)
+            height = REC_IMAGE_HEIGHT[tier]
+            unresolved = []
+            for start in range(0, len(pending), REC_BATCH_SIZE):
+                indices = pending[start:start + REC_BATCH_SIZE]
+                prepared = [self._prepare_rec_input(images[i], height) for i in indices]
+                # 直接调用识别器：整批裁剪图作为一个列表按rec_batch_num成批推理，
+                # 返回与输入一一对应的 [(文本, 置信度), ...]
+                # （ocr.ocr(列表, det=False)会把每个元素当作一张独立的图片，并改写page_num）
+                rec_result, _ = ocr.text_recognizer(prepared)
+                del prepared
+                if len(rec_result) != len(indices):
+                    raise RuntimeError(f"识别结果数({len(rec_result)})与输入裁剪图数({len(indices)})不一致")
+
+                for i, (text, score) in zip(indices, rec_result):
+                    number, validated = '', False
+                    if score >= REC_CONFIDENCE_THRESHOLD:
+                        number, validated = self.select_number(text, card_type, patterns)
+                    if not validated:
+                        try:
+                            full_number, validated, full_score = self._recognize_full(
+                                images[i], card_type, patterns, tier)
+                            if full_number:
+                                number, score = full_number, full_score
+                        except Exception as e:
+                            print(f"{card_type}识别回退失败: {str(e)}")
+                    if number:
+                        results[i] = (number, validated, score)
+                    if not validated:
+                        unresolved.append(i)
+            pending = unresolved
+        return results
+
+    def recognize_keyed(self, keys, get_image, card_type, patterns):
+        """
+        先查识别结果缓存，只对未命中的图片执行OCR
+
+        参数:
+            keys (list[str]): 各图片的内容哈希（OcrCache.content_key / image_key）
+            get_image (callable): get_image(i) 返回第i张图片的数组，无法解码时返回None
+            card_type (str): 'idcard' 或 'bankcard'
+            patterns (dict): 正则表达式模式字典
+
+        返回:
+            list[tuple]: 与keys一一对应的 (号码, 是否通过校验)
+
+        处理流程:
+            1. 按内容哈希与模型级联版本批量查询缓存，命中的图片不解码、不识别
+            2. 未命中的图片解码；启用感知哈希时再按dHash查找
+            3. 其余图片按recognize_batch的流程识别，通过校验的结果连同置信度写回缓存
+
+        注意事项:
+            - 模型在第一次需要识别时才加载，整批命中缓存时不产生模型加载开销
+            - 缓存中只有通过校验的结果；未通过校验（含识别出错）的图片每次都重新识别，
+              模型或规则修复后即可得到新结果
+        """
+        results = [('', False)] * len(keys)
+        version = None
+        hits = {}
+        if self.cache is not None:
+            if self._cache_version is None:
+                self._cache_version = cascade_version()
+            version = self._cache_version
+            hits = self.cache.get_many(card_type, version, keys)
+
+        pending, images, dhashes = [], [], []
+        for i, key in enumerate(keys):
+            if key in hits:
+                results[i] = (hits[key][0], True)
+                continue
+            img = get_image(i)
+            if img is None:
+                continue
+            dhash = None
+            if self.cache is not None and self.cache.perceptual:
+                dhash = self.cache.dhash(img)
+                similar = self.cache.get_similar(card_type, version, dhash)
+                if similar is not None:
+                    results[i] = (similar[0], True)
+                    continue
+            pending.append(i)
+            images.append(img)
+            dhashes.append(dhash)
+        if not pending:
+            return results
+
+        numbers = self._recognize_batch_scored(images, card_type, patterns)
+        del images
+        for i, (number, validated, _) in zip(pending, numbers):
+            results[i] = (number, validated)
+        if self.cache is not None:
+            self.cache.put_many(card_type, version, [(keys[i], dhash, number, score)
+                                                     for i, dhash, (number, validated, score)
+                                                     in zip(pending, dhashes, numbers) if validated])
+        return results
 
-    def _process_single(self, filename, folder_path, patterns, result_dict):
+    def _process_group(self, entries, card_type, folder_path, patterns, result_dict):
         """
-        处理单个证件图片文件，执行OCR识别和信息提取
+        批量处理同一类型的证件图片，执行OCR识别和信息提取
         
         参数:
-            filename (str): 带分类的图片文件名（格式：手机号_类型_时间戳.jpg）
+            entries (list[ImageEntry]): 同类证件图片记录（见utils.image_manifest）
+            card_type (str): 'idcard' 或 'bankcard'
             folder_path (str): 图片文件所在目录路径
             patterns (dict): 正则表达式模式字典
                 - idcard: 身份证号码匹配模式
@@ -112,68 +412,86 @@ class OptimizedCardProcessor:
             result_dict (dict): 结果收集字典（按手机号聚合）
         
         处理流程:
-            1. 解析文件名获取手机号标识
-            2. 初始化结果条目（防止空值）
-            3. 根据文件名分类处理:
-               - 身份证: 加载专用模型，提取身份证号
-               - 银行卡: 加载专用模型，提取银行卡号
+            1. 按记录中的手机号初始化结果条目（防止空值，校验标记默认False）
+            2. 每REC_BATCH_SIZE条记录为一批，使用清单中的内容哈希
+               （旧版目录没有哈希时读取图片计算）
+            3. 调用recognize_keyed：命中缓存的不读取图片，其余读取解码后批量识别
+               （仅识别快速通道，校验失败时按模型级联升级）
             4. 及时释放图片内存（防止大文件累积）
         
         注意事项:
-            - 使用cv2.imdecode支持中文路径读取
+            - 图片包中的记录通过mmap零拷贝取出后直接cv2.imdecode；
+              旧版目录中的单个文件使用np.fromfile读取（支持中文路径）
             - OCR结果进行正则二次校验
-            - 异常处理覆盖文件损坏/格式错误等场景
+            - 异常处理覆盖文件损坏/格式错误等场景，单个文件失败不影响同批次其他文件
         """
-        try:
-            parts = filename.split('_')
-            phone = parts[0]
-
-            # 初始化结果条目
-            if phone not in result_dict:
-                result_dict[phone] = {"phone": phone, "idcard": "", "bankcard": ""}
-            img_path = os.path.join(folder_path, filename)
-
-            # 动态选择处理流程
-            if "idcard" in filename:
-                img = cv2.imdecode(np.fromfile(img_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-                ocr_result = self.id_ocr.ocr(img, cls=False)
-                ocr_text = " ".join([line[1][0] for line in ocr_result[0]])
-                result_dict[phone]["idcard"] = self.extract_number(ocr_text, patterns['idcard'])
-                del img
-
-            elif "bankcard" in filename:
-                img = cv2.imdecode(np.fromfile(img_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-                ocr_result = self.bank_ocr.ocr(img, cls=False)
-                ocr_text = " ".join([line[1][0] for line in ocr_result[0]])
-                result_dict[phone]["bankcard"] = self.extract_number(ocr_text, patterns['bankcard'])
-                del img
-
-        except Exception as e:
-            print(f"处理文件 {filename} 时出错: {str(e)}")
-
-    def process_batch(self, file_list, folder_path, patterns):
-        """
-        批量处理证件图片文件
+        for start in range(0, len(entries), REC_BATCH_SIZE):
+            batch = entries[start:start + REC_BATCH_SIZE]
+            for entry in batch:
+                if entry.phone not in result_dict:
+                    result_dict[entry.phone] = {"phone": entry.phone, "idcard": "", "bankcard": "",
+                                                "idcard_validated": False, "bankcard_validated": False}
+            raw = {}
+
+            def read(i):
+                entry = batch[i]
+                if i not in raw:
+                    raw[i] = read_entry_bytes(folder_path, entry)
+                return raw[i]
+
+            def decode(i):
+                try:
+                    img = cv2.imdecode(read(i), cv2.IMREAD_COLOR)
+                    if img is None:
+                        raise ValueError("图片解码失败")
+                    return img
+                except Exception as e:
+                    print(f"处理文件 {batch[i].file} 时出错: {str(e)}")
+                    return None
+
+            try:
+                keys = [entry.digest or OcrCache.content_key(read(i)) for i, entry in enumerate(batch)]
+                numbers = self.recognize_keyed(keys, decode, card_type, patterns)
+            except Exception as e:
+                print(f"批量识别{card_type}时出错: {str(e)}")
+                continue
+            finally:
+                raw.clear()
+            for entry, (number, validated) in zip(batch, numbers):
+                result = result_dict[entry.phone]
+                # 同一手机号有多张同类图片时保留首个有效号码，通过校验的号码优先
+                if number and (not result[card_type] or
+                               (validated and not result[f"{card_type}_validated"])):
+                    result[card_type] = number
+                    result[f"{card_type}_validated"] = validated
+
+    def process_batch(self, entries, folder_path, patterns, release_models=True):
+        """
+        批量处理证件图片
         
         参数:
-            file_list (list): 待处理文件路径列表
+            entries (list[ImageEntry]): 待处理图片记录（来自图片清单，见utils.image_manifest）
             folder_path (str): 图片存储根目录
             patterns (dict): 正则匹配模式字典
                 - idcard: 身份证正则
                 - bankcard: 银行卡正则
+            release_models (bool): 处理完成后是否释放模型
+                - True  单批次模式（默认）
+                - False 常驻模式，模型保留给后续批次使用
         
         处理流程:
-            1. 按证件类型分组文件（身份证/银行卡分离处理）
-            2. 动态加载专用OCR模型（按需初始化）
-            3. 顺序处理同类文件（保证内存可控）
-            4. 处理完成后立即释放模型资源
+            1. 按记录中的证件类型分组（身份证/银行卡分离处理）
+            2. 同类图片按批次识别（轻量模型优先，校验失败的图片升级到服务端模型）
+            3. 处理完成后立即释放模型资源
         
         返回:
             list[dict]: 结构化结果列表，格式:
                 [{
                     "phone": "用户手机号",
                     "idcard": "身份证号码",
-                    "bankcard": "银行卡号"
+                    "bankcard": "银行卡号",
+                    "idcard_validated": 身份证号是否通过校验,
+                    "bankcard_validated": 银行卡号是否通过校验
                 }]
         
         注意事项:
@@ -184,24 +502,20 @@ class OptimizedCardProcessor:
         """
         result_dict = defaultdict(dict)
 
-        # 按文件类型分组处理
-        id_files = [f for f in file_list if 'idcard' in f]
-        bank_files = [f for f in file_list if 'bankcard' in f]
+        # 按证件类型分组处理
+        id_files = [e for e in entries if e.card_type == 'idcard']
+        bank_files = [e for e in entries if e.card_type == 'bankcard']
 
         # 处理身份证件
         if id_files:
-            if not self.id_ocr:
-                self._load_id_model()
-            for filename in id_files:
-                self._process_single(filename, folder_path, patterns, result_dict)
-            self._release_model('id')
+            self._process_group(id_files, "idcard", folder_path, patterns, result_dict)
 
         # 处理银行卡件
         if bank_files:
-            if not self.bank_ocr:
-                self._load_bank_model()
-            for filename in bank_files:
-                self._process_single(filename, folder_path, patterns, result_dict)
-            self._release_model('bank')
+            self._process_group(bank_files, "bankcard", folder_path, patterns, result_dict)
+
+        if release_models:
+            self._release_model('light')
+            self._release_model('server')
 
         return list(result_dict.values())
\ No newline at end of file
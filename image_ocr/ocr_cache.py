@@ -0,0 +1,204 @@
+import os
+import time
+import sqlite3
+import hashlib
+import cv2
+import numpy as np
+#============= 系统自定义模块 =============
+from config.PATH import OCR_cache
+from utils.image_manifest import content_hash
+#=========================================
+
+# 缓存条目上限（超出后按最近使用时间淘汰）
+DEFAULT_MAX_ENTRIES = 200000
+# 淘汰时保留的比例（一次多删一些，避免每次写入都触发淘汰）
+EVICT_KEEP_RATIO = 0.9
+# SQLite锁等待时间（秒），多个OCR进程并发读写同一缓存文件
+BUSY_TIMEOUT = 30
+# 缓存表结构版本（PRAGMA user_version），与文件中的版本不一致时重建缓存表
+SCHEMA_VERSION = 2
+
+_SCHEMA = (
+    """CREATE TABLE ocr_results (
+        card_type TEXT NOT NULL,
+        version   TEXT NOT NULL,   -- 模型级联版本（见card_processor.cascade_version）
+        key       TEXT NOT NULL,
+        dhash     INTEGER,
+        number    TEXT NOT NULL,   -- 通过校验的号码（未通过校验的结果不缓存）
+        score     REAL NOT NULL,   -- 识别置信度
+        last_used REAL NOT NULL,
+        PRIMARY KEY (card_type, version, key)
+    )""",
+    "CREATE INDEX idx_ocr_results_dhash ON ocr_results (card_type, version, dhash)",
+    "CREATE INDEX idx_ocr_results_last_used ON ocr_results (last_used)",
+)
+
+
+class OcrCache:
+    """
+    持久化OCR结果缓存（按内容寻址）
+
+    以裁剪图内容的哈希为键保存通过校验的号码及其识别置信度，跨会话、跨抓包文件复用；
+    可选按感知哈希（dHash）匹配重新编码过的同一图片。
+    条目按模型级联版本区分，模型或号码选取规则变化后旧条目不再命中（随LRU淘汰）。
+    缓存文件为SQLite数据库（WAL模式），多个OCR进程可同时读写；
+    句柄可随进程池初始化参数传递，各进程在首次使用时建立自己的连接
+    """
+
+    def __init__(self, path=OCR_cache, max_entries=DEFAULT_MAX_ENTRIES, perceptual=False):
+        """
+        参数:
+            path: 缓存数据库路径
+            max_entries: 条目上限，超出后淘汰最久未使用的条目
+            perceptual: 内容哈希未命中时是否按dHash查找
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self._conn = None
+        self._pid = None
+        self._count = None  # 本进程估计的条目数（不含其他进程的写入，超过上限时再精确统计）
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None  # 连接不能跨进程使用
+        state['_pid'] = None
+        state['_count'] = None
+        return state
+
+    def _connection(self):
+        """当前进程的数据库连接（fork出的子进程会重新连接）"""
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._ensure_schema(conn)
+            self._conn, self._pid, self._count = conn, os.getpid(), None
+        return self._conn
+
+    @staticmethod
+    def _ensure_schema(conn):
+        """建立缓存表；旧版本的缓存表（未区分模型版本、含未校验结果）直接丢弃重建"""
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")  # 多个进程同时升级时串行执行
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS ocr_results")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def content_key(data):
+        """图片文件字节的内容哈希（与图片清单中记录的哈希一致）"""
+        return content_hash(data)
+
+    @staticmethod
+    def image_key(img):
+        """内存中图像数组的内容哈希（包含尺寸与类型，避免不同形状的相同字节冲突）"""
+        digest = hashlib.blake2b(f"{img.shape}{img.dtype.str}".encode(), digest_size=16)
+        digest.update(np.ascontiguousarray(img))
+        return digest.hexdigest()
+
+    @staticmethod
+    def dhash(img):
+        """64位差值感知哈希（有符号整数，便于存入SQLite）"""
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        value = 0
+        for bit in (small[:, 1:] > small[:, :-1]).flatten():
+            value = (value << 1) | int(bit)
+        return value - (1 << 64) if value >= (1 << 63) else value
+
+    def get_many(self, card_type, version, keys):
+        """
+        功能: 按内容哈希批量查询
+        输入:
+            card_type: 'idcard' 或 'bankcard'
+            version: 模型级联版本
+            keys: 内容哈希列表
+        输出: dict {key: (号码, 置信度)}，命中条目同时刷新最近使用时间
+        """
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        conn = self._connection()
+        found = {}
+        for start in range(0, len(keys), 500):  # SQLite参数个数上限
+            part = keys[start:start + 500]
+            marks = ",".join("?" * len(part))
+            rows = conn.execute(
+                f"SELECT key, number, score FROM ocr_results "
+                f"WHERE card_type = ? AND version = ? AND key IN ({marks})",
+                [card_type, version, *part]).fetchall()
+            found.update((key, (number, score)) for key, number, score in rows)
+        if found:
+            self._touch(card_type, version, list(found))
+        return found
+
+    def get_similar(self, card_type, version, dhash):
+        """按感知哈希查找，命中返回 (号码, 置信度)，未命中返回None"""
+        row = self._connection().execute(
+            "SELECT key, number, score FROM ocr_results "
+            "WHERE card_type = ? AND version = ? AND dhash = ? LIMIT 1",
+            (card_type, version, dhash)).fetchone()
+        if row is None:
+            return None
+        self._touch(card_type, version, [row[0]])
+        return row[1], row[2]
+
+    def _touch(self, card_type, version, keys):
+        """刷新最近使用时间"""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany("UPDATE ocr_results SET last_used = ? "
+                             "WHERE card_type = ? AND version = ? AND key = ?",
+                             [(now, card_type, version, key) for key in keys])
+
+    def put_many(self, card_type, version, entries):
+        """
+        功能: 批量写入识别结果
+        输入:
+            card_type: 'idcard' 或 'bankcard'
+            version: 模型级联版本
+            entries: list[(key, dhash或None, 号码, 置信度)]，只应包含通过校验的结果
+                （未通过校验的结果写入后会一直命中，修复模型后也不会重新识别）
+        说明: 条目数按本进程的写入累计估计，估计值超过上限时才精确统计，
+              确实超出则淘汰最久未使用的条目（多进程并发写入时上限为近似值）
+        """
+        if not entries:
+            return
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ocr_results "
+                "(card_type, version, key, dhash, number, score, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(card_type, version, key, dhash, number, float(score), now)
+                 for key, dhash, number, score in entries])
+            if self._count is not None:
+                self._count += len(entries)  # 覆盖已有条目时偏大，只会提前触发精确统计
+            if self._count is None or self._count > self.max_entries:
+                self._count = conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+                if self._count > self.max_entries:
+                    keep = int(self.max_entries * EVICT_KEEP_RATIO)
+                    conn.execute(
+                        "DELETE FROM ocr_results WHERE rowid IN "
+                        "(SELECT rowid FROM ocr_results ORDER BY last_used LIMIT ?)",
+                        (self._count - keep,))
+                    self._count = keep
+
+    def close(self):
+        """关闭当前进程的连接"""
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._count = None
@@ -0,0 +1,134 @@
+import queue
+import threading
+from multiprocessing import get_context
+#============= 系统自定义模块 =============
+from image_ocr.card_processor import OptimizedCardProcessor, CARD_PATTERNS, REC_BATCH_SIZE
+from image_ocr.ocr_cache import OcrCache
+#=========================================
+
+
+def _next_batch(channel, limit):
+    """
+    阻塞取出一帧，再取出已就绪的帧直到limit张
+    返回：
+        (frames, finished)，finished表示已收到结束标记
+    """
+    frames = []
+    item = channel.get()
+    while item is not None:
+        frames.append(item)
+        if len(frames) >= limit:
+            return frames, False
+        try:
+            item = channel.get(block=False)
+        except queue.Empty:
+            return frames, False
+    return frames, True
+
+
+def ocr_worker(channel, result_queue, patterns, cache=None):
+    """
+    常驻OCR进程主循环
+    参数：
+        channel: 共享内存帧通道（utils.shared_frames.FrameChannel）
+        result_queue: 结果队列，元素为 (帧描述, 证件号码, 是否通过校验)，进程退出前放入None
+        patterns: 证件号码正则表达式
+        cache: 识别结果缓存（None表示不使用）
+    流程：
+        1. 从帧通道取出当前已就绪的裁剪图（共享内存视图，不经过JPEG编解码），最多REC_BATCH_SIZE张
+        2. 按证件类型分组，先查缓存（按像素内容哈希），未命中的批量识别（模型级联），
+           模型首次使用时加载并常驻
+        3. 归还槽位并回传结果，收到结束标记后退出
+    """
+    processor = OptimizedCardProcessor(cache=cache)
+    try:
+        finished = False
+        while not finished:
+            frames, finished = _next_batch(channel, REC_BATCH_SIZE)
+            for card_type in ("idcard", "bankcard"):
+                group = [frame for frame in frames if frame[1]['card_type'] == card_type]
+                if not group:
+                    continue
+                try:
+                    keys = [OcrCache.image_key(image) for image, _, _ in group]
+                    numbers = processor.recognize_keyed(keys, lambda i: group[i][0],
+                                                        card_type, patterns)
+                except Exception as e:
+                    print(f"批量识别{card_type}时出错: {str(e)}")
+                    numbers = [('', False)] * len(group)
+                for (_, meta, release), (number, validated) in zip(group, numbers):
+                    release()
+                    result_queue.put((meta, number, validated))
+                del group
+            del frames
+    finally:
+        channel.detach()
+        result_queue.put(None)
+
+
+class OcrService:
+    """OCR服务：一组常驻OCR进程 + 结果收集线程
+
+    用法：
+        service = OcrService(channel, result_queue, num_workers, on_result)
+        service.start()
+        ...  # 生产者向channel写入裁剪图
+        service.stop()  # 等待在途图片全部识别完成
+    """
+
+    def __init__(self, channel, result_queue, num_workers, on_result, patterns=CARD_PATTERNS,
+                 cache=None):
+        """
+        参数：
+            channel: 共享内存帧通道
+            result_queue: 结果队列（Manager队列）
+            num_workers: OCR进程数
+            on_result: 结果回调 on_result(meta, number, validated)，在收集线程中调用
+            patterns: 证件号码正则表达式
+            cache: 识别结果缓存（OcrCache，None表示不使用）
+        """
+        self.channel = channel
+        self.result_queue = result_queue
+        self.num_workers = num_workers
+        self.on_result = on_result
+        self.patterns = patterns
+        self.cache = cache
+        self.recognized = 0
+        self._workers = []
+        self._collector = None
+
+    def start(self):
+        """启动OCR进程与结果收集线程"""
+        ctx = get_context('spawn')
+        self._workers = [
+            ctx.Process(target=ocr_worker, args=(self.channel, self.result_queue, self.patterns, self.cache),
+                        daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        """收集识别结果，直到所有OCR进程都已退出"""
+        remaining = self.num_workers
+        while remaining:
+            item = self.result_queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            meta, number, validated = item
+            self.recognized += 1
+            self.on_result(meta, number, validated)
+
+    def stop(self):
+        """发送结束标记并等待全部在途图片识别完成"""
+        self.channel.close_input(self.num_workers)
+        for worker in self._workers:
+            worker.join()
+            if worker.exitcode != 0:
+                # 异常退出的进程可能未放入结束标记，补发以免收集线程永久等待
+                self.result_queue.put(None)
+        if self._collector is not None:
+            self._collector.join()
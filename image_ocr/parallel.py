@@ -1,17 +1,44 @@
 import os
+import time
+import random
+from collections import defaultdict
 
 import pandas as pd
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
 #============= 系统自定义模块 =============
-from image_ocr.card_processor import OptimizedCardProcessor
+from image_ocr.card_processor import OptimizedCardProcessor, CARD_PATTERNS
 from image_ocr.process_utils import merge_results
+from image_ocr.ocr_cache import OcrCache
+from utils.image_manifest import load_image_entries
+from utils.columnar import TableWriter, CARD_COLUMNS
+from utils.checkpoint import CheckpointJournal, DEFAULT_MAX_RETRIES, guarded_call, run_units, unit_key
+from image_ocr.scheduler import (
+    resolve_layout, candidate_layouts, save_cached_layout,
+    make_cpu_slots, configure_worker, describe_layout
+)
 #=========================================
 
-def init_process():
-    """初始化子进程"""
+# 常驻模式下每个任务包含的图片数（小批次便于各进程均衡取用）
+RESIDENT_BATCH_SIZE = 8
+# 自动调优时每个进程分到的校准批次数
+CALIBRATION_BATCHES_PER_WORKER = 3
+
+def init_process(cpu_threads=None, cpu_slots=None, cache=None):
+    """初始化子进程：应用线程数与核心绑定"""
     global processor
-    processor = OptimizedCardProcessor()
+    if cpu_threads:
+        configure_worker(cpu_threads, cpu_slots)
+    processor = OptimizedCardProcessor(cpu_threads, cache)
+
+
+def init_resident_process(cpu_threads=None, cpu_slots=None, cache=None):
+    """初始化常驻子进程：应用线程数与核心绑定，一次性加载并预热级联第一级模型
+    启用结果缓存时不预加载，模型在首次缓存未命中时加载（全部命中的进程不加载模型）
+    """
+    init_process(cpu_threads, cpu_slots, cache)
+    if cache is None:
+        processor.load_models()
 
 
 def process_batch_wrapper(args):
@@ -20,50 +47,256 @@ def process_batch_wrapper(args):
     return processor.process_batch(chunk, folder_path, patterns)
 
 
-def calculate_processes(file_count, max_processes=None):
-    """动态计算最优进程数"""
-    cpu_count = os.cpu_count() or 4
-    max_p = min(cpu_count * 2, max_processes) if max_processes else cpu_count * 2
-    return min(max_p, max(4, (file_count // 10) + 1))
+def process_resident_batch(args):
+    """常驻模式批量处理包装器（不释放模型）"""
+    chunk, folder_path, patterns = args
+    return processor.process_batch(chunk, folder_path, patterns, release_models=False)
+
+
+def timed_resident_batch(args):
+    """校准用包装器：返回 (进程号, 批次耗时)"""
+    start = time.perf_counter()
+    process_resident_batch(args)
+    return os.getpid(), time.perf_counter() - start
+
 
-def optimized_parallel_process(folder_path, num_processes=None):
+def optimized_parallel_process(folder_path, num_processes=None, use_cache=True,
+                               output_path=None, output_format=None,
+                               checkpoint=True, max_retries=DEFAULT_MAX_RETRIES):
     """并行处理流程
     参数：
         folder_path: 待处理图片目录路径
-        num_processes: 最大允许进程数 (None表示自动计算)
+        num_processes: 最大允许进程数 (None表示使用本机调优布局，见autotune_layout)
+        use_cache: 是否使用持久化识别结果缓存（见image_ocr.ocr_cache）
+        output_path: 结果文件路径（None表示不写出），每个分块完成后作为一个记录批次写出
+        output_format: 结果文件格式，'csv'/'parquet'/'arrow'，None表示按扩展名推断
+        checkpoint: 是否启用检查点（按图片清单指纹记录已完成的分块及其结果）
+        max_retries: 失败分块的重试轮数
     流程：
         1. 配置正则表达式模式
-        2. 动态计算进程数
-        3. 分块处理图像文件
-        4. 并行执行OCR识别
+        2. 按物理核心确定 进程数×线程数 布局
+        3. 分块处理图像文件（检查点中已完成的分块直接恢复结果）
+        4. 并行执行OCR识别，失败的分块按轮重试
         5. 合并处理结果
     """
     # 配置证件号码正则表达式
-    patterns = {
-        "idcard": r"(\d{17}[\dXx]|\d{15}[\dXx])",  # 身份证规则：15位或17位数字（末位允许X）
-        "bankcard": r"\d{16,20}",                   # 银行卡规则：16-20位连续数字
-    }
+    patterns = CARD_PATTERNS
 
-    # 文件列表预处理
-    file_list = [f for f in os.listdir(folder_path) if f.lower().endswith('.jpeg')]
+    # 图片记录（读取Step_1写出的图片清单，无需扫描目录）
+    file_list = load_image_entries(folder_path)
     total_files = len(file_list)
-    num_processes = calculate_processes(total_files, num_processes)  # 动态计算进程数
-    chunk_size = max(10, (total_files // num_processes) + 1)         # 最小分块10文件
+    layout = resolve_layout(num_processes, max_workers=max(1, total_files // 10))  # 最小分块10文件
+    num_processes = layout['workers']
+    chunk_size = max(10, (total_files // num_processes) + 1)
     print(f"将文件分块： {chunk_size}/块 ")
-    print(f"使用 {num_processes} 个处理器并行分析分片...\n")
+    print(f"使用 {describe_layout(layout)} 并行分析分片...\n")
     file_chunks = [file_list[i:i + chunk_size] for i in range(0, total_files, chunk_size)]
 
     # 多进程执行
-    with ProcessPoolExecutor(max_workers=num_processes, initializer=init_process) as executor:
-        tasks = [(chunk, folder_path, patterns) for chunk in file_chunks]
-        results = list(tqdm(
-            executor.map(process_batch_wrapper, tasks),
-            total=len(file_chunks),
-            desc="Processing Images"  # 进度条提示
-        ))
+    cache = OcrCache() if use_cache else None
+    journal = CheckpointJournal('ocr', image_fingerprint(file_list)) if checkpoint and file_list else None
+    writer = TableWriter(output_path, CARD_COLUMNS, output_format) if output_path else None
+
+    def run_round(tasks, count):
+        # 每轮新建进程池（上一轮进程池可能因工作进程崩溃而不可用）
+        with ProcessPoolExecutor(max_workers=max(1, min(count, num_processes)), initializer=init_process,
+                                 initargs=(layout['threads'], make_cpu_slots(layout), cache)) as executor:
+            yield from tqdm(executor.map(guarded_call, tasks), total=count,
+                            desc="Processing Images")  # 进度条提示
+
+    def on_result(unit, batch):
+        if writer is not None:
+            writer.write_rows(batch)
+            writer.flush()
+
+    units = [(unit_key(e.image_id for e in chunk), process_batch_wrapper, (chunk, folder_path, patterns))
+             for chunk in file_chunks]
+    try:
+        results = run_units(units, run_round, journal, on_result, max_retries)
+    finally:
+        if writer is not None:
+            writer.close()
     print("图片处理成功")
+    if journal is not None:
+        journal.finish()
     # 合并结果
     final_result = []
-    for batch in results:
-        final_result.extend(batch)
-    return pd.DataFrame(final_result)
\ No newline at end of file
+    for unit in units:
+        final_result.extend(results[unit[0]])
+    return pd.DataFrame(final_result)
+
+
+def image_fingerprint(file_list):
+    """图片记录集合的指纹（图片ID + 内容哈希），作为OCR阶段检查点的输入标识"""
+    return unit_key((e.image_id, e.digest) for e in file_list)
+
+
+def write_results(result_df, output_path=None, output_format=None):
+    """按记录批次写出识别结果（output_path为None时不写出），返回原DataFrame"""
+    if output_path:
+        with TableWriter(output_path, CARD_COLUMNS, output_format) as writer:
+            writer.write_rows(result_df.to_dict('records'))
+    return result_df
+
+
+def split_workers(type_counts, num_processes):
+    """按各证件类型的图片数量分配专用进程数
+    参数：
+        type_counts: {证件类型: 图片数量}
+        num_processes: 进程总数
+    返回：
+        {证件类型: 进程数}，有图片的类型至少分得1个进程
+    """
+    active = {t: n for t, n in type_counts.items() if n}
+    total = sum(active.values())
+    spare = max(0, num_processes - len(active))
+    return {t: 1 + spare * n // total for t, n in active.items()}
+
+
+def resident_parallel_process(folder_path, num_processes=None, batch_size=RESIDENT_BATCH_SIZE,
+                              specialize=True, use_cache=True, result_store=None,
+                              output_path=None, output_format=None,
+                              checkpoint=True, max_retries=DEFAULT_MAX_RETRIES):
+    """常驻模型并行处理流程
+    参数：
+        folder_path: 待处理图片目录路径
+        num_processes: 最大允许进程数 (None表示使用本机调优布局，见autotune_layout)
+        batch_size: 每个任务的图片数
+        specialize: 是否按证件类型使用专用进程（身份证进程/银行卡进程）
+        use_cache: 是否使用持久化识别结果缓存（命中的图片不再识别）
+        result_store: 结果库（utils.result_store.ResultStore），每个批次完成后按手机号upsert
+        output_path: 结果文件路径（None表示不写出），按手机号合并后按记录批次写出
+        output_format: 结果文件格式，'csv'/'parquet'/'arrow'，None表示按扩展名推断
+        checkpoint: 是否启用检查点（按图片清单指纹记录已完成的批次及其结果）
+        max_retries: 失败批次的重试轮数
+    流程：
+        1. 按证件类型对图片分组，切分为小批次任务（检查点中已完成的批次直接恢复结果）
+        2. 每个进程在初始化时加载并预热轻量模型，之后处理所有分到的批次而不重新加载；
+           服务端模型只在有图片校验失败需要升级的进程中按需加载并常驻
+        3. 专用模式下身份证与银行卡各有独立进程池，批次内证件类型一致
+        4. 各进程从任务队列中持续取用小批次，合并结果
+    注意：
+        专用模式至少需要2个进程；进程数不足或只有一种证件时退化为通用进程池
+    """
+    patterns = CARD_PATTERNS
+
+    file_list = load_image_entries(folder_path)
+    layout = resolve_layout(num_processes, max_workers=max(1, -(-len(file_list) // batch_size)))
+    num_processes = layout['workers']
+    files_by_type = {
+        "idcard": [e for e in file_list if e.card_type == 'idcard'],
+        "bankcard": [e for e in file_list if e.card_type == 'bankcard'],
+    }
+    workers = split_workers({t: len(f) for t, f in files_by_type.items()}, num_processes)
+    if not workers:
+        return write_results(pd.DataFrame(columns=list(CARD_COLUMNS)), output_path, output_format)
+    if not specialize or len(workers) < 2 or num_processes < 2:
+        # 通用进程池：每个进程同时常驻所需的全部模型
+        files_by_type = {tuple(workers): [f for files in files_by_type.values() for f in files]}
+        workers = {tuple(workers): num_processes}
+    else:
+        files_by_type = {(t,): files_by_type[t] for t in workers}
+        workers = {(t,): n for t, n in workers.items()}
+
+    print(f"常驻模型模式：{batch_size} 张/批，{describe_layout(layout)}")
+    for card_types, count in workers.items():
+        print(f"  {'+'.join(card_types)}: {count} 个进程")
+
+    cache = OcrCache() if use_cache else None
+    journal = CheckpointJournal('ocr', image_fingerprint(file_list)) if checkpoint else None
+
+    units, pool_of = [], {}
+    for card_types in workers:
+        files = files_by_type[card_types]
+        for i in range(0, len(files), batch_size):
+            batch = files[i:i + batch_size]
+            unit = unit_key(e.image_id for e in batch)
+            pool_of[unit] = card_types
+            units.append((unit, process_resident_batch, (batch, folder_path, patterns)))
+
+    def run_round(tasks, count):
+        # 各进程池的进程从同一队列领取互不重叠的核心集合；进程池只为本轮有任务的证件类型创建
+        cpu_slots = make_cpu_slots(layout)
+        pools = {}
+        try:
+            futures = []
+            for task in tasks:
+                card_types = pool_of[task[0]]
+                if card_types not in pools:
+                    pools[card_types] = ProcessPoolExecutor(
+                        max_workers=workers[card_types], initializer=init_resident_process,
+                        initargs=(layout['threads'], cpu_slots, cache))
+                futures.append(pools[card_types].submit(guarded_call, task))
+            for future in tqdm(as_completed(futures), total=count, desc="Processing Images"):
+                yield future.result()
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+
+    def on_result(unit, batch):
+        if result_store is not None:
+            result_store.upsert_cards(batch)
+
+    results = run_units(units, run_round, journal, on_result, max_retries)
+    print("图片处理成功")
+    # 同一手机号的身份证与银行卡可能由不同进程识别，需按手机号合并
+    result_df = write_results(merge_results(results[unit[0]] for unit in units),
+                              output_path, output_format)
+    if journal is not None:
+        journal.finish()
+    return result_df
+
+
+def calibrate_layout(folder_path, file_list, layout):
+    """
+    功能: 用一组校准图片测量指定布局的吞吐量
+    输入:
+        folder_path: 图片目录
+        file_list: 校准图片记录（循环使用，保证每个进程分到CALIBRATION_BATCHES_PER_WORKER批）
+        layout: 进程布局
+    输出: 吞吐量（张/秒）
+    说明:
+        模型加载在进程初始化中完成，不计入耗时；
+        各进程并发处理，以最忙进程的累计处理时间作为完成时间
+    """
+    count = layout['workers'] * CALIBRATION_BATCHES_PER_WORKER * RESIDENT_BATCH_SIZE
+    files = [file_list[i % len(file_list)] for i in range(count)]
+    busy = defaultdict(float)
+    with ProcessPoolExecutor(max_workers=layout['workers'], initializer=init_resident_process,
+                             initargs=(layout['threads'], make_cpu_slots(layout))) as executor:
+        futures = [executor.submit(timed_resident_batch,
+                                   (files[i:i + RESIDENT_BATCH_SIZE], folder_path, CARD_PATTERNS))
+                   for i in range(0, count, RESIDENT_BATCH_SIZE)]
+        for future in futures:
+            pid, elapsed = future.result()
+            busy[pid] += elapsed
+    return count / max(max(busy.values()), 1e-6)
+
+
+def autotune_layout(folder_path, sample_size=64):
+    """自动调优 进程数×线程数 布局
+    参数：
+        folder_path: 校准图片目录（通常为Step_1输出的图片目录）
+        sample_size: 抽取的校准图片数
+    流程：
+        1. 从目录中抽取身份证与银行卡图片作为校准集
+        2. 对每个候选布局（每进程1/2/4/8线程，用满全部物理核心）测量吞吐量
+        3. 选择吞吐量最高的布局并按主机缓存，之后作为默认布局
+    返回：
+        最优布局字典
+    """
+    file_list = load_image_entries(folder_path)
+    if not file_list:
+        raise ValueError(f"校准目录中没有图片: {folder_path}")
+    random.Random(0).shuffle(file_list)
+    sample = file_list[:sample_size]
+
+    best, best_rate = None, 0.0
+    for layout in candidate_layouts():
+        rate = calibrate_layout(folder_path, sample, layout)
+        print(f"  {describe_layout(layout)}: {rate:.1f} 张/秒")
+        if rate > best_rate:
+            best, best_rate = layout, rate
+    save_cached_layout(best)
+    print(f"最优布局：{describe_layout(best)}（已缓存为本机默认布局）")
+    return best
@@ -1,4 +1,9 @@
+import time
+import threading
 import pandas as pd
+#============= 系统自定义模块 =============
+from utils.columnar import RESULT_COLUMNS
+#=========================================
 
 def merge_results(all_results):
     """高效合并结果
@@ -6,7 +11,7 @@ def merge_results(all_results):
         all_results: 多批次处理结果列表
     功能：
         1. 按手机号聚合数据
-        2. 保留每个手机号的首个有效身份证/银行卡信息
+        2. 保留每个手机号的首个有效身份证/银行卡信息（通过校验的号码优先）
         3. 自动过滤重复记录
     返回：
         pandas.DataFrame 最终合并结果
@@ -21,10 +26,131 @@ def merge_results(all_results):
                 result_dict[phone] = item
             # 已有记录：补充缺失字段
             else:
-                # 身份证合并策略：保留首个有效记录
-                if item['idcard'] and not result_dict[phone]['idcard']:
-                    result_dict[phone]['idcard'] = item['idcard']
-                # 银行卡合并策略：同上
-                if item['bankcard'] and not result_dict[phone]['bankcard']:
-                    result_dict[phone]['bankcard'] = item['bankcard']
-    return pd.DataFrame(result_dict.values())  # 转换为DataFrame格式
\ No newline at end of file
+                # 身份证/银行卡合并策略：保留首个有效记录，已有记录未通过校验时由通过校验的记录替换
+                for card_type in ('idcard', 'bankcard'):
+                    flag = f'{card_type}_validated'
+                    current = result_dict[phone]
+                    if item[card_type] and (not current[card_type] or
+                                            (item.get(flag) and not current.get(flag))):
+                        current[card_type] = item[card_type]
+                        current[flag] = item.get(flag, False)
+    return pd.DataFrame(result_dict.values())  # 转换为DataFrame格式
+
+class ResultJoiner:
+    """内存结果关联器（一体化流程使用）
+
+    功能：
+        1. 随OCR结果到达按手机号累积证件号码及校验标记（合并策略同merge_results）
+        2. 收集各网络流的敏感信息
+        3. 按手机号内连接输出最终结果（同Step_3的inner merge）
+    """
+
+    COLUMNS = list(RESULT_COLUMNS)
+
+    def __init__(self):
+        self.flows = []   # 各网络流的敏感信息字典
+        self.cards = {}   # 手机号 -> {'idcard': str, 'bankcard': str, '<类型>_validated': bool}
+
+    def add_flows(self, infos):
+        """追加网络流敏感信息"""
+        self.flows.extend(infos)
+
+    def add_card(self, phone, card_type, number, validated=False):
+        """追加一条OCR识别结果"""
+        entry = self.cards.setdefault(phone, {"idcard": "", "bankcard": "",
+                                              "idcard_validated": False, "bankcard_validated": False})
+        flag = f"{card_type}_validated"
+        if number and (not entry[card_type] or (validated and not entry[flag])):
+            entry[card_type] = number
+            entry[flag] = validated
+
+    @staticmethod
+    def _row(info, card):
+        """一行关联结果（字段顺序同COLUMNS）"""
+        return [info.get('username') or '', info.get('password') or '',
+                info.get('name') or '', info['phone'], card['idcard'], card['bankcard'],
+                card['idcard_validated'], card['bankcard_validated']]
+
+    def rows(self):
+        """逐行产出关联结果（字段顺序同COLUMNS），仅保留两侧都存在的手机号"""
+        for info in self.flows:
+            phone = info.get('phone')
+            card = self.cards.get(phone) if phone else None
+            if card is None:
+                continue
+            yield self._row(info, card)
+
+
+class StreamJoiner(ResultJoiner):
+    """流式结果关联器（流式处理使用）
+
+    功能：
+        1. 网络流与OCR结果随到随关联（合并策略同ResultJoiner），按手机号暂存未输出的网络流
+        2. 手机号的身份证与银行卡号码都已识别时立即输出该手机号下的网络流；
+           否则在该手机号最后一次更新settle秒后输出已有结果（至少识别出一种证件号码）
+        3. 已输出的手机号在retention秒内又收到更新（如另一张证件稍后识别完成）时，
+           重新输出一行（输出文件只追加，同一手机号以最后一行为准）
+        4. 超过retention秒仍没有证件结果的网络流丢弃（同内连接），
+           内存占用只与retention时间窗内的手机号数有关
+    注意：
+        网络流在主线程中加入，OCR结果在收集线程中加入，各方法加锁
+    """
+
+    def __init__(self, settle=10.0, retention=600.0):
+        super().__init__()
+        self.settle = settle
+        self.retention = retention
+        self.pending = {}   # 手机号 -> 未输出的网络流敏感信息列表
+        self.emitted = {}   # 手机号 -> 已输出的网络流敏感信息列表
+        self.updated = {}   # 手机号 -> 最后一次更新时间（time.monotonic）
+        self._lock = threading.Lock()
+
+    def _touch(self, phone):
+        self.updated[phone] = time.monotonic()
+        if phone in self.emitted and phone not in self.pending:
+            self.pending[phone] = self.emitted.pop(phone)  # 已输出的结果有更新，重新输出
+
+    def add_flows(self, infos):
+        """追加网络流敏感信息（没有手机号的网络流无法关联，跳过）"""
+        with self._lock:
+            for info in infos:
+                phone = info.get('phone')
+                if not phone:
+                    continue
+                self.emitted.pop(phone, None)
+                self.pending.setdefault(phone, []).append(info)
+                self.updated[phone] = time.monotonic()
+
+    def add_card(self, phone, card_type, number, validated=False):
+        """追加一条OCR识别结果（结果有变化时才视为更新）"""
+        with self._lock:
+            before = dict(self.cards.get(phone) or {})
+            super().add_card(phone, card_type, number, validated)
+            if self.cards[phone] != before:
+                self._touch(phone)
+
+    def ready_rows(self, final=False):
+        """
+        功能: 取出当前可输出的关联结果
+        输入: final: 输入已结束，输出全部可关联的网络流
+        输出: list，每个元素为一行（字段顺序同COLUMNS）
+        """
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for phone in list(self.pending):
+                card = self.cards.get(phone)
+                idle = now - self.updated[phone]
+                if card and (card['idcard'] or card['bankcard']):
+                    if final or (card['idcard'] and card['bankcard']) or idle >= self.settle:
+                        infos = self.emitted[phone] = self.pending.pop(phone)
+                        rows.extend(self._row(info, card) for info in infos)
+                elif final or idle >= self.retention:
+                    del self.pending[phone]
+            # 超出保留时间的手机号不再等待更新
+            for phone in [p for p, t in self.updated.items()
+                          if now - t >= self.retention and p not in self.pending]:
+                self.updated.pop(phone)
+                self.emitted.pop(phone, None)
+                self.cards.pop(phone, None)
+        return rows
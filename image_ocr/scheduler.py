@@ -0,0 +1,190 @@
+import os
+import json
+import queue
+import platform
+from multiprocessing import get_context
+import cv2
+#============= 系统自定义模块 =============
+from config.PATH import OCR_layout_cache
+#=========================================
+
+try:
+    import psutil  # 可选依赖：非Linux系统上获取物理核心数与设置CPU亲和性
+except ImportError:
+    psutil = None
+
+# 每个OCR进程的默认推理线程数（MKLDNN在2线程左右时单线程效率最高）
+DEFAULT_THREADS_PER_WORKER = 2
+# 自动调优时尝试的每进程线程数
+CANDIDATE_THREADS = (1, 2, 4, 8)
+
+
+def allowed_cpus():
+    """当前进程允许使用的逻辑CPU编号列表"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    if psutil is not None:
+        try:
+            return sorted(psutil.Process().cpu_affinity())
+        except (AttributeError, psutil.Error):
+            pass
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_cores():
+    """
+    功能: 获取物理核心拓扑
+    输出: list[list[int]]，每个物理核心对应的逻辑CPU编号（超线程兄弟线程归入同一核心）
+    说明:
+        Linux读取/sys下的thread_siblings_list；
+        其他系统在安装psutil时按物理核心数把相邻逻辑CPU归组（Windows按核心连续编号超线程），
+        否则每个逻辑CPU视为一个核心
+    """
+    cpus = allowed_cpus()
+    siblings = {}
+    for cpu in cpus:
+        path = f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"
+        try:
+            with open(path) as f:
+                key = f.read().strip()
+        except OSError:
+            break
+        siblings.setdefault(key, []).append(cpu)
+    else:
+        if siblings:
+            return sorted(siblings.values())
+
+    physical = psutil.cpu_count(logical=False) if psutil is not None else None
+    if physical and len(cpus) == (os.cpu_count() or len(cpus)) and len(cpus) % physical == 0:
+        per_core = len(cpus) // physical
+        return [cpus[i:i + per_core] for i in range(0, len(cpus), per_core)]
+    return [[cpu] for cpu in cpus]
+
+
+def build_layout(workers, threads, cores=None):
+    """
+    功能: 生成 进程数×每进程线程数 的布局，并为每个进程分配互不重叠的物理核心
+    输入:
+        workers: 进程数
+        threads: 每进程推理线程数
+        cores: physical_cores()的结果（None表示自动获取）
+    输出:
+        dict: {'workers': int, 'threads': int, 'cpu_sets': list[list[int]] 或 None}
+              核心数不足以互不重叠地分配时cpu_sets为None（不绑定）
+    """
+    cores = cores if cores is not None else physical_cores()
+    workers, threads = max(1, workers), max(1, threads)
+    cpu_sets = None
+    if workers * threads <= len(cores):
+        cpu_sets = [sorted(cpu for core in cores[i * threads:(i + 1) * threads] for cpu in core)
+                    for i in range(workers)]
+    return {'workers': workers, 'threads': threads, 'cpu_sets': cpu_sets}
+
+
+def default_layout(cores=None):
+    """按物理核心数计算的默认布局（每进程DEFAULT_THREADS_PER_WORKER线程）"""
+    cores = cores if cores is not None else physical_cores()
+    threads = min(DEFAULT_THREADS_PER_WORKER, len(cores))
+    return build_layout(len(cores) // threads, threads, cores)
+
+
+def candidate_layouts(cores=None):
+    """自动调优的候选布局：每种线程数下用满全部物理核心"""
+    cores = cores if cores is not None else physical_cores()
+    return [build_layout(len(cores) // threads, threads, cores)
+            for threads in CANDIDATE_THREADS if threads <= len(cores)]
+
+
+def host_key(cores=None):
+    """主机标识（主机名 + 拓扑），拓扑变化后缓存自动失效"""
+    cores = cores if cores is not None else physical_cores()
+    return f"{platform.node()}|{len(cores)}c|{sum(len(core) for core in cores)}t"
+
+
+def load_cached_layout(cache_file=OCR_layout_cache):
+    """读取本机缓存的调优布局，不存在时返回None"""
+    cores = physical_cores()
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            entry = json.load(f).get(host_key(cores))
+    except (OSError, ValueError):
+        return None
+    if not entry:
+        return None
+    return build_layout(entry['workers'], entry['threads'], cores)
+
+
+def save_cached_layout(layout, cache_file=OCR_layout_cache):
+    """按主机保存调优布局（同一缓存文件可存放多台主机的结果）"""
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[host_key()] = {'workers': layout['workers'], 'threads': layout['threads']}
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+
+def resolve_layout(num_processes=None, max_workers=None):
+    """
+    功能: 确定OCR进程布局
+    输入:
+        num_processes: 指定进程数（None表示使用本机缓存的调优布局，无缓存时使用默认布局）
+        max_workers: 进程数上限（如任务数），超出时截断
+    输出: 布局字典（同build_layout）
+    说明: 指定进程数时，每进程线程数按物理核心数平均分配
+    """
+    cores = physical_cores()
+    if num_processes:
+        layout = build_layout(num_processes, len(cores) // num_processes, cores)
+    else:
+        layout = load_cached_layout() or default_layout(cores)
+    if max_workers and layout['workers'] > max_workers:
+        layout = build_layout(max_workers, layout['threads'], cores)
+    return layout
+
+
+def make_cpu_slots(layout):
+    """
+    功能: 把布局中的核心集合放入队列，供各工作进程初始化时领取
+    输出: 队列（布局不绑定核心时为None）
+    """
+    if not layout['cpu_sets']:
+        return None
+    slots = get_context().Queue()
+    for cpu_set in layout['cpu_sets']:
+        slots.put(cpu_set)
+    return slots
+
+
+def configure_worker(threads, cpu_slots=None):
+    """
+    功能: 在工作进程初始化时应用线程数与核心绑定
+    输入:
+        threads: 推理线程数（同时限制OpenCV线程数）
+        cpu_slots: make_cpu_slots返回的队列
+    说明:
+        领取不到核心集合（如进程异常后重建）或系统不支持时不绑定，不影响识别
+    """
+    cv2.setNumThreads(threads)
+    if cpu_slots is None:
+        return
+    try:
+        cpu_set = cpu_slots.get(timeout=1)
+    except queue.Empty:
+        return
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpu_set)
+        elif psutil is not None:
+            psutil.Process().cpu_affinity(cpu_set)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+
+def describe_layout(layout):
+    """布局的简要描述（用于输出）"""
+    pinned = "绑定核心" if layout['cpu_sets'] else "不绑定核心"
+    return f"{layout['workers']} 进程 × {layout['threads']} 线程（{pinned}）"
@@ -0,0 +1,116 @@
+import re
+from datetime import date
+
+# 身份证号码（GB 11643-1999）校验位计算参数
+ID_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+ID_CHECK_CODES = "10X98765432"
+
+# 各证件类型允许的号码长度（按优先顺序）
+CARD_LENGTHS = {
+    "idcard": (18, 15),
+    "bankcard": (16, 19, 17, 18),
+}
+
+# OCR常见的数字误识字符
+_CONFUSABLE = str.maketrans({
+    'O': '0', 'o': '0', 'D': '0', 'Q': '0',
+    'I': '1', 'l': '1', '|': '1', 'i': '1',
+    'Z': '2', 'z': '2',
+    'S': '5', 's': '5',
+    'b': '6', 'G': '6',
+    'B': '8',
+    'g': '9', 'q': '9',
+})
+
+
+def luhn_valid(number):
+    """
+    功能: 银行卡号Luhn校验
+    输入: number: 纯数字字符串
+    输出: bool
+    """
+    if not number.isdigit():
+        return False
+    total = 0
+    for i, ch in enumerate(reversed(number)):
+        digit = ord(ch) - 48
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def _birth_date_valid(year, month, day):
+    """出生日期是否为合法日期"""
+    try:
+        date(year, month, day)
+    except ValueError:
+        return False
+    return True
+
+
+def id_number_valid(number):
+    """
+    功能: 身份证号码校验
+    输入: number: 15位或18位号码字符串（末位可为X）
+    输出: bool
+    说明:
+        18位号码按GB 11643计算校验位；
+        15位旧号码没有校验位，只检查出生日期（YYMMDD）是否合法
+    """
+    if len(number) == 18:
+        if not number[:17].isdigit():
+            return False
+        total = sum(int(ch) * w for ch, w in zip(number[:17], ID_WEIGHTS))
+        return ID_CHECK_CODES[total % 11] == number[17].upper()
+    if len(number) == 15 and number.isdigit():
+        return _birth_date_valid(1900 + int(number[6:8]), int(number[8:10]), int(number[10:12]))
+    return False
+
+
+def is_valid_number(number, card_type):
+    """按证件类型校验号码"""
+    if not number:
+        return False
+    if card_type == "idcard":
+        return id_number_valid(number)
+    return len(number) in CARD_LENGTHS["bankcard"] and luhn_valid(number)
+
+
+def iter_candidates(text, card_type):
+    """
+    功能: 从OCR文本中逐个产出候选号码（可能重复）
+    输入:
+        text: OCR识别文本（多行/多个文本框以空格分隔）
+        card_type: 'idcard' 或 'bankcard'
+    输出: 生成器，候选号码字符串
+    实现逻辑:
+        1. 按空白切分文本，提取各片段中的数字串（身份证允许末位X）
+        2. 长度恰为允许长度的数字串作为候选
+        3. 相邻数字串依次拼接（银行卡号常按4位分组印刷），拼接长度为允许长度时作为候选
+        4. 对常见误识字符（O→0、I→1、S→5等）替换后重复以上步骤
+    注意:
+        不在长数字串中滑动截取，避免校验位碰巧通过而产生错误号码
+    """
+    run_pattern = r'\d+[Xx]?' if card_type == "idcard" else r'\d+'
+    lengths = CARD_LENGTHS[card_type]
+    longest = max(lengths)
+    tokens = text.split()
+
+    for variant in (tokens, [token.translate(_CONFUSABLE) for token in tokens]):
+        groups = [run for token in variant for run in re.findall(run_pattern, token)]
+        for group in groups:
+            if len(group) in lengths:
+                yield group.upper()
+        for i, group in enumerate(groups):
+            joined = group
+            for following in groups[i + 1:]:
+                if not joined[-1].isdigit():  # X只能出现在末位
+                    break
+                joined += following
+                if len(joined) > longest:
+                    break
+                if len(joined) in lengths:
+                    yield joined.upper()
@@ -0,0 +1,249 @@
+import re
+import struct
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# 按缩小倍数的解码标志（libjpeg在DCT阶段直接缩小，不生成全分辨率像素）
+REDUCED_COLOR_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                       4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+REDUCED_GRAY_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                      4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+# 帧头（SOF）标记：C4(DHT)/C8(JPG)/CC(DAC)不是帧头
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# 可按重启间隔截取条带的帧类型：基线/扩展顺序Huffman编码（渐进式需要多遍扫描，不支持）
+_SEQUENTIAL_SOF = (0xC0, 0xC1)
+# 扫描数据中的重启标记（RST0~RST7）与结束标记（EOI）
+_SCAN_MARKER = re.compile(rb'\xff[\xd0-\xd7\xd9]')
+_EOI = b'\xff\xd9'
+_EXIF_ORIENTATION_TAG = 0x0112
+
+_U16 = struct.Struct('>H')
+
+# JPEG头部信息
+#   width/height: 存储方向的图像尺寸
+#   orientation: EXIF方向（1~8，无EXIF为1）
+#   sof: 帧类型标记；sof_offset: SOF标记在数据中的偏移
+#   restart_interval: 重启间隔（每段包含的MCU数，0表示没有重启标记）
+#   mcu_width/mcu_height: MCU尺寸（像素）
+#   scan_offset: 第一个扫描的熵编码数据起始偏移
+#   interleaved: 第一个扫描是否包含全部分量（单次扫描即可解出整幅图像）
+JpegInfo = namedtuple('JpegInfo', 'width height orientation sof sof_offset restart_interval '
+                                  'mcu_width mcu_height scan_offset interleaved')
+
+
+def _exif_orientation(payload):
+    """从APP1(Exif)段中读取方向标签，读取失败返回1"""
+    if payload[:6] != b'Exif\x00\x00':
+        return 1
+    tiff = payload[6:]
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    try:
+        ifd = struct.unpack_from(endian + 'I', tiff, 4)[0]
+        count = struct.unpack_from(endian + 'H', tiff, ifd)[0]
+        for i in range(count):
+            tag, _, _, value = struct.unpack_from(endian + 'HHIH', tiff, ifd + 2 + i * 12)
+            if tag == _EXIF_ORIENTATION_TAG:
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        pass
+    return 1
+
+
+def jpeg_info(data):
+    """
+    功能: 只解析JPEG头部标记段，获取尺寸、方向与扫描结构，不解码像素
+    输入: data: 图片字节（bytes/memoryview）
+    输出: JpegInfo；非JPEG或头部不完整时返回None
+    """
+    if bytes(data[:2]) != b'\xff\xd8':
+        return None
+    size = len(data)
+    pos = 2
+    orientation, restart_interval, frame = 1, 0, None
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # 无长度字段的独立标记
+            pos += 2
+            continue
+        length = _U16.unpack_from(data, pos + 2)[0]
+        payload = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1:
+            orientation = _exif_orientation(bytes(payload))
+        elif marker == 0xDD and length >= 4:
+            restart_interval = _U16.unpack_from(payload, 0)[0]
+        elif marker in _SOF_MARKERS and length >= 8:
+            height, width = struct.unpack_from('>HH', payload, 1)
+            components = payload[5]
+            sampling = [payload[6 + i * 3 + 1] for i in range(components)]
+            h_max = max(s >> 4 for s in sampling)
+            v_max = max(s & 0x0F for s in sampling)
+            if components == 1:  # 单分量扫描的MCU固定为一个8x8块
+                h_max = v_max = 1
+            frame = (marker, pos, width, height, components, 8 * h_max, 8 * v_max)
+        elif marker == 0xDA:
+            if frame is None or not frame[2] or not frame[3]:  # 高度为0（DNL）时无法确定尺寸
+                return None
+            sof, sof_offset, width, height, components, mcu_width, mcu_height = frame
+            return JpegInfo(width, height, orientation, sof, sof_offset, restart_interval,
+                            mcu_width, mcu_height, pos + 2 + length, payload[0] == components)
+        pos += 2 + length
+    return None
+
+
+def oriented_size(info):
+    """按EXIF方向旋转后的 (宽, 高)（方向5~8为旋转90°）"""
+    if info.orientation >= 5:
+        return info.height, info.width
+    return info.width, info.height
+
+
+def reduced_factor(crop_width, max_width):
+    """
+    功能: 选择解码缩小倍数
+    输入:
+        crop_width: 全分辨率下裁剪区域的宽度（像素）
+        max_width: 输出裁剪图的目标宽度（像素）
+    输出: 1/2/4/8中缩小后裁剪宽度仍不小于目标宽度的最大倍数
+    """
+    for factor in (8, 4, 2):
+        if crop_width / factor >= max_width:
+            return factor
+    return 1
+
+
+def jpeg_strip(data, info, y_start, y_end):
+    """
+    功能: 按重启间隔截取只包含指定行范围的JPEG条带（无损，不重新编码）
+    输入:
+        data: JPEG字节
+        info: jpeg_info的结果
+        y_start/y_end: 需要的像素行范围（存储方向）
+    输出: (条带JPEG字节, 条带首行在原图中的行号)；不满足条件或无收益时返回None
+    实现逻辑:
+        1. 顺序Huffman编码的图像中，每个重启间隔独立解码（DC预测在重启标记处清零）
+        2. 取落在MCU行边界上的重启间隔作为条带起止，覆盖[y_start, y_end)
+        3. 保留文件头（帧头高度改为条带高度），拼接条带内各间隔的熵编码数据，
+           重启标记从RST0起重新编号，末尾补EOI
+        解码器只对条带内的MCU做熵解码与反变换
+    """
+    interval = info.restart_interval
+    if not interval or info.sof not in _SEQUENTIAL_SOF or not info.interleaved:
+        return None
+    per_row = -(-info.width // info.mcu_width)
+    rows = -(-info.height // info.mcu_height)
+    total = rows * per_row
+    intervals = -(-total // interval)
+
+    # 起止行对齐到重启间隔边界（行首MCU序号是间隔长度的整数倍）
+    start_row = min(rows, y_start // info.mcu_height)
+    while start_row and start_row * per_row % interval:
+        start_row -= 1
+    end_row = max(start_row + 1, -(-y_end // info.mcu_height))
+    while end_row < rows and end_row * per_row % interval:
+        end_row += 1
+    end_row = min(end_row, rows)
+    if start_row == 0 and end_row == rows:
+        return None
+    first = start_row * per_row // interval
+    last = -(-end_row * per_row // interval)
+
+    # 定位各重启间隔的熵编码数据（只有RST与EOI标记，填充的0xFF00不会匹配）
+    markers = []
+    for match in _SCAN_MARKER.finditer(data, info.scan_offset):
+        markers.append(match.start())
+        if data[match.start() + 1] == 0xD9:
+            break
+    if len(markers) != intervals or data[markers[-1] + 1] != 0xD9:
+        return None
+    starts = [info.scan_offset] + [m + 2 for m in markers[:-1]]
+
+    header = bytearray(data[:info.scan_offset])
+    height = min(info.height, end_row * info.mcu_height) - start_row * info.mcu_height
+    _U16.pack_into(header, info.sof_offset + 5, height)
+    parts = [bytes(header)]
+    for j, k in enumerate(range(first, last)):
+        parts.append(data[starts[k]:markers[k]])
+        parts.append(bytes((0xFF, 0xD0 + j % 8)) if k < last - 1 else _EOI)
+    return b''.join(parts), start_row * info.mcu_height
+
+
+def box_pixels(box, scaled_width, scaled_height, row_offset, shape):
+    """裁剪框比例换算到解码后图像的像素坐标（条带只包含部分行，行号扣除条带起始行）"""
+    x1_ratio, y1_ratio, x2_ratio, y2_ratio = box
+    return (max(0, int(scaled_width * x1_ratio)),
+            max(0, int(scaled_height * y1_ratio) - row_offset),
+            min(shape[1], int(scaled_width * x2_ratio)),
+            min(shape[0], int(scaled_height * y2_ratio) - row_offset))
+
+
+def decode_card_region(data, box, color, max_width, window=None, locate=None):
+    """
+    功能: 按裁剪框解码证件照片的有效区域，直接输出OCR所需尺度的裁剪图
+    输入:
+        data: 图片字节（bytes/memoryview）
+        box: 裁剪框比例 (x1, y1, x2, y2)，相对于按EXIF方向旋转后的图像
+        color: True输出BGR彩色，False输出灰度（JPEG直接解出亮度分量）
+        max_width: 输出裁剪图的最大宽度（像素），更大的裁剪图按INTER_AREA缩小
+        window: 号码定位的搜索框比例（None表示不定位，直接按box裁剪）
+        locate: 定位函数 (搜索区域图像, box在区域中的像素坐标) -> 号码裁剪框或None
+            （见number_locator.locate_number_band）
+    输出: 裁剪图 (numpy数组)；无法解码时返回None
+    实现逻辑:
+        1. 从JPEG头部读取尺寸与方向，按裁剪宽度与目标宽度选择IMREAD_REDUCED_*缩小倍数
+        2. 无方向旋转且带重启标记的顺序JPEG只解码覆盖搜索框（或裁剪框）行的条带（jpeg_strip）
+        3. 指定定位函数时在搜索区域中定位号码条带，定位失败回退到固定比例的box
+        4. 按裁剪框裁剪，再缩放到目标宽度
+        非JPEG图片（如PNG）按原方式全尺寸解码后裁剪
+    """
+    if locate is None:
+        window = None
+    decode_box = window or box
+    flags = REDUCED_COLOR_FLAGS if color else REDUCED_GRAY_FLAGS
+    info = jpeg_info(data)
+    factor, row_offset = 1, 0
+    if info is not None:
+        width, height = oriented_size(info)
+        # 缩小倍数按固定裁剪框宽度（即预期号码宽度）选择，搜索框不影响输出分辨率
+        factor = reduced_factor(width * (box[2] - box[0]), max_width)
+        if info.orientation == 1:
+            strip = jpeg_strip(data, info, int(height * decode_box[1]), int(height * decode_box[3]) + 1)
+            if strip is not None:
+                data, row_offset = strip
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags[factor])
+    if img is None:
+        return None
+
+    if info is not None:
+        scaled_width = -(-width // factor)
+        scaled_height = -(-height // factor)
+        row_offset = row_offset // factor
+    else:
+        scaled_height, scaled_width = img.shape[:2]
+    x1, y1, x2, y2 = box_pixels(box, scaled_width, scaled_height, row_offset, img.shape)
+
+    if window is not None:
+        wx1, wy1, wx2, wy2 = box_pixels(window, scaled_width, scaled_height, row_offset, img.shape)
+        region = img[wy1:wy2, wx1:wx2]
+        if region.size:
+            found = locate(region, (x1 - wx1, y1 - wy1, x2 - wx1, y2 - wy1))
+            if found is not None:
+                x1, y1, x2, y2 = found[0] + wx1, found[1] + wy1, found[2] + wx1, found[3] + wy1
+    crop = img[y1:y2, x1:x2]
+
+    if crop.shape[1] > max_width:
+        target = (max_width, max(1, round(crop.shape[0] * max_width / crop.shape[1])))
+        crop = cv2.resize(crop, target, interpolation=cv2.INTER_AREA)
+    return crop
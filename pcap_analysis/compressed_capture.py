@@ -0,0 +1,287 @@
+import os
+import zlib
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import zstandard  # 可选依赖：读取.pcap.zst压缩抓包文件
+except ImportError:
+    zstandard = None
+#============= 系统自定义模块 =============
+from pcap_analysis.pcap_reader import (
+    mapped_capture, iter_packets, PcapStreamParser, CaptureFormatError
+)
+#=========================================
+
+# 压缩格式（按文件头识别，不依赖扩展名）
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_ZSTD = 'zstd'
+_GZIP_MAGIC = b'\x1f\x8b\x08'            # gzip成员头（含deflate压缩方法）
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'        # zstd帧头
+_ZSTD_SKIPPABLE = (0x184D2A50, 0x184D2A5F)  # zstd可跳过帧的魔数范围
+
+# 每次送入解压器的压缩数据大小
+DECOMPRESS_SLICE = 256 * 1024
+# 单个解压任务的输出上限：帧/成员更大时分多次解压，内存占用与帧大小无关
+TASK_OUTPUT_LIMIT = 32 * 1024 * 1024
+# 解压线程数（zlib/zstandard解压时释放GIL，线程即可并行）
+DECOMPRESS_WORKERS = max(2, min(8, os.cpu_count() or 2))
+# 每个解压线程的在途任务数上限（解析跟不上时不再提交新任务，形成背压）
+IN_FLIGHT_PER_WORKER = 2
+
+# 无法从文件中得到原始大小时按该压缩比估算
+ESTIMATED_RATIO = 4
+# deflate的最大压缩比（ISIZE超出该比例的候选成员头视为伪成员头）
+DEFLATE_MAX_RATIO = 1032
+
+_U32_LE = struct.Struct('<I')
+_DECOMPRESS_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard else (zlib.error,)
+
+
+def capture_compression(path):
+    """
+    功能: 识别抓包文件的压缩格式
+    输入: path: 抓包文件路径
+    输出: 'gzip' / 'zstd'，未压缩时返回None
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    if head.startswith(_GZIP_MAGIC):
+        return COMPRESSION_GZIP
+    if head == _ZSTD_MAGIC or (len(head) == 4 and
+                               _ZSTD_SKIPPABLE[0] <= _U32_LE.unpack(head)[0] <= _ZSTD_SKIPPABLE[1]):
+        return COMPRESSION_ZSTD
+    return None
+
+
+def capture_size(path):
+    """
+    功能: 抓包文件的原始（解压后）大小，用于判断是否需要分片处理
+    输入: path: 抓包文件路径
+    输出: 字节数 (int)；未压缩时为文件大小
+    说明:
+    - zstd取各帧头中的原始大小（zstd命令行压缩文件时总会写入），
+      缺少原始大小的帧按ESTIMATED_RATIO估算
+    - gzip取各成员尾部的ISIZE（原始大小对2^32取模），
+      按成员压缩大小补足被截断的高位（原始数据不小于压缩数据）；
+      成员边界按成员头特征查找，结果为估算值
+    """
+    compression = capture_compression(path)
+    if compression is None:
+        return os.path.getsize(path)
+    with mapped_capture(path) as buf:
+        frames = _zstd_frames(buf) if compression == COMPRESSION_ZSTD else _gzip_members(buf)
+        return sum(size if size is not None else (end - start) * ESTIMATED_RATIO
+                   for start, end, size in frames)
+
+
+def _zstd_frames(buf):
+    """
+    遍历zstd帧（按帧头与块头跳过，不解压），返回 [(起点, 终点, 原始大小或None)]
+    可跳过帧（skippable frame）不包含数据，直接略过；末尾截断的帧按到文件末尾处理
+    """
+    frames, offset, end = [], 0, len(buf)
+    while offset + 4 <= end:
+        magic = _U32_LE.unpack_from(buf, offset)[0]
+        if _ZSTD_SKIPPABLE[0] <= magic <= _ZSTD_SKIPPABLE[1]:
+            if offset + 8 > end:
+                break
+            offset += 8 + _U32_LE.unpack_from(buf, offset + 4)[0]
+            continue
+        if magic != 0xFD2FB528:
+            if not frames:
+                raise CaptureFormatError("zstd帧头无效")
+            break  # 末尾的无效数据
+        if offset + 5 > end:
+            break
+        descriptor = buf[offset + 4]
+        fcs_flag, single_segment = descriptor >> 6, descriptor >> 5 & 1
+        dict_size = (0, 1, 2, 4)[descriptor & 3]
+        fcs_size = (1 if single_segment else 0, 2, 4, 8)[fcs_flag]
+        pos = offset + 5 + (0 if single_segment else 1) + dict_size
+        size = None
+        if fcs_size and pos + fcs_size <= end:
+            size = int.from_bytes(buf[pos:pos + fcs_size], 'little') + (256 if fcs_size == 2 else 0)
+        pos += fcs_size
+        # 块头3字节：最低位为末块标志，第1-2位为块类型，其余为块大小（RLE块只占1字节）
+        while pos + 3 <= end:
+            header = int.from_bytes(buf[pos:pos + 3], 'little')
+            block_type = header >> 1 & 3
+            if block_type == 3:
+                raise CaptureFormatError(f"zstd块类型无效（偏移 {pos}）")
+            pos += 3 + (1 if block_type == 1 else header >> 3)
+            if header & 1:
+                pos += 4 if descriptor & 4 else 0  # 内容校验和
+                break
+        else:
+            pos = end
+        frames.append((offset, min(pos, end), size))
+        offset = pos
+    return frames
+
+
+def _gzip_header_at(buf, pos):
+    """pos处是否为合法的gzip成员头（魔数、保留标志位、XFL与OS字段）"""
+    return (buf[pos:pos + 3] == _GZIP_MAGIC and pos + 10 <= len(buf)
+            and not buf[pos + 3] & 0xE0 and buf[pos + 8] in (0, 2, 4)
+            and (buf[pos + 9] <= 13 or buf[pos + 9] == 255))
+
+
+def _gzip_starts(buf):
+    """
+    按成员头特征逐个产出gzip成员的候选起点
+    gzip成员不记录压缩长度，压缩数据中偶然出现的伪成员头在解压时排除（见iter_decompressed）
+    """
+    pos = 0
+    while pos >= 0:
+        if _gzip_header_at(buf, pos):
+            yield pos
+        pos = buf.find(_GZIP_MAGIC, pos + 1)
+
+
+def _gzip_members(buf):
+    """
+    gzip成员列表 [(起点, 终点, 原始大小)]（不解压，用于估算原始大小）
+    原始大小取终点之前4字节的ISIZE；ISIZE与压缩长度之比超出deflate上限的候选成员头
+    （未压缩的存储块中偶然出现的成员头等）并入前一个成员，
+    末尾成员（文件截断时ISIZE无效）按ESTIMATED_RATIO估算
+    """
+    members, start = [], None
+    for candidate in [*_gzip_starts(buf), len(buf)]:
+        if start is None:
+            start = candidate
+            continue
+        length = candidate - start
+        size = _U32_LE.unpack_from(buf, candidate - 4)[0] if length >= 18 else 0
+        # ISIZE只保留低32位：原始数据不会明显小于压缩数据（存储块每64KB只有5字节开销）
+        while size < length - length // 1000 - 23:
+            size += 1 << 32
+        if size > length * DEFLATE_MAX_RATIO:
+            if candidate < len(buf):
+                continue
+            size = length * ESTIMATED_RATIO
+        members.append((start, candidate, size))
+        start = candidate
+    return members
+
+
+def _new_decompressor(compression):
+    if compression == COMPRESSION_GZIP:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)  # 解压一个gzip成员（校验CRC与长度）
+    return zstandard.ZstdDecompressor().decompressobj()  # 解压一个zstd帧
+
+
+def _decompress_part(buf, pos, decompressor):
+    """
+    功能: 解压任务（在解压线程中执行）
+    输入:
+        buf: 压缩文件内容（mmap）
+        pos: 本次从该偏移继续读取压缩数据
+        decompressor: 帧/成员的解压器（首次解压时新建，分多次解压时沿用）
+    输出: (数据块列表, 下一个读取偏移, 解压器)
+        帧/成员结束时解压器为None；输出达到TASK_OUTPUT_LIMIT时提前返回解压器，
+        由调用方提交后续任务继续解压；文件在帧中间截断时视为结束
+    异常: 数据损坏时抛出zlib.error/zstandard.ZstdError
+    """
+    blocks, size = [], 0
+    while size < TASK_OUTPUT_LIMIT:
+        data = buf[pos:pos + DECOMPRESS_SLICE]
+        if not data:
+            return blocks, pos, None
+        block = decompressor.decompress(data)
+        if block:
+            blocks.append(block)
+            size += len(block)
+        if decompressor.eof:
+            return blocks, pos + len(data) - len(decompressor.unused_data), None
+        pos += len(data)
+    return blocks, pos, decompressor
+
+
+def iter_decompressed(path, workers=None):
+    """
+    功能: 流式解压抓包文件，按顺序逐块产出原始数据（不生成解压后的临时文件）
+    输入:
+        path: .pcap.gz / .pcap.zst 等压缩抓包文件路径（按文件头识别格式）
+        workers: 解压线程数（None表示DECOMPRESS_WORKERS）
+    输出: 生成器，按原始顺序逐块产出bytes
+    异常:
+        ImportError: zstd文件且未安装zstandard
+        CaptureFormatError: 文件不是gzip/zstd格式，或第一个帧/成员无法解压
+    调用关系: 被iter_capture_packets、pcap_parser（向tshark标准输入送数据）与live_stream调用
+
+    实现逻辑:
+    1. 不解压先定位各帧（zstd按帧头/块头跳过）或成员（gzip按成员头特征查找）
+    2. 每个帧/成员是独立的解压任务，由线程池并行解压，在途任务数有上限；
+       多帧zstd（pzstd、zstd -B等）与多成员gzip（pigz -i、拼接的.gz文件等）得到并行加速
+    3. 按顺序取结果：帧/成员的结束位置决定下一个起点，不在起点上的候选成员头
+       （gzip压缩数据中偶然出现的魔数）直接丢弃
+    4. 单个任务输出达到上限时在同一线程池中继续解压剩余部分，
+       单帧文件的解压也与下游解析重叠进行；内存占用与文件和帧大小无关
+    """
+    compression = capture_compression(path)
+    if compression is None:
+        raise CaptureFormatError(f"不是gzip/zstd压缩文件: {path}")
+    if compression == COMPRESSION_ZSTD and zstandard is None:
+        raise ImportError("读取zstd压缩的抓包文件需要安装zstandard")
+    workers = workers or DECOMPRESS_WORKERS
+
+    with mapped_capture(path) as buf, ThreadPoolExecutor(workers) as executor:
+        if compression == COMPRESSION_ZSTD:
+            starts = iter([start for start, _, _ in _zstd_frames(buf)])
+        else:
+            starts = _gzip_starts(buf)  # 随解压进度查找，不预先扫描整个文件
+        in_flight = deque()  # (起点, future)，按起点排序
+        expected = 0         # 下一个帧/成员的起点
+        produced = False
+        try:
+            while True:
+                while len(in_flight) < workers * IN_FLIGHT_PER_WORKER:
+                    start = next(starts, None)
+                    if start is None:
+                        break
+                    if start >= expected:
+                        in_flight.append((start, executor.submit(
+                            _decompress_part, buf, start, _new_decompressor(compression))))
+                if not in_flight:
+                    return
+                start, future = in_flight.popleft()
+                if start < expected:  # 伪成员头（位于已解压的成员内部）
+                    future.cancel()
+                    continue
+                if start > expected and compression == COMPRESSION_GZIP:
+                    return  # 成员之后不是新的成员头：忽略尾部数据（同gzip命令）
+                try:
+                    blocks, pos, decompressor = future.result()
+                except _DECOMPRESS_ERRORS as e:
+                    if not produced:
+                        raise CaptureFormatError(f"压缩数据损坏: {e}") from e
+                    print(f"压缩数据损坏，忽略偏移 {start} 之后的数据: {e}")
+                    return
+                if decompressor is not None:
+                    # 当前帧/成员未解压完：先提交剩余部分，解压与下游处理本批数据同时进行
+                    in_flight.appendleft((pos, executor.submit(_decompress_part, buf, pos, decompressor)))
+                expected, produced = pos, True
+                yield from blocks
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+
+def iter_capture_packets(path):
+    """
+    功能: 遍历抓包文件中的所有数据包，压缩文件边解压边解析
+    输入: path: pcap/pcapng文件路径，或其gzip/zstd压缩文件（.pcap.gz / .pcap.zst 等）
+    输出: 生成器，逐个产出 (timestamp, linktype, data)，data为memoryview
+    调用关系: 被native_parser.iter_http_requests与flow_sharder.shard_pcap_by_flow调用
+    说明: 未压缩文件通过mmap零拷贝访问；压缩文件由iter_decompressed流式解压后交给
+         PcapStreamParser增量解析，不生成解压后的临时文件
+    """
+    if capture_compression(path) is None:
+        with mapped_capture(path) as buf:
+            for _, timestamp, linktype, data in iter_packets(buf):
+                yield timestamp, linktype, data
+        return
+    parser = PcapStreamParser()
+    for block in iter_decompressed(path):
+        yield from parser.feed(block)
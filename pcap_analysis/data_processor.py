@@ -1,102 +1,136 @@
 import urllib.parse
 
 
-def parse_multipart_data(body_hex):
+def _parse_part_headers(headers_raw):
+    """解析分块头部（键名转小写），跳过无法解码或无冒号的行"""
+    headers = {}
+    for line in bytes(headers_raw).split(b'\r\n'):
+        try:
+            line_decoded = line.decode('utf-8', errors='replace')
+            if ':' in line_decoded:
+                key, value = line_decoded.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        except UnicodeDecodeError:  # 跳过无效编码行
+            continue
+    return headers
+
+
+def iter_multipart_parts(data):
+    """
+    功能: 在单个缓冲区上扫描multipart/form-data, 逐个产出数据块
+    输入：data: 请求体（bytes/bytearray/mmap等支持find的缓冲区）
+    输出：生成器，逐个产出 (headers, content)
+        headers: 分块头部字典（小写键名）
+        content: 分块内容（指向data的memoryview，不发生复制）
+    调用关系: 被parse_multipart_data调用
+
+    实现逻辑：
+    1. 以首行（--boundary）构造分隔符 \r\n--boundary
+    2. 用find定位每个分块的头部结束位置与下一个分隔符
+    3. 以偏移切片memoryview产出内容，遇到结束分隔符（--boundary--）停止
+    """
+    if not hasattr(data, 'find'):
+        data = bytes(data)
+    first_end = data.find(b'\r\n')
+    if first_end <= 0:
+        return
+    delimiter = b'\r\n' + bytes(data[:first_end]).rstrip()
+    view = memoryview(data)
+    pos = first_end + 2
+    while True:
+        header_end = data.find(b'\r\n\r\n', pos)
+        if header_end < 0:
+            return
+        next_delim = data.find(delimiter, header_end + 4)
+        content_end = next_delim if next_delim >= 0 else len(data)
+        yield _parse_part_headers(view[pos:header_end]), view[header_end + 4:content_end]
+
+        if next_delim < 0:  # 请求体被截断，没有后续分块
+            return
+        pos = next_delim + len(delimiter)
+        if data[pos:pos + 2] == b'--':  # 结束分隔符
+            return
+        line_end = data.find(b'\r\n', pos)  # 跳过分隔符行尾的填充
+        if line_end < 0:
+            return
+        pos = line_end + 2
+
+
+def classify_multipart_part(headers, content, fields, images):
+    """
+    功能: 把一个multipart分块归类为普通字段或图片
+    输入：
+        headers: 分块头部字典
+        content: 分块内容（bytes或memoryview）
+        fields: 普通字段字典（就地更新）
+        images: 图片列表（就地追加 (文件名, 内容)）
+    """
+    # 必须包含content-disposition头
+    if 'content-disposition' not in headers:
+        return
+
+    # 解析字段名和文件名（支持带引号的参数）
+    cd = headers['content-disposition']
+    field_name = filename = None
+    for item in cd.split(";"):
+        item = item.strip()
+        if item.startswith("name="):
+            field_name = item.split("=", 1)[1].strip('"')
+        elif item.startswith("filename="):
+            filename = item.split("=", 1)[1].strip('"')
+
+    if not field_name:  # 无有效字段名则跳过
+        return
+
+    # 分类处理字段和图片
+    if filename:
+        # 仅接受image/开头的MIME类型
+        if 'content-type' in headers and headers['content-type'].startswith('image/'):
+            images.append((filename, content))
+    else:
+        # 解码普通字段内容（忽略解码错误）
+        try:
+            fields[field_name] = str(content, 'utf-8').strip()
+        except UnicodeDecodeError:
+            pass
+
+
+def parse_multipart_data(body):
     """
     功能: 解析multipart/form-data格式的请求体, 提取普通表单字段和图片文件
-    输入：十六进制字符串格式的请求体
+    输入：原始字节格式的请求体（bytes等支持find的缓冲区）
     输出：元组(fields, images), 其中fields为普通字段字典, images为图片列表（文件名, 二进制内容）
     调用关系: 被flow_processor调用
     
     实现逻辑：
-    1. 将十六进制字符串转换为原始字节数据
-    2. 提取multipart边界标识
-    3. 分割并处理每个数据块
-    4. 解析头部信息判断字段类型
-    5. 分离普通字段和图片文件
+    1. 由iter_multipart_parts在同一缓冲区上按偏移切分数据块
+    2. 解析头部信息判断字段类型
+    3. 分离普通字段和图片文件
+
+    注意:
+    - 图片内容为指向请求体的memoryview，可直接交给np.frombuffer，无需复制
     """
     fields = {}
     images = []
-    
-    # 尝试将十六进制转换为字节数据（处理无效十六进制输入）
-    try:
-        data = bytes.fromhex(body_hex)
-    except ValueError:
-        return fields, images  # 返回空结果
-
-    # 提取multipart边界（首行以--开头）
-    try:
-        boundary_line = data.split(b'\r\n', 1)[0].strip(b'-')
-    except IndexError:  # 处理空数据的情况
-        return fields, images
-
-    # 遍历每个数据块（按边界分割）
-    for part in data.split(boundary_line):
-        part = part.strip(b'\r\n-')  # 清理分隔符残留
-        if not part:  # 跳过空块
-            continue
-
-        # 分割头部和内容（\r\n\r\n分隔）
-        try:
-            headers_raw, content = part.split(b'\r\n\r\n', 1)
-        except ValueError:  # 处理格式错误的分块
-            continue
-
-        # 解析头部信息（使用小写键名）
-        headers = {}
-        for line in headers_raw.split(b'\r\n'):
-            try:
-                line_decoded = line.decode('utf-8', errors='replace')
-                if ':' in line_decoded:
-                    key, value = line_decoded.split(":", 1)
-                    headers[key.strip().lower()] = value.strip()
-            except UnicodeDecodeError:  # 跳过无效编码行
-                continue
-
-        # 必须包含content-disposition头
-        if 'content-disposition' not in headers:
-            continue
-
-        # 解析字段名和文件名（支持带引号的参数）
-        cd = headers['content-disposition']
-        field_name = filename = None
-        for item in cd.split(";"):
-            item = item.strip()
-            if item.startswith("name="):
-                field_name = item.split("=", 1)[1].strip('"')
-            elif item.startswith("filename="):
-                filename = item.split("=", 1)[1].strip('"')
-
-        if not field_name:  # 无有效字段名则跳过
-            continue
 
-        # 分类处理字段和图片
-        if filename:
-            # 仅接受image/开头的MIME类型
-            if 'content-type' in headers and headers['content-type'].startswith('image/'):
-                images.append((filename, content))
-        else:
-            # 解码普通字段内容（忽略解码错误）
-            try:
-                fields[field_name] = content.decode('utf-8').strip()
-            except UnicodeDecodeError:
-                pass
+    # 遍历每个数据块（按分隔符偏移切分）
+    for headers, content in iter_multipart_parts(body):
+        classify_multipart_part(headers, content, fields, images)
 
     return fields, images
 
-def parse_sensitive_data(body_hex):
+def parse_sensitive_data(body):
     """
     功能: 解析URL编码的请求体
-    输入：十六进制字符串格式的请求体
+    输入：原始字节格式的请求体
     输出：敏感参数字典
     调用关系: 被flow_processor调用
     """
     
     try:
-        # 将十六进制字符串转换为字节数据（支持网络抓包数据格式）
         # 使用errors='replace'处理非法字符（如\x00）
-        text = bytes.fromhex(body_hex).decode('utf-8', errors='replace')
-    except Exception:  # 捕获所有可能的转换异常（如空输入、奇数字节长度）
+        text = str(body, 'utf-8', errors='replace')
+    except Exception:  # 捕获所有可能的转换异常（如空输入）
         text = ''  # 初始化空字符串保证后续处理
     
     # 使用urllib解析URL编码参数（支持重复键取首值）
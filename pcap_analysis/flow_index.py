@@ -0,0 +1,301 @@
+import os
+import sys
+import json
+import ipaddress
+import sqlite3
+from array import array
+#============= 系统自定义模块 =============
+from config.PATH import Cache_path
+from pcap_analysis.pcap_reader import (
+    mapped_capture, iter_packets, decode_tcp, capture_format, packet_at, CaptureFormatError
+)
+from pcap_analysis.compressed_capture import capture_compression
+from pcap_analysis.native_parser import TcpReassembler
+from pcap_analysis.pcap_parser import in_scope, REQUEST_SCOPE
+from pcap_analysis.flow_processor import process_flow, request_subjects
+from utils.checkpoint import file_fingerprint
+#=========================================
+
+# 流索引文件（位于抓包文件旁：<抓包文件>.flows；抓包所在目录不可写时放在持久缓存目录下）
+INDEX_SUFFIX = '.flows'
+INDEX_VERSION = 1
+
+# 单个网络流记录的URI数上限（同一URI只记一次）
+MAX_URIS_PER_FLOW = 64
+
+_SCHEMA = """
+CREATE TABLE meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE flows (
+    stream_id   INTEGER PRIMARY KEY,   -- 流ID（与tshark的tcp.stream编号一致）
+    client_port INTEGER NOT NULL,      -- 发出请求一端的端口（flow_key的第一项）
+    src_ip      TEXT NOT NULL,         -- 客户端地址
+    src_port    INTEGER NOT NULL,
+    dst_ip      TEXT NOT NULL,         -- 服务端地址
+    dst_port    INTEGER NOT NULL,
+    linktype    INTEGER NOT NULL,
+    first_ts    REAL NOT NULL,
+    last_ts     REAL NOT NULL,
+    packets     INTEGER NOT NULL,
+    uris        TEXT NOT NULL,         -- JSON数组，按出现顺序去重
+    offsets     BLOB NOT NULL          -- 各数据包记录在抓包文件中的偏移（小端uint64数组）
+);
+CREATE TABLE flow_phones (
+    phone     TEXT NOT NULL,
+    stream_id INTEGER NOT NULL,
+    PRIMARY KEY (phone, stream_id)
+) WITHOUT ROWID;
+"""
+
+_FLOW_COLUMNS = ('stream_id', 'client_port', 'src_ip', 'src_port', 'dst_ip', 'dst_port',
+                 'linktype', 'first_ts', 'last_ts', 'packets', 'uris')
+
+
+def _address_text(address):
+    """原始地址字节转换为文本（IPv4点分十进制 / IPv6冒号十六进制）"""
+    return str(ipaddress.ip_address(bytes(address)))
+
+
+class _IndexedFlow:
+    """建立索引时的单个TCP连接状态"""
+    __slots__ = ('client', 'server', 'client_port', 'linktype', 'first_ts', 'last_ts',
+                 'offsets', 'uris', 'phones')
+
+    def __init__(self, segment, linktype, timestamp):
+        src, dst, src_port, dst_port = segment[:4]
+        self.client = (bytes(src), src_port)    # 暂取首个报文的发送端，出现请求后按请求方向确定
+        self.server = (bytes(dst), dst_port)
+        self.client_port = None
+        self.linktype = linktype
+        self.first_ts = self.last_ts = timestamp
+        self.offsets = array('Q')
+        self.uris = {}
+        self.phones = set()
+
+    def add_request(self, flow_key, request):
+        if self.client_port is None:
+            self.client_port = int(flow_key[0])
+            if self.client[1] != self.client_port:
+                self.client, self.server = self.server, self.client
+        if len(self.uris) < MAX_URIS_PER_FLOW:
+            self.uris.setdefault(request['uri'], None)
+        if in_scope(request):
+            self.phones.update(request_subjects(request))
+
+    def row(self, stream_id):
+        offsets = array('Q', self.offsets)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        return (stream_id, self.client_port, _address_text(self.client[0]), self.client[1],
+                _address_text(self.server[0]), self.server[1], self.linktype,
+                self.first_ts, self.last_ts, len(self.offsets),
+                json.dumps(list(self.uris), ensure_ascii=False), offsets.tobytes())
+
+
+def _index_locations(pcap_file, fingerprint):
+    """流索引的候选路径：抓包文件旁，其次为持久缓存目录（同request_store）"""
+    name = f"{os.path.basename(pcap_file)}-{fingerprint[:16]}{INDEX_SUFFIX}"
+    return [pcap_file + INDEX_SUFFIX, os.path.join(Cache_path, 'flow_index', name)]
+
+
+def build_flow_index(pcap_file):
+    """
+    功能: 一次顺序扫描抓包文件，建立网络流索引（SQLite边车文件）
+    输入: pcap_file: pcap/pcapng文件路径（未压缩）
+    输出: 索引文件路径；两个候选位置都不可写时返回None
+    异常:
+        CaptureFormatError: 压缩抓包文件（压缩数据无法按偏移随机读取，需先解压）
+    调用关系: 被Step_flows与open_flow_index的调用方调用
+
+    实现逻辑:
+    1. mmap遍历数据包，按native后端的规则重组TCP流（流ID与tshark/native编号一致）
+    2. 每个连接记录客户端/服务端地址与端口、时间范围、各数据包记录的偏移
+    3. 解析出的HTTP请求只记录URI与关联的手机号（见flow_processor.request_subjects），
+       请求体随即释放，不保存图片
+    4. 只写入出现过HTTP请求的连接；写入临时文件后原子替换
+
+    说明: 每个数据包的偏移占8字节，索引大小约为数据包数×8字节
+    """
+    if capture_compression(pcap_file) is not None:
+        raise CaptureFormatError("流索引按偏移随机读取数据包，需要未压缩的抓包文件")
+    fingerprint = file_fingerprint(pcap_file)
+
+    reassembler = TcpReassembler()
+    flows = {}  # {流ID: _IndexedFlow}
+    with mapped_capture(pcap_file) as buf:
+        fmt, endian = capture_format(buf) if len(buf) else ('pcap', '<')
+        for offset, timestamp, linktype, data in iter_packets(buf):
+            segment = decode_tcp(linktype, data)
+            if segment is None:
+                continue
+            requests = reassembler.feed(segment, timestamp)
+            stream_id = reassembler.stream_id(reassembler.connection_key(segment)[0])
+            flow = flows.get(stream_id)
+            if flow is None:
+                flow = flows[stream_id] = _IndexedFlow(segment, linktype, timestamp)
+            flow.offsets.append(offset)
+            flow.last_ts = timestamp
+            for flow_key, request in requests:
+                flow.add_request(flow_key, request)
+
+    meta = {'version': INDEX_VERSION, 'fingerprint': fingerprint, 'scope': REQUEST_SCOPE,
+            'format': fmt, 'endian': endian}
+    for path in _index_locations(pcap_file, fingerprint):
+        tmp = path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            conn = sqlite3.connect(tmp)
+        except (OSError, sqlite3.Error):
+            continue
+        try:
+            with conn:
+                conn.executescript(_SCHEMA)
+                conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                                 [(key, json.dumps(value)) for key, value in meta.items()])
+                conn.executemany(f"INSERT INTO flows VALUES ({', '.join('?' * 12)})",
+                                 (flow.row(stream_id) for stream_id, flow in flows.items()
+                                  if flow.client_port is not None))
+                conn.executemany("INSERT OR IGNORE INTO flow_phones VALUES (?, ?)",
+                                 ((phone, stream_id) for stream_id, flow in flows.items()
+                                  for phone in flow.phones))
+        finally:
+            conn.close()
+        os.replace(tmp, path)
+        return path
+    return None
+
+
+class FlowIndex:
+    """
+    网络流索引读取器
+
+    按手机号、流ID或URI前缀查找网络流，按索引中的偏移直接读取其数据包，
+    只重组、处理选中的网络流，无需重新扫描整个抓包文件
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            self.meta = {key: json.loads(value) for key, value in
+                         self._conn.execute("SELECT key, value FROM meta")}
+        except sqlite3.Error:
+            self.meta = {}
+        if self.meta.get('version') != INDEX_VERSION:
+            self.close()
+            raise ValueError(f"不是有效的流索引: {path}")
+
+    def select(self, phones=(), streams=(), uri_prefix=None):
+        """
+        功能: 查找网络流
+        输入:
+            phones: 手机号（含身份证图片归属标识）列表
+            streams: 流ID列表
+            uri_prefix: URI前缀（与前两个条件同时指定时取交集）
+        输出: list[dict]，按流ID排序，字段见_FLOW_COLUMNS（uris为列表），另含phones
+        """
+        conditions, params = [], []
+        if phones or streams:
+            keys = []
+            if phones:
+                keys.append(f"stream_id IN (SELECT stream_id FROM flow_phones WHERE phone IN "
+                            f"({', '.join('?' * len(phones))}))")
+                params.extend(phones)
+            if streams:
+                keys.append(f"stream_id IN ({', '.join('?' * len(streams))})")
+                params.extend(int(stream) for stream in streams)
+            conditions.append(f"({' OR '.join(keys)})")
+        if uri_prefix:
+            conditions.append("EXISTS (SELECT 1 FROM json_each(flows.uris) WHERE substr(value, 1, ?) = ?)")
+            params.extend([len(uri_prefix), uri_prefix])
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn.execute(
+            f"SELECT {', '.join(_FLOW_COLUMNS)} FROM flows{where} ORDER BY stream_id", params).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(zip(_FLOW_COLUMNS, row))
+            entry['uris'] = json.loads(entry['uris'])
+            entry['phones'] = [phone for phone, in self._conn.execute(
+                "SELECT phone FROM flow_phones WHERE stream_id = ?", (entry['stream_id'],))]
+            entries.append(entry)
+        return entries
+
+    def offsets(self, stream_id):
+        """网络流各数据包记录的偏移（array('Q')）"""
+        row = self._conn.execute("SELECT offsets FROM flows WHERE stream_id = ?", (stream_id,)).fetchone()
+        offsets = array('Q')
+        if row is not None:
+            offsets.frombytes(row[0])
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+        return offsets
+
+    def close(self):
+        self._conn.close()
+
+
+def open_flow_index(pcap_file):
+    """
+    功能: 查找与抓包文件匹配的流索引
+    输入: pcap_file: 抓包文件路径
+    输出: FlowIndex；不存在、抓包文件已变化或提取规则（接口列表）不同时返回None
+    """
+    if capture_compression(pcap_file) is not None:
+        return None
+    fingerprint = file_fingerprint(pcap_file)
+    for path in _index_locations(pcap_file, fingerprint):
+        if not os.path.exists(path):
+            continue
+        try:
+            index = FlowIndex(path)
+        except (ValueError, sqlite3.Error):
+            continue
+        if index.meta.get('fingerprint') == fingerprint and index.meta.get('scope') == REQUEST_SCOPE:
+            return index
+        index.close()
+    return None
+
+
+def iter_indexed_requests(pcap_file, index, entries):
+    """
+    功能: 按索引中的偏移读取选中网络流的数据包并重组，逐个产出网络流的请求
+    输入:
+        pcap_file: 抓包文件路径
+        index: FlowIndex
+        entries: FlowIndex.select的结果
+    输出: 生成器，产出 (flow_key, 请求列表)，flow_key与全量解析时相同（源端口, 原流ID）
+    说明: 请求范围同native后端（in_scope）；每个网络流使用独立的重组器
+    """
+    fmt, endian = index.meta['format'], index.meta['endian']
+    with mapped_capture(pcap_file) as buf:
+        for entry in entries:
+            reassembler = TcpReassembler()
+            requests = {}
+            for offset in index.offsets(entry['stream_id']):
+                data = packet_at(buf, offset, fmt, endian)
+                segment = decode_tcp(entry['linktype'], data) if data is not None else None
+                if segment is None:
+                    continue
+                for (src_port, _), request in reassembler.feed(segment):
+                    if in_scope(request):
+                        requests.setdefault((src_port, str(entry['stream_id'])), []).append(request)
+            yield from requests.items()
+
+
+def reextract_flows(pcap_file, index, entries, image_output_dir):
+    """
+    功能: 只重新处理选中的网络流（请求解析 + 图片裁剪输出）
+    输入:
+        pcap_file: 抓包文件路径
+        index: FlowIndex
+        entries: FlowIndex.select的结果
+        image_output_dir: 图片输出目录，或图片输出端对象（同process_large_pcap）
+    输出: list[(flow_key, 敏感信息字典)]，与全量处理时这些网络流的结果一致
+    调用关系: 被Step_flows调用
+    """
+    return [process_flow((flow_key, requests, image_output_dir))
+            for flow_key, requests in iter_indexed_requests(pcap_file, index, entries)]
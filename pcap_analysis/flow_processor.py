@@ -1,10 +1,67 @@
 import os
 # ============= 系统自定义模块 =============
 from pcap_analysis.data_processor import *
+from pcap_analysis.image_sink import resolve_image_sink, encode_jpeg
+from pcap_analysis.request_store import segment_reader
+from pcap_analysis.card_decoder import decode_card_region
+from pcap_analysis.number_locator import locate_number_band
 import cv2
 import numpy as np
 # =========================================
 
+# OCR输入尺度：检测模型把长边缩放到960像素（PaddleOCR det_limit_side_len默认值），
+# 识别模型输入高度为48/32像素，更宽的裁剪图不会给识别带来更多细节
+OCR_INPUT_WIDTH = 960
+
+# 证件裁剪参数（box为裁剪框比例 (x1, y1, x2, y2)，quality为落盘时的JPEG质量，
+# max_width为输出裁剪图的最大宽度，解码时据此选择缩小倍数；
+# window为号码定位的搜索框比例，在其中定位号码条带，定位失败时回退到box，None表示不定位）
+CARD_CROP_PROFILES = {
+    # 银行卡：左右各留空5%，保留40%~75%高度的卡号区域，最高质量彩色保存
+    'bankcard': {'box': (0.05, 0.4, 0.95, 0.75), 'quality': 100, 'color': True,
+                 'max_width': OCR_INPUT_WIDTH, 'window': (0.0, 0.15, 1.0, 0.95)},
+    # 身份证：保留底部号码区域，较低质量灰度保存
+    'idcard': {'box': (0.29, 0.78, 0.8, 0.9), 'quality': 40, 'color': False,
+               'max_width': OCR_INPUT_WIDTH, 'window': (0.0, 0.6, 1.0, 1.0)},
+}
+CARD_TYPE_NAMES = {'bankcard': '银行卡', 'idcard': '身份证'}
+
+# process_request处理的接口（按URI前缀匹配，且只处理带请求体的请求）；
+# 解析阶段据此过滤请求（tshark显示过滤器/native后端），修改处理规则时需同步修改
+SENSITIVE_ENDPOINTS = ('/login.php', '/survey.php', '/verify.php')
+
+# 工作单元划分参数（按请求体字节计量）
+REQUEST_OVERHEAD_BYTES = 1024       # 每个请求的固定开销估计
+MIN_BATCH_BYTES = 256 * 1024        # 单个工作单元的最小字节数
+
+
+def crop_region(img, x1_ratio, y1_ratio, x2_ratio, y2_ratio, color):
+    """
+    按比例裁剪图像（不压缩）
+    参数：
+        img: 输入图像 (numpy数组，BGR格式)
+        x1_ratio/y1_ratio/x2_ratio/y2_ratio: 裁剪框比例 (0.0~1.0，含义同crop_by_ratio)
+        color: 是否保留色彩 (True=彩色模式，False=转为灰度)
+    返回：
+        裁剪后的图像 (numpy数组，彩色为BGR三通道，灰度为单通道)
+    注意:
+        自动处理坐标越界（超出图像尺寸自动截断）
+    """
+    # 获取原始图像尺寸
+    height, width = img.shape[:2]
+    
+    # 计算实际像素坐标（确保坐标不越界）
+    x1 = max(0, int(width * x1_ratio))
+    y1 = max(0, int(height * y1_ratio))
+    x2 = min(width, int(width * x2_ratio))
+    y2 = min(height, int(height * y2_ratio))
+
+    if color:
+        # 彩色模式直接裁剪
+        return img[y1:y2, x1:x2]
+    # 灰度模式：转换颜色空间后裁剪
+    return cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+
 
 def crop_by_ratio(img, x1_ratio, y1_ratio, x2_ratio, y2_ratio, quality, color):
     """
@@ -24,32 +81,130 @@ def crop_by_ratio(img, x1_ratio, y1_ratio, x2_ratio, y2_ratio, quality, color):
         1. 自动处理坐标越界（超出图像尺寸自动截断）
         2. 支持异常图像输入（返回None保证流程继续）
     """
-    # 获取原始图像尺寸
-    height, width = img.shape[:2]
-    
-    # 计算实际像素坐标（确保坐标不越界）
-    x1 = max(0, int(width * x1_ratio))
-    y1 = max(0, int(height * y1_ratio))
-    x2 = min(width, int(width * x2_ratio))
-    y2 = min(height, int(height * y2_ratio))
-
-    ext = '.jpeg'
     try:
-        if color:
-            # 彩色模式直接裁剪
-            _, encoded = cv2.imencode(ext, img[y1:y2, x1:x2], 
-                                    [cv2.IMWRITE_JPEG_QUALITY, quality])
-        else:
-            # 灰度模式：转换颜色空间后裁剪
-            gray_img = cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
-            _, encoded = cv2.imencode(ext, gray_img,
-                                    [cv2.IMWRITE_JPEG_QUALITY, quality])
-        return encoded
+        return encode_jpeg(crop_region(img, x1_ratio, y1_ratio, x2_ratio, y2_ratio, color),
+                           quality)
     except Exception as e:
         # 记录裁剪失败情况（调用方处理日志）
         return None
 
 
+def new_sensitive_info():
+    """
+    功能: 创建单个网络流的敏感信息初始状态
+    输出: 字典 {'username', 'password', 'phone', 'name'}，初始值均为None
+    调用关系: 被process_flow与pcap_parser的流式处理调用
+    """
+    return {
+        'username': None, 
+        'password': None, 
+        'phone': None, 
+        'name': None
+    }
+
+
+def process_request(flow_key, req, sensitive_info, image_sink):
+    """
+    功能: 处理网络流中的单个HTTP请求, 就地更新该流的敏感信息
+    输入:
+        flow_key: 流标识元组 (源端口, 流ID)
+        req: 请求字典 {'uri': str, 'body': bytes}
+        sensitive_info: 当前流的敏感信息字典（由new_sensitive_info创建）
+        image_sink: 图片输出端（由resolve_image_sink创建）
+    输出: 无（结果写入sensitive_info与图片输出端）
+    调用关系: 被process_flow与pcap_parser.process_chunk调用
+
+    说明：
+    同一流内的请求必须按抓包顺序依次传入，银行卡图片命名依赖于
+    此前请求中已解析出的phone字段
+    """
+    url = req.get('uri', '')
+    body = req.get('body')
+    if not body:  # 跳过无请求体的请求
+        return
+
+    # 处理登录请求（/login.php）
+    if url.startswith("/login.php"):
+        # 解析URL编码参数并更新敏感信息
+        params = parse_sensitive_data(body)
+        sensitive_info.update({
+            k: v for k, v in params.items() 
+            if k in sensitive_info
+        })
+
+    # 处理调查表请求（/survey.php）
+    elif url.startswith("/survey.php"):
+        # 解析multipart数据（包含表单字段和银行卡图片）
+        fields, images = parse_multipart_data(body)
+        sensitive_info.update({
+            k: v for k, v in fields.items() 
+            if k in sensitive_info
+        })
+
+        # 处理银行卡图片：优先使用phone字段，否则用流ID
+        phone_tag = sensitive_info.get('phone') or f"flow_{flow_key[1]}"
+        for _, img_data in images:
+            emit_card_image(image_sink, flow_key, phone_tag, 'bankcard', img_data)
+
+    # 处理验证请求（/verify.php）
+    elif url.startswith("/verify.php"):
+        # 解析multipart数据（仅包含身份证图片）
+        _, images = parse_multipart_data(body)
+
+        # 处理身份证图片：保留原始文件名前缀
+        for filename, img_data in images:
+            phone_tag = os.path.splitext(filename)[0]
+            emit_card_image(image_sink, flow_key, phone_tag, 'idcard', img_data)
+
+
+def request_subjects(req):
+    """
+    功能: 取出请求关联的手机号，不处理图片（流索引按手机号查找网络流时使用）
+    输入: req: 请求字典 {'uri': str, 'body': bytes}
+    输出: list[str]，登录/调查表请求中的phone字段，验证请求中身份证图片的文件名前缀，
+         与process_request输出的手机号/图片归属标识一致
+    """
+    url = req.get('uri', '')
+    body = req.get('body')
+    if not body:
+        return []
+    if url.startswith("/login.php"):
+        phone = parse_sensitive_data(body).get('phone')
+    elif url.startswith("/survey.php"):
+        phone = parse_multipart_data(body)[0].get('phone')
+    elif url.startswith("/verify.php"):
+        _, images = parse_multipart_data(body)
+        return [os.path.splitext(filename)[0] for filename, _ in images]
+    else:
+        return []
+    return [phone] if phone else []
+
+
+def emit_card_image(image_sink, flow_key, phone_tag, card_type, img_data):
+    """
+    功能: 解码证件图片, 按证件类型裁剪有效区域后交给图片输出端
+    输入:
+        image_sink: 图片输出端（见image_sink模块）
+        flow_key: 流标识元组
+        phone_tag: 图片归属标识（手机号或流标识）
+        card_type: 'bankcard' 或 'idcard'
+        img_data: 原始图片字节
+    说明:
+        裁剪参数见CARD_CROP_PROFILES，处理失败只打印提示，不影响后续请求；
+        大尺寸JPEG按裁剪区域与OCR输入尺度缩小解码（见card_decoder.decode_card_region），
+        不生成全分辨率像素；照片歪斜、留边时在搜索框中定位号码条带输出紧凑裁剪图
+        （见number_locator.locate_number_band），定位失败回退到固定比例裁剪
+    """
+    profile = CARD_CROP_PROFILES[card_type]
+    try:
+        # 解码图片的有效区域（直接输出OCR输入尺度的裁剪图）
+        crop = decode_card_region(img_data, profile['box'], profile['color'], profile['max_width'],
+                                  profile['window'], locate_number_band)
+        if crop is None:
+            raise ValueError("图片解码失败")
+        image_sink.emit(flow_key, phone_tag, card_type, crop, profile['quality'])
+    except Exception as e:
+        print(f"{CARD_TYPE_NAMES[card_type]}图像处理失败: {str(e)}")
 
 
 def process_flow(args):
@@ -59,7 +214,7 @@ def process_flow(args):
         args: 元组 (流标识, 请求列表, 图片输出目录)
             flow_key: 流标识元组 (源端口, 流ID)
             requests: 当前流的所有HTTP请求列表
-            image_output_dir: 图片输出目录路径
+            image_output_dir: 图片输出目录路径，或图片输出端对象（如共享内存输出端）
     输出: 
         元组 (流标识, 敏感信息字典)，字典包含以下可能字段：
             {'username', 'password', 'phone', 'name'}
@@ -67,111 +222,124 @@ def process_flow(args):
 
     处理逻辑：
     1. 初始化敏感信息字典
-    2. 遍历流中的每个HTTP请求：
+    2. 遍历流中的每个HTTP请求（单个请求的处理见process_request）：
        - 登录请求：解析用户名密码
        - 调查表请求：解析电话号码和银行卡图片
        - 验证请求：解析身份证图片
     3. 合并多次请求中的敏感信息（后出现的值覆盖前值）
     4. 返回最终提取的敏感信息
 
-    图片命名规则：
-    银行卡图片: <phone>_bankcard.jpeg（若phone不存在则使用flow_<流ID>）
-    身份证图片: 原始文件名_idcard.jpeg（保留原始文件名前缀）
+    图片归属规则（图片包输出端，图片写入图片包，归属标识与证件类型记入图片清单）：
+    银行卡图片: <phone>（若phone不存在则使用flow_<流ID>）
+    身份证图片: 原始文件名前缀
     """
     # 解包参数（流标识，请求列表，图片目录）
     flow_key, requests, image_output_dir = args
     
     # 初始化敏感信息存储（使用字典维护最新值）
-    sensitive_info = {
-        'username': None, 
-        'password': None, 
-        'phone': None, 
-        'name': None
-    }
+    sensitive_info = new_sensitive_info()
 
     # 遍历当前流的所有HTTP请求
+    image_sink = resolve_image_sink(image_output_dir)
     for req in requests:
-        url = req.get('uri', '')
-        body = req.get('body', '')
-        if body == '无请求体':  # 跳过无请求体的请求
-            continue
-
-        # 处理登录请求（/login.php）
-        if url.startswith("/login.php"):
-            # 解析URL编码参数并更新敏感信息
-            params = parse_sensitive_data(body)
-            sensitive_info.update({
-                k: v for k, v in params.items() 
-                if k in sensitive_info
-            })
-
-        # 处理调查表请求（/survey.php）
-        elif url.startswith("/survey.php"):
-            # 解析multipart数据（包含表单字段和银行卡图片）
-            fields, images = parse_multipart_data(body)
-            sensitive_info.update({
-                k: v for k, v in fields.items() 
-                if k in sensitive_info
-            })
-
-            # 处理银行卡图片（固定裁剪参数）
-            for filename, img_data in images:
-                try:
-                    # 解码图片并裁剪有效区域（保留卡号区域）
-                    img = cv2.imdecode(
-                        np.frombuffer(img_data, dtype=np.uint8), 
-                        cv2.IMREAD_COLOR
-                    )
-                    processed = crop_by_ratio(
-                        img, 
-                        x1_ratio=0.05,   # 左侧留空5% 
-                        y1_ratio=0.4,    # 顶部留空40%
-                        x2_ratio=0.95,   # 右侧留空5%
-                        y2_ratio=0.75,   # 底部留空25%
-                        quality=100,     # 最高质量保存
-                        color=True       # 保留彩色
-                    )
-                    
-                    if processed is not None:
-                        # 生成文件名：优先使用phone字段，否则用流ID
-                        phone_tag = sensitive_info.get('phone') or f"flow_{flow_key[1]}"
-                        filename = f"{phone_tag}_bankcard.jpeg"
-                        # 保存裁剪后的银行卡图片
-                        with open(os.path.join(image_output_dir, filename), 'wb') as f:
-                            f.write(processed.tobytes())
-                except Exception as e:
-                    print(f"银行卡图像处理失败: {str(e)}")
-
-        # 处理验证请求（/verify.php）
-        elif url.startswith("/verify.php"):
-            # 解析multipart数据（仅包含身份证图片）
-            _, images = parse_multipart_data(body)
-            
-            for filename, img_data in images:
-                try:
-                    # 解码图片并裁剪有效区域（保留身份证底部信息）
-                    img = cv2.imdecode(
-                        np.frombuffer(img_data, dtype=np.uint8), 
-                        cv2.IMREAD_COLOR
-                    )
-                    processed = crop_by_ratio(
-                        img, 
-                        x1_ratio=0.29,   # 左侧留空29%
-                        y1_ratio=0.78,   # 顶部留空78%
-                        x2_ratio=0.8,    # 右侧留空20%
-                        y2_ratio=0.9,    # 底部留空10%
-                        quality=40,      # 较低质量保存
-                        color=False      # 转为灰度
-                    )
-                    
-                    if processed is not None:
-                        # 生成文件名：保留原始文件名前缀
-                        phone_tag = os.path.splitext(filename)[0]
-                        filename = f"{phone_tag}_idcard.jpeg"
-                        # 保存处理后的身份证图片
-                        with open(os.path.join(image_output_dir, filename), 'wb') as f:
-                            f.write(processed.tobytes())
-                except Exception as e:
-                    print(f"身份证图像处理失败: {str(e)}")
+        process_request(flow_key, req, sensitive_info, image_sink)
 
     return (flow_key, sensitive_info)
+
+
+def request_weight(req):
+    """
+    功能: 估算单个请求的处理开销（用于划分工作单元）
+    说明: 以请求体长度计量，另加固定开销，避免大量无请求体的小流被视为零成本
+    """
+    return REQUEST_OVERHEAD_BYTES + len(req.get('body') or b'')
+
+
+def batch_flows_by_bytes(http_requests, num_workers, units_per_worker=4):
+    """
+    功能: 按请求体字节数把网络流划分为工作单元
+    输入:
+        http_requests: {flow_key: [请求字典...]}
+        num_workers: 并行进程数
+        units_per_worker: 每个进程平均分到的工作单元数（越大负载越均衡，调度开销越高）
+    输出:
+        list: 工作单元列表，每个单元为 [(flow_key, 请求列表), ...]
+    调用关系: 被report_generator调用
+
+    说明：
+    - 单元按流出现顺序连续划分，便于结果按原顺序拼接
+    - 目标单元大小 = 总字节数 / (进程数 × units_per_worker)，
+      图片密集的/survey.php、/verify.php流会独占或少量共享一个单元，
+      大量轻量的登录流则合并到同一单元中
+    """
+    flows = [((flow_key, reqs), sum(request_weight(r) for r in reqs))
+             for flow_key, reqs in http_requests.items()]
+    return batch_by_weight(flows, num_workers, units_per_worker)
+
+
+def batch_by_weight(items, num_workers, units_per_worker=4):
+    """
+    功能: 按权重把有序条目连续划分为工作单元（划分规则同batch_flows_by_bytes）
+    输入:
+        items: [(条目, 权重字节数), ...]
+        num_workers: 并行进程数
+        units_per_worker: 每个进程平均分到的工作单元数
+    输出:
+        list: 工作单元列表，每个单元为条目列表
+    """
+    total = sum(weight for _, weight in items)
+    target = max(MIN_BATCH_BYTES, total // max(1, num_workers * units_per_worker))
+
+    batches, current, current_bytes = [], [], 0
+    for item, weight in items:
+        current.append(item)
+        current_bytes += weight
+        if current_bytes >= target:
+            batches.append(current)
+            current, current_bytes = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_store_flows(reader, num_workers, units_per_worker=4):
+    """
+    功能: 按请求存储分段的索引划分工作单元（只读索引，不读取请求体）
+    输入:
+        reader: pcap_analysis.request_store.RequestSegmentReader
+        num_workers/units_per_worker: 同batch_flows_by_bytes
+    输出:
+        list: 工作单元列表，每个单元为流序号列表
+    """
+    flows = [(flow_no, sum(REQUEST_OVERHEAD_BYTES + length for _, length in records))
+             for flow_no, records in enumerate(reader.flow_records())]
+    return batch_by_weight(flows, num_workers, units_per_worker)
+
+
+def process_flow_batch(args):
+    """
+    功能: 处理一个工作单元中的全部网络流（进程池任务入口）
+    输入:
+        args: 元组 (批次序号, 工作单元, 图片输出目录)
+    输出:
+        元组 (批次序号, [(流标识, 敏感信息字典), ...])
+    调用关系: 被report_generator通过进程池调用
+    """
+    batch_index, flows, image_output_dir = args
+    return batch_index, [process_flow((flow_key, reqs, image_output_dir))
+                         for flow_key, reqs in flows]
+
+
+def process_store_batch(args):
+    """
+    功能: 处理请求存储中的一个工作单元（进程池任务入口）
+    输入:
+        args: 元组 (分段文件路径, 流序号列表, 图片输出目录)
+    输出:
+        list: [(流标识, 敏感信息字典), ...]
+    说明: 各进程mmap打开分段文件按索引读取请求，请求体不经进程间传递
+    """
+    path, flow_nos, image_output_dir = args
+    reader = segment_reader(path)
+    return [process_flow((reader.flows[flow_no], reader.flow_requests(flow_no), image_output_dir))
+            for flow_no in flow_nos]
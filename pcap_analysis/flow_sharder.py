@@ -0,0 +1,105 @@
+import os
+import struct
+import zlib
+#============= 系统自定义模块 =============
+from pcap_analysis.pcap_reader import (
+    locate_tcp, pcap_global_header, pcap_record_header, LINKTYPE_RAW
+)
+from pcap_analysis.compressed_capture import iter_capture_packets
+#=========================================
+
+# 分片文件写缓冲区大小
+SHARD_BUFFER_SIZE = 4 * 1024 * 1024
+
+_PORTS = struct.Struct('!HH')
+
+
+def connection_key(src_ip, src_port, dst_ip, dst_port):
+    """
+    功能: 计算TCP连接的方向无关标识
+    输入: 两端的原始地址字节与端口号
+    输出: bytes（对两个端点排序后拼接，同一连接的双向报文得到相同的标识）
+    """
+    local = src_ip + src_port.to_bytes(2, 'big')
+    remote = dst_ip + dst_port.to_bytes(2, 'big')
+    return local + remote if local <= remote else remote + local
+
+
+def segment_connection_key(src_ip, dst_ip, segment):
+    """由locate_tcp的结果计算连接标识（TCP报文段前4字节为源/目的端口）"""
+    src_port, dst_port = _PORTS.unpack_from(segment, 0)
+    return connection_key(src_ip, src_port, dst_ip, dst_port)
+
+
+def flow_shard_index(src_ip, dst_ip, segment, num_shards):
+    """
+    功能: 计算TCP流所属的分片编号
+    输入:
+        src_ip/dst_ip: 原始地址字节
+        segment: TCP报文段（前4字节为源/目的端口）
+        num_shards: 分片总数
+    输出: 分片编号 (int)
+    说明:
+        对端点排序后再哈希，使同一连接的双向报文落入同一分片；
+        使用crc32而非hash()，保证跨进程、跨运行结果稳定
+    """
+    return zlib.crc32(segment_connection_key(src_ip, dst_ip, segment)) % num_shards
+
+
+def shard_pcap_by_flow(pcap_file, output_dir, num_shards, prefix='shard', connections=None):
+    """
+    功能: 一次顺序扫描，按TCP五元组哈希把抓包文件切分为多个分片
+    输入:
+        pcap_file: 源pcap/pcapng文件路径（支持gzip/zstd压缩文件，边解压边分片）
+        output_dir: 分片输出目录
+        num_shards: 分片数量（通常等于并行进程数）
+        prefix: 分片文件名前缀
+        connections: 只保留的连接标识集合（connection_key），None表示保留全部TCP报文
+    输出:
+        list: 非空分片文件路径列表（按编号排序）
+    调用关系: 被report_generator.process_large_pcap调用
+
+    实现逻辑：
+    1. 以mmap方式遍历源文件中的所有数据包（压缩文件由多个线程并行解压后增量解析）
+    2. 剥离链路层头部，只保留IP报文（分片统一写为LINKTYPE_RAW，
+       pcap与pcapng、不同链路类型的输入都能得到格式一致的分片）
+    3. 按五元组哈希写入对应分片，保证每个TCP流完整落在同一分片中
+    4. 非TCP报文与IP分片不参与HTTP解析，直接丢弃；指定connections时其余连接的报文也丢弃
+
+    注意:
+    - 每个分片内的tcp.stream编号独立，合并结果时直接拼接，无需按流ID去重
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, f"{prefix}_{i:03d}.pcap") for i in range(num_shards)]
+    files = [open(path, 'wb', buffering=SHARD_BUFFER_SIZE) for path in paths]
+    counts = [0] * num_shards
+    try:
+        header = pcap_global_header(LINKTYPE_RAW)
+        for f in files:
+            f.write(header)
+
+        for timestamp, linktype, data in iter_capture_packets(pcap_file):
+            located = locate_tcp(linktype, data)
+            if located is None:
+                continue
+            ip_packet, src_ip, dst_ip, segment = located
+            key = segment_connection_key(src_ip, dst_ip, segment)
+            if connections is not None and key not in connections:
+                continue
+            index = zlib.crc32(key) % num_shards
+            f = files[index]
+            f.write(pcap_record_header(timestamp, len(ip_packet)))
+            f.write(ip_packet)
+            counts[index] += 1
+    finally:
+        for f in files:
+            f.close()
+
+    # 删除没有任何报文的分片
+    shards = []
+    for path, count in zip(paths, counts):
+        if count:
+            shards.append(path)
+        else:
+            os.remove(path)
+    return shards
@@ -0,0 +1,81 @@
+import os
+import cv2
+#============= 系统自定义模块 =============
+from utils.image_manifest import manifest_writer, content_hash
+from utils.image_pack import pack_writer, PACK_FILE
+#=========================================
+
+
+def encode_jpeg(img, quality):
+    """
+    功能: 把图像编码为JPEG
+    输入:
+        img: 图像数组（BGR三通道或灰度单通道）
+        quality: JPEG压缩质量 (0-100)
+    输出: JPEG编码的字节数据 (numpy数组)
+    """
+    ok, encoded = cv2.imencode('.jpeg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG编码失败")
+    return encoded
+
+
+class PackImageSink:
+    """
+    图片包输出端：把裁剪后的证件图片编码为JPEG追加到输出目录下的图片包（分步流程使用）
+
+    所有图片写入同一个只追加的数据文件（images.pack）并登记定长索引，不再每张图片一个小文件；
+    每张图片同时追加一条清单记录（流标识、手机号、证件类型、在图片包中的偏移与长度、内容哈希），
+    Step_2读取清单后通过mmap直接取出图片字节，清理时只需删除图片包
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def emit(self, flow_key, phone_tag, card_type, crop, quality):
+        """
+        功能: 输出一张证件裁剪图
+        输入:
+            flow_key: 流标识元组
+            phone_tag: 图片归属标识（手机号或flow_<流ID>）
+            card_type: 'bankcard' 或 'idcard'
+            crop: 裁剪后的图像数组
+            quality: JPEG压缩质量
+        """
+        data = encode_jpeg(crop, quality).tobytes()
+        digest = content_hash(data)
+        manifest = manifest_writer(self.output_dir)
+        image_id = manifest.next_image_id()
+        _, offset = pack_writer(self.output_dir).append(data, digest)
+        # 图片写入图片包后再登记，读取方看到的记录总是对应完整的数据
+        manifest.append(image_id, flow_key, phone_tag, card_type, PACK_FILE, offset, len(data), digest)
+
+
+class SharedMemoryImageSink:
+    """
+    共享内存输出端：把裁剪图像的原始像素写入共享内存帧池，交给OCR进程直接识别（一体化流程使用）
+
+    不做JPEG编码，也不落盘；帧池槽位耗尽时emit阻塞，形成对解析阶段的背压
+    """
+
+    def __init__(self, channel):
+        self.channel = channel  # utils.shared_frames.FrameChannel
+
+    def emit(self, flow_key, phone_tag, card_type, crop, quality):
+        """参数同PackImageSink.emit，quality在此输出端中不使用"""
+        self.channel.put(crop, {
+            'flow_key': flow_key,
+            'phone': phone_tag,
+            'card_type': card_type,
+        })
+
+
+def resolve_image_sink(target):
+    """
+    功能: 把图片输出参数统一为输出端对象
+    输入: target: 目录路径 (str) 或已有的输出端对象
+    输出: 具有emit方法的输出端对象
+    """
+    if isinstance(target, (str, os.PathLike)):
+        return PackImageSink(target)
+    return target
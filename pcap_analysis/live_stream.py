@@ -0,0 +1,322 @@
+import os
+import sys
+import stat
+import time
+import queue
+import signal
+import threading
+from multiprocessing import cpu_count, get_context
+#============= 系统自定义模块 =============
+from pcap_analysis.pcap_reader import PcapStreamParser, decode_tcp, TCP_FIN, TCP_RST
+from pcap_analysis.native_parser import TcpReassembler
+from pcap_analysis.pcap_parser import in_scope
+from pcap_analysis.compressed_capture import capture_compression, iter_decompressed
+from pcap_analysis.flow_processor import process_flow
+#=========================================
+
+# 标准输入的数据源名称
+STDIN_SOURCE = '-'
+# 单次读取的最大字节数（管道/FIFO有多少读多少，不等待读满）
+READ_BLOCK_SIZE = 1024 * 1024
+# 增长中的文件读到末尾后的轮询间隔（秒）
+POLL_INTERVAL = 0.2
+# 读取线程与解析主循环之间的在途数据块上限（解析跟不上时读取线程阻塞，形成背压）
+MAX_QUEUED_BLOCKS = 16
+
+# 连接空闲超时（秒）：超过该时间没有新报文的连接视为结束
+DEFAULT_IDLE_TIMEOUT = 30.0
+# 连接结束（FIN/RST）后保留连接状态的时间（秒），迟到的重传与ACK不会被当作新连接
+CLOSE_LINGER = 5.0
+# 空闲连接检查与结果回收的间隔（秒）
+SWEEP_INTERVAL = 1.0
+# 每个流处理进程的在途流数上限（超过时主循环等待结果，形成背压）
+IN_FLIGHT_PER_WORKER = 4
+
+
+class CaptureFollower:
+    """
+    抓包数据源读取线程
+
+    数据源为标准输入（'-'）、FIFO/命名管道或普通文件：
+    标准输入与FIFO读到EOF（写入端关闭）即结束；普通文件在follow模式下持续跟随文件增长（同tail -f），
+    读到末尾时轮询等待新数据，follow_idle秒内没有增长或调用stop后结束。
+    gzip/zstd压缩的抓包文件（已写完的归档）边解压边读取，不跟随增长。
+    读取在独立线程中进行，主循环按超时取数据块，没有新数据时也能按时检查空闲连接
+    """
+
+    def __init__(self, source, follow=True, follow_idle=None):
+        """
+        参数:
+            source: 抓包文件路径、FIFO路径或'-'（标准输入）
+            follow: 普通文件是否跟随增长（False时读到当前末尾即结束）
+            follow_idle: 跟随模式下文件连续多少秒没有增长即结束（None表示一直跟随直到stop）
+        """
+        self.source = source
+        self.follow = follow
+        self.follow_idle = follow_idle
+        self.blocks = queue.Queue(MAX_QUEUED_BLOCKS)  # 数据块，None表示结束，异常对象表示读取失败
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止读取（阻塞在管道读取上的线程随进程退出）"""
+        self._stop.set()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.blocks.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            if self.source == STDIN_SOURCE:
+                self._read(sys.stdin.buffer, growing=False)
+            elif stat.S_ISREG(os.stat(self.source).st_mode) and capture_compression(self.source):
+                for block in iter_decompressed(self.source):
+                    if not self._put(block):
+                        return
+            else:
+                with open(self.source, 'rb') as f:
+                    growing = self.follow and stat.S_ISREG(os.fstat(f.fileno()).st_mode)
+                    self._read(f, growing)
+        except Exception as e:  # 交给主循环抛出
+            self._put(e)
+            return
+        self._put(None)
+
+    def _read(self, f, growing):
+        """读取数据块直到结束；管道用read1有多少读多少，不等待凑满一个块"""
+        idle_since = time.monotonic()
+        while not self._stop.is_set():
+            block = f.read1(READ_BLOCK_SIZE)
+            if block:
+                idle_since = time.monotonic()
+                if not self._put(block):
+                    return
+                continue
+            if not growing:
+                return  # 管道写入端已关闭
+            if os.fstat(f.fileno()).st_size < f.tell():
+                print(f"抓包文件被截断，停止跟随: {self.source}")
+                return
+            if self.follow_idle is not None and time.monotonic() - idle_since >= self.follow_idle:
+                return
+            time.sleep(POLL_INTERVAL)
+
+
+class _OpenFlow:
+    """已产生目标请求、尚未结束的TCP连接"""
+    __slots__ = ('flow_key', 'client', 'requests', 'fins')
+
+    def __init__(self, flow_key, client):
+        self.flow_key = flow_key
+        self.client = client      # 发出请求的端点 (地址字节, 端口)
+        self.requests = []
+        self.fins = set()         # 已发送FIN的端点
+
+
+class FlowTracker:
+    """
+    流式TCP流跟踪器
+
+    增量重组TCP流，连接上的目标请求（同native后端的in_scope过滤）按连接暂存；
+    连接结束时产出该连接的全部请求：
+      - 收到RST，或客户端（发出请求的一端）/双方都已发送FIN，且没有等待补齐的乱序数据
+      - 空闲超时：超过idle_timeout秒没有新报文
+    结束的连接在CLOSE_LINGER秒后释放重组状态，内存占用只与同时打开的连接数有关。
+
+    时钟取抓包时间戳（回放已有文件时按抓包时间判断空闲），
+    没有新报文时按墙钟时间推进（实时抓包安静期间空闲连接也能按时结束）
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, linger=CLOSE_LINGER):
+        self.idle_timeout = idle_timeout
+        self.linger = min(linger, idle_timeout)
+        self.reassembler = TcpReassembler(linger=None)  # 连接的释放由expire/drain负责
+        self.flows = {}            # 连接标识 -> _OpenFlow
+        self._clock = 0.0          # 已处理报文的最大时间戳
+        self._clock_wall = time.monotonic()
+
+    def clock(self):
+        """当前抓包时钟：最新报文时间戳 + 此后经过的墙钟时间"""
+        return self._clock + (time.monotonic() - self._clock_wall)
+
+    def feed(self, timestamp, linktype, data):
+        """
+        功能: 处理一个数据包
+        输入: PcapStreamParser产出的 (timestamp, linktype, data)
+        输出: list[(flow_key, 请求列表)]，因本报文而结束的流
+        """
+        segment = decode_tcp(linktype, data)
+        if segment is None:
+            return []
+        if timestamp >= self._clock:
+            self._clock, self._clock_wall = timestamp, time.monotonic()
+        key, local = TcpReassembler.connection_key(segment)
+        flags = segment[5]
+
+        finished = []
+        for flow_key, request in self.reassembler.feed(segment, timestamp):
+            if not in_scope(request):
+                continue
+            flow = self.flows.get(key)
+            if flow is not None and flow.flow_key != flow_key:  # 端口重用的新连接，先结束旧连接
+                finished.append(self._finish(key))
+                flow = None
+            if flow is None:
+                flow = self.flows[key] = _OpenFlow(flow_key, local)
+            flow.requests.append(request)
+
+        flow = self.flows.get(key)
+        if flow is not None and flags & (TCP_FIN | TCP_RST):
+            flow.fins.add(local)
+            closed = flags & TCP_RST or flow.client in flow.fins or len(flow.fins) >= 2
+            if closed and not self.reassembler.pending_bytes(key):
+                finished.append(self._finish(key))
+        return finished
+
+    def _finish(self, key):
+        flow = self.flows.pop(key)
+        return flow.flow_key, flow.requests
+
+    def expire(self):
+        """
+        功能: 结束空闲超时的连接并释放已结束连接的重组状态
+        输出: list[(flow_key, 请求列表)]，因空闲超时而结束的流
+        """
+        now = self.clock()
+        finished = []
+        connections = self.reassembler.connections
+        for key, conn in list(connections.items()):
+            idle = now - conn.last_seen
+            if idle >= self.idle_timeout or (conn.closed and idle >= self.linger):
+                del connections[key]
+                if key in self.flows:
+                    finished.append(self._finish(key))
+        return finished
+
+    def drain(self):
+        """输入结束：按流ID顺序结束全部未结束的流"""
+        finished = [self._finish(key) for key in sorted(
+            self.flows, key=lambda k: int(self.flows[k].flow_key[1]))]
+        self.reassembler.connections.clear()
+        return finished
+
+    @property
+    def open_connections(self):
+        return len(self.reassembler.connections)
+
+
+def _ignore_sigint():
+    """流处理进程忽略Ctrl+C，由主进程收尾（处理剩余的流后再退出）"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def stream_capture(source, image_output_dir, on_flow, on_tick=None, max_workers=None,
+                   idle_timeout=DEFAULT_IDLE_TIMEOUT, follow=True, follow_idle=None,
+                   stop_event=None):
+    """
+    功能: 流式处理抓包（增长中的抓包文件、标准输入或FIFO），流结束后立即处理并回调结果
+    输入:
+        source: 抓包文件路径、FIFO路径或'-'（标准输入），pcap/pcapng格式（普通文件也可以是gzip/zstd压缩文件）
+        image_output_dir: 图片输出目录或图片输出端对象（同process_flow，一体化流程传入共享内存输出端）
+        on_flow: 回调 on_flow(flow_key, 敏感信息字典)，每个流处理完成后在主线程中调用
+        on_tick: 回调 on_tick()，每SWEEP_INTERVAL秒及结束时在主线程中调用（如刷新输出文件）
+        max_workers: 流处理进程数（None表示同process_large_pcap按CPU核心数计算）
+        idle_timeout: 连接空闲超时（秒）
+        follow/follow_idle: 普通文件的跟随方式（见CaptureFollower）
+        stop_event: threading.Event，置位后停止读取并处理剩余的流（None表示只在输入结束或Ctrl+C时停止）
+    输出: 处理的流数
+    调用关系: 被Step_stream调用
+
+    处理流程:
+    1. 读取线程按块读取数据源，PcapStreamParser增量切出完整的数据包
+    2. FlowTracker增量重组TCP流，连接结束（FIN/RST/空闲超时）时产出该连接的目标请求
+    3. 结束的流立即提交给进程池执行process_flow（证件图片随即交给图片输出端），
+       在途流数有上限，处理跟不上时暂停读取
+    4. 输入结束或停止时结束全部未结束的流，等待在途流处理完成
+
+    注意:
+    - 使用native解析（TCP重组 + HTTP解析），不依赖tshark
+    - 流按结束顺序处理，结果顺序与批处理（按流ID）不同
+    - tcpdump写文件时需加-U按包刷新，否则数据按缓冲区大小成批写入，延迟取决于流量
+    """
+    max_workers = max_workers or max(2, int(cpu_count() * 0.75))
+    max_in_flight = max_workers * IN_FLIGHT_PER_WORKER
+    follower = CaptureFollower(source, follow, follow_idle)
+    parser = PcapStreamParser()
+    tracker = FlowTracker(idle_timeout)
+    done = queue.Queue()  # 进程池结果回调（结果处理线程）-> 主线程
+    state = {'in_flight': 0, 'flows': 0}
+
+    def collect(block=False):
+        """在主线程中回收已完成的流结果"""
+        while state['in_flight']:
+            try:
+                ok, value = done.get(block, SWEEP_INTERVAL)
+            except queue.Empty:
+                return
+            block = False
+            state['in_flight'] -= 1
+            if ok:
+                state['flows'] += 1
+                on_flow(*value)
+            else:
+                print(f"[流处理异常] {type(value).__name__}: {value}")
+
+    def submit(pool, finished):
+        for flow_key, requests in finished:
+            while state['in_flight'] >= max_in_flight:
+                collect(block=True)
+            state['in_flight'] += 1
+            pool.apply_async(process_flow, ((flow_key, requests, image_output_dir),),
+                             callback=lambda result: done.put((True, result)),
+                             error_callback=lambda e: done.put((False, e)))
+
+    def tick(pool):
+        submit(pool, tracker.expire())
+        collect()
+        if on_tick is not None:
+            on_tick()
+
+    print(f"流式处理: {'标准输入' if source == STDIN_SOURCE else source}"
+          f"（空闲超时 {idle_timeout:g} 秒，{max_workers} 个流处理进程）")
+    with get_context('spawn').Pool(max_workers, initializer=_ignore_sigint) as pool:
+        follower.start()
+        next_sweep = time.monotonic() + SWEEP_INTERVAL
+        try:
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    block = follower.blocks.get(timeout=SWEEP_INTERVAL)
+                except queue.Empty:
+                    block = b''
+                if block is None:
+                    break
+                if isinstance(block, Exception):
+                    raise block
+                for packet in parser.feed(block):
+                    submit(pool, tracker.feed(*packet))
+                if time.monotonic() >= next_sweep:
+                    tick(pool)
+                    next_sweep = time.monotonic() + SWEEP_INTERVAL
+        except KeyboardInterrupt:
+            print("收到中断，处理剩余的流后退出")
+        finally:
+            follower.stop()
+
+        # 输入结束：剩余的流全部结束并等待处理完成
+        submit(pool, tracker.drain())
+        while state['in_flight']:
+            collect(block=True)
+        if on_tick is not None:
+            on_tick()
+    print(f"流式处理结束，共处理 {state['flows']} 个流")
+    return state['flows']
@@ -0,0 +1,365 @@
+import zlib
+#============= 系统自定义模块 =============
+from pcap_analysis.pcap_reader import decode_tcp, TCP_FIN, TCP_SYN, TCP_RST, TCP_ACK
+from pcap_analysis.compressed_capture import iter_capture_packets
+#=========================================
+
+# HTTP/1.x请求方法（用于识别客户端方向的字节流）
+HTTP_METHODS = (b'GET ', b'POST ', b'PUT ', b'HEAD ', b'DELETE ',
+                b'OPTIONS ', b'PATCH ', b'CONNECT ', b'TRACE ')
+_METHOD_PROBE_LEN = 8  # 最长方法名（含空格）的长度
+
+# 单方向乱序缓存上限，超出后跳过缺失的报文段（防止丢包导致内存无限增长）
+MAX_PENDING_BYTES = 16 * 1024 * 1024
+
+# 已关闭（FIN/RST）的连接在最后一个报文之后保留的时长（秒，按抓包时间戳计，约为TIME_WAIT时长），
+# 期间迟到的重传/ACK仍归入原连接，之后释放重组状态
+CLOSED_LINGER = 60.0
+
+_SEQ_MASK = 0xFFFFFFFF
+_SEQ_HALF = 0x80000000
+
+# 方向状态
+_UNDECIDED, _HTTP, _IGNORED = 0, 1, 2
+
+
+class HttpRequestParser:
+    """
+    单方向TCP字节流上的HTTP/1.x请求增量解析器
+
+    支持持久连接与管线化请求，请求体按Content-Length或chunked编码切分，
+    gzip/deflate编码的请求体会被解压（与tshark的http.file_data保持一致）
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self._scan_from = 0   # 下一次查找头部结束符的起点
+        self._head = None     # 已解析的请求头 (uri, headers, body_start, content_length)
+        self._chunks = []     # chunked编码下已收齐的数据块
+        self._chunk_pos = 0   # chunked编码下的解析游标
+
+    def feed(self, data):
+        """
+        功能: 追加按序到达的字节并解析出所有完整请求
+        输入: data: 字节数据（bytes/memoryview）
+        输出: list[(uri, body)]，body为解码后的请求体字节
+        """
+        self.buf += data
+        requests = []
+        while True:
+            request = self._parse_one()
+            if request is None:
+                return requests
+            requests.append(request)
+
+    def _parse_one(self):
+        """尝试从缓冲区头部解析一个完整请求，数据不足时返回None"""
+        buf = self.buf
+        while self._head is None:
+            end = buf.find(b'\r\n\r\n', self._scan_from)
+            if end < 0:
+                self._scan_from = max(0, len(buf) - 3)
+                return None
+            lines = bytes(buf[:end]).split(b'\r\n')
+            self._scan_from = 0
+            parts = lines[0].split(b' ')
+            if len(parts) < 2 or not lines[0].startswith(HTTP_METHODS):
+                del buf[:end + 4]  # 跳过无法识别的请求头
+                continue
+
+            headers = {}
+            for line in lines[1:]:
+                key, sep, value = line.partition(b':')
+                if sep:
+                    headers[key.strip().lower()] = value.strip()
+
+            if b'chunked' in headers.get(b'transfer-encoding', b'').lower():
+                content_length = None
+            else:
+                try:
+                    content_length = max(0, int(headers.get(b'content-length', b'0')))
+                except ValueError:
+                    content_length = 0
+            uri = parts[1].decode('utf-8', errors='replace')
+            self._head = (uri, headers, end + 4, content_length)
+            self._chunks = []
+            self._chunk_pos = end + 4
+
+        uri, headers, body_start, content_length = self._head
+        if content_length is not None:
+            consumed = body_start + content_length
+            if len(buf) < consumed:
+                return None
+            body = bytes(buf[body_start:consumed])
+        else:
+            consumed = self._parse_chunks()
+            if consumed is None:
+                return None
+            body = b''.join(self._chunks)
+
+        del buf[:consumed]
+        self._head = None
+        self._chunks = []
+        return uri, _decode_content(body, headers.get(b'content-encoding', b''))
+
+    def _parse_chunks(self):
+        """解析chunked编码，收齐终止块后返回请求总长度，否则返回None"""
+        buf = self.buf
+        pos = self._chunk_pos
+        while True:
+            line_end = buf.find(b'\r\n', pos)
+            if line_end < 0:
+                self._chunk_pos = pos
+                return None
+            try:
+                size = int(bytes(buf[pos:line_end]).split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                size = 0  # 非法块长度按终止块处理
+
+            if size == 0:
+                # 终止块之后可能跟随trailer，以空行结束
+                if buf[line_end + 2:line_end + 4] == b'\r\n':
+                    return line_end + 4
+                trailer_end = buf.find(b'\r\n\r\n', line_end + 2)
+                if trailer_end < 0:
+                    self._chunk_pos = pos
+                    return None
+                return trailer_end + 4
+
+            data_start = line_end + 2
+            if len(buf) < data_start + size + 2:
+                self._chunk_pos = pos
+                return None
+            self._chunks.append(bytes(buf[data_start:data_start + size]))
+            pos = data_start + size + 2
+
+
+def _decode_content(body, encoding):
+    """按Content-Encoding解压请求体，失败时保留原始内容"""
+    encoding = encoding.strip().lower()
+    try:
+        if encoding in (b'gzip', b'x-gzip'):
+            return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        if encoding == b'deflate':
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)  # 无zlib头的原始deflate
+    except zlib.error:
+        pass
+    return body
+
+
+class _Direction:
+    """TCP连接中的单个传输方向"""
+    __slots__ = ('next_seq', 'pending', 'pending_bytes', 'parser', 'state')
+
+    def __init__(self):
+        self.next_seq = None      # 期望的下一个序列号
+        self.pending = {}         # 乱序到达的报文段 {seq: bytes}
+        self.pending_bytes = 0
+        self.parser = HttpRequestParser()
+        self.state = _UNDECIDED
+
+
+class _Connection:
+    """TCP连接（双向）"""
+    __slots__ = ('stream_id', 'directions', 'closed', 'last_seen')
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.directions = {}
+        self.closed = False
+        self.last_seen = 0.0
+
+
+class TcpReassembler:
+    """
+    TCP流重组器
+
+    按数据包到达顺序分配流ID（与tshark的tcp.stream编号规则一致：
+    每个新连接递增，连接关闭后以SYN重用端口视为新连接），
+    对客户端方向的字节流做按序重组并交给HttpRequestParser解析。
+
+    已关闭的连接在linger秒内没有新报文、且没有等待补齐的乱序数据时释放，
+    内存占用只与同时打开的连接数有关（linger为None时不自动释放，由调用方管理connections）
+    """
+
+    def __init__(self, linger=CLOSED_LINGER):
+        self.connections = {}
+        self.next_stream_id = 0
+        self.linger = linger
+        self._next_sweep = None   # 下一次检查已关闭连接的抓包时间
+
+    @staticmethod
+    def connection_key(segment):
+        """
+        功能: 计算报文段所属连接的方向无关标识
+        输入: segment: decode_tcp返回的元组
+        输出: (连接标识, 发送端端点)，端点为 (地址字节, 端口)
+        """
+        src, dst, src_port, dst_port = segment[:4]
+        local, remote = (src, src_port), (dst, dst_port)
+        return ((local, remote) if local <= remote else (remote, local)), local
+
+    def stream_id(self, key):
+        """连接当前的流ID（连接不存在时为None）"""
+        conn = self.connections.get(key)
+        return None if conn is None else conn.stream_id
+
+    def release_closed(self, now):
+        """
+        功能: 释放已关闭且空闲超过linger秒的连接
+        输入: now: 当前抓包时间（秒）
+        输出: 释放的连接数
+        """
+        released = 0
+        for key, conn in list(self.connections.items()):
+            if (conn.closed and now - conn.last_seen >= self.linger
+                    and not any(d.pending for d in conn.directions.values())):
+                del self.connections[key]
+                released += 1
+        return released
+
+    def pending_bytes(self, key):
+        """连接中等待补齐缺口的乱序数据字节数（连接不存在时为0）"""
+        conn = self.connections.get(key)
+        if conn is None:
+            return 0
+        return sum(direction.pending_bytes for direction in conn.directions.values())
+
+    def feed(self, segment, timestamp=0.0):
+        """
+        功能: 处理一个TCP报文段
+        输入:
+            segment: decode_tcp返回的元组
+            timestamp: 数据包时间戳（秒）
+        输出: list[(flow_key, 请求字典)]，本报文段使之完整的请求
+            flow_key: (src_port, stream_id)，均为字符串（与tshark输出一致）
+            请求字典结构: {'uri': str, 'body': bytes}，无请求体时body为b''
+        """
+        _, _, src_port, _, seq, flags, payload = segment
+        key, local = self.connection_key(segment)
+        if self.linger is not None:
+            if self._next_sweep is None:
+                self._next_sweep = timestamp + self.linger
+            elif timestamp >= self._next_sweep:
+                self.release_closed(timestamp)
+                self._next_sweep = timestamp + self.linger
+
+        conn = self.connections.get(key)
+        if conn is None or (conn.closed and flags & TCP_SYN and not flags & TCP_ACK):
+            conn = self.connections[key] = _Connection(self.next_stream_id)
+            self.next_stream_id += 1
+        conn.last_seen = timestamp
+
+        direction = conn.directions.get(local)
+        if direction is None:
+            direction = conn.directions[local] = _Direction()
+
+        requests = []
+        if flags & TCP_SYN:
+            direction.next_seq = (seq + 1) & _SEQ_MASK  # SYN占用一个序列号
+        elif payload and direction.state != _IGNORED:
+            requests = self._on_payload(direction, seq, payload)
+        if flags & (TCP_FIN | TCP_RST):
+            conn.closed = True
+
+        if not requests:
+            return requests
+        flow_key = (str(src_port), str(conn.stream_id))
+        return [(flow_key, {'uri': uri, 'body': body}) for uri, body in requests]
+
+    def _on_payload(self, direction, seq, payload):
+        """按序列号放置载荷：按序数据直接解析，乱序数据暂存，重传数据去重"""
+        if direction.next_seq is None:  # 未捕获到SYN（抓包从连接中途开始）
+            direction.next_seq = seq
+
+        delta = (seq - direction.next_seq) & _SEQ_MASK
+        if delta == 0:
+            data = payload
+        elif delta < _SEQ_HALF:  # 前方有缺口，暂存等待补齐
+            if seq not in direction.pending:
+                direction.pending[seq] = bytes(payload)
+                direction.pending_bytes += len(payload)
+            if direction.pending_bytes <= MAX_PENDING_BYTES:
+                return []
+            # 缺口长期无法补齐：跳到最早的暂存段，丢弃残缺的请求
+            direction.next_seq = min(direction.pending,
+                                     key=lambda s: (s - direction.next_seq) & _SEQ_MASK)
+            direction.parser = HttpRequestParser()
+            return self._drain(direction, [])
+        else:  # 重传：裁掉已处理过的部分
+            overlap = _SEQ_MASK + 1 - delta
+            if overlap >= len(payload):
+                return []
+            data = payload[overlap:]
+
+        return self._drain(direction, self._deliver(direction, data))
+
+    def _drain(self, direction, requests):
+        """依次交付暂存区中已连续的报文段"""
+        pending = direction.pending
+        while pending:
+            data = pending.pop(direction.next_seq, None)
+            if data is not None:
+                direction.pending_bytes -= len(data)
+                requests.extend(self._deliver(direction, data))
+                continue
+            # 查找与已处理数据部分重叠的暂存段（重传边界不同）
+            for seq in list(pending):
+                delta = (seq - direction.next_seq) & _SEQ_MASK
+                if delta >= _SEQ_HALF:
+                    data = pending.pop(seq)
+                    direction.pending_bytes -= len(data)
+                    overlap = _SEQ_MASK + 1 - delta
+                    if overlap < len(data):
+                        requests.extend(self._deliver(direction, data[overlap:]))
+                    break
+            else:
+                break
+        return requests
+
+    @staticmethod
+    def _deliver(direction, data):
+        """把按序数据交给HTTP解析器；首批数据决定该方向是否为HTTP客户端"""
+        direction.next_seq = (direction.next_seq + len(data)) & _SEQ_MASK
+        if direction.state == _IGNORED:
+            return []
+
+        requests = direction.parser.feed(data)
+        if direction.state == _UNDECIDED:
+            head = bytes(direction.parser.buf[:_METHOD_PROBE_LEN])
+            if requests or head.startswith(HTTP_METHODS):
+                direction.state = _HTTP
+            elif len(head) >= _METHOD_PROBE_LEN or not any(
+                    method.startswith(head) for method in HTTP_METHODS):
+                # 非HTTP请求方向（如服务器响应），不再缓存其数据
+                direction.state = _IGNORED
+                direction.parser = None
+                direction.pending.clear()
+                direction.pending_bytes = 0
+        return requests
+
+
+def iter_http_requests(pcap_file):
+    """
+    功能: 不依赖tshark，直接解析pcap/pcapng文件并逐条产出HTTP请求
+    输入: pcap_file: 抓包文件路径 (str)，支持gzip/zstd压缩文件
+    输出:
+        生成器，逐条产出 (flow_key, 请求字典)，格式与tshark后端一致
+            flow_key: (src_port, stream_id)
+            请求字典结构: {'uri': str, 'body': bytes}
+    调用关系: 被pcap_parser.iter_http_requests调用
+
+    说明：
+    - 文件通过mmap映射，报文以memoryview零拷贝访问；压缩文件边解压边解析
+    - 仅按序到达的客户端数据会被缓存，服务器响应方向在识别后直接丢弃
+    - 按内容识别HTTP请求，不局限于tshark默认注册的HTTP端口
+    """
+    reassembler = TcpReassembler()
+    for timestamp, linktype, data in iter_capture_packets(pcap_file):
+        segment = decode_tcp(linktype, data)
+        if segment is None:
+            continue
+        yield from reassembler.feed(segment, timestamp)
@@ -0,0 +1,144 @@
+import cv2
+import numpy as np
+
+# 定位时搜索区域缩小到的大致宽度（像素），形态学运算与投影都在该尺度上进行
+# （按整数倍缩小，INTER_AREA整数倍缩小有快速路径）
+LOCATE_WIDTH = 640
+# 行投影中文字像素占比达到该值的行视为文字行
+ROW_DENSITY = 0.2
+# 条带内文字像素占比达到该值的列视为文字列
+COLUMN_DENSITY = 0.3
+# 号码条带宽度至少为预期宽度的比例
+MIN_WIDTH_RATIO = 0.3
+# 号码条带高度上下限（相对于预期裁剪框高度）
+MIN_HEIGHT_RATIO = 0.08
+MAX_HEIGHT_RATIO = 1.2
+# 条带与预期位置的距离惩罚（按搜索区域高度归一化）
+DISTANCE_WEIGHT = 1.5
+# 输出裁剪框的外扩比例（相对于条带高度），保留字符上下边缘
+PAD_RATIO = 0.35
+# 列投影中可跨越的空白宽度（相对于条带高度），号码分组之间的空格不截断条带
+MAX_GAP_RATIO = 1.5
+# 倾斜校正的候选角度（度），取行投影最尖锐的角度
+SKEW_ANGLES = np.arange(-8.0, 8.5, 1.0)
+
+
+def _runs(mask):
+    """布尔序列中连续True段的 (起点数组, 终点数组)，终点不含"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges[0::2], edges[1::2]
+
+
+def _fill_gaps(mask, max_gap):
+    """填平布尔序列中两段True之间长度不超过max_gap的False段"""
+    starts, ends = _runs(~mask)
+    inner = (starts > 0) & (ends < len(mask)) & (ends - starts <= max_gap)
+    filled = mask.copy()
+    for start, end in zip(starts[inner], ends[inner]):
+        filled[start:end] = True
+    return filled
+
+
+def _rotation(shape, angle):
+    height, width = shape
+    return cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+
+
+def estimate_skew(mask):
+    """
+    功能: 估计文字行的倾斜角度
+    输入: mask: 文字掩码（uint8，0/255）
+    输出: 角度（度），按该角度旋转后文字行水平
+    说明: 在1/4分辨率掩码上逐个候选角度旋转，取行投影相邻差分平方和（投影尖锐度）最大的角度；
+         文字行水平时每行要么落在条带内要么落在行间，投影峰谷最分明
+    """
+    quarter = mask[::4, ::4]
+    best_angle, best_sharpness = 0.0, -1.0
+    for angle in SKEW_ANGLES:
+        rotated = quarter if angle == 0 else cv2.warpAffine(
+            quarter, _rotation(quarter.shape, angle), quarter.shape[::-1], flags=cv2.INTER_NEAREST)
+        sharpness = np.square(np.diff(rotated.sum(axis=1, dtype=np.float64))).sum()
+        if sharpness > best_sharpness:
+            best_angle, best_sharpness = float(angle), sharpness
+    return best_angle
+
+
+def text_mask(gray):
+    """
+    功能: 生成文字区域掩码
+    输入: gray: 灰度图
+    输出: 二值图（0/255），同一行中相邻的字符已连成横向条带
+    说明: 形态学梯度同时响应亮底暗字与暗底亮字（银行卡凸印号码），Otsu自适应阈值；
+         横向闭运算的核宽与图像宽度成比例，字符间距被填平而行间距保留
+    """
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, gray.shape[1] // 40), 1))
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+
+def locate_number_band(region, expected):
+    """
+    功能: 在搜索区域中定位证件号码所在的文字条带
+    输入:
+        region: 解码后的搜索区域（BGR或灰度）
+        expected: 固定比例裁剪框在该区域中的像素坐标 (x1, y1, x2, y2)，
+            作为号码位置与尺寸的先验
+    输出: 号码条带的裁剪框 (x1, y1, x2, y2)（区域像素坐标）；找不到可信条带时返回None，
+         由调用方回退到固定比例裁剪框
+    实现逻辑:
+        1. 按整数倍缩小到约LOCATE_WIDTH宽并转为灰度，生成文字掩码（text_mask）
+        2. 估计倾斜角度（estimate_skew），歪斜的照片先把掩码旋转到水平
+        3. 行投影：文字像素占比超过ROW_DENSITY的连续行构成候选条带，按高度筛选
+        4. 列投影：候选条带内填平分组空格后取最长的连续文字列段作为条带宽度，过窄的条带丢弃
+        5. 按"宽度 × 密度 − 与先验位置的距离"打分，取最高分条带并外扩，
+           旋转过时取条带四角映射回原图的外接矩形
+    """
+    height, width = region.shape[:2]
+    factor = max(1, round(width / LOCATE_WIDTH))
+    scale = 1.0 / factor
+    small = region if factor == 1 else cv2.resize(region, None, fx=scale, fy=scale,
+                                                  interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    mask = text_mask(small)
+    angle = estimate_skew(mask)
+    if angle:
+        mask = cv2.warpAffine(mask, _rotation(mask.shape, angle), mask.shape[::-1], flags=cv2.INTER_NEAREST)
+    mask = mask > 0
+    small_height, small_width = mask.shape
+
+    ex1, ey1, ex2, ey2 = (v * scale for v in expected)
+    expected_width, expected_height = max(1.0, ex2 - ex1), max(1.0, ey2 - ey1)
+    prior = (ey1 + ey2) / 2
+
+    best, best_score = None, -np.inf
+    starts, ends = _runs(mask.mean(axis=1) >= ROW_DENSITY)
+    for top, bottom in zip(starts, ends):
+        band_height = bottom - top
+        if not MIN_HEIGHT_RATIO * expected_height <= band_height <= MAX_HEIGHT_RATIO * expected_height:
+            continue
+        columns = _fill_gaps(mask[top:bottom].mean(axis=0) >= COLUMN_DENSITY, MAX_GAP_RATIO * band_height)
+        col_starts, col_ends = _runs(columns)
+        if not len(col_starts):
+            continue
+        longest = np.argmax(col_ends - col_starts)
+        left, right = col_starts[longest], col_ends[longest]
+        if right - left < MIN_WIDTH_RATIO * expected_width:
+            continue
+        density = mask[top:bottom, left:right].mean()
+        distance = abs((top + bottom) / 2 - prior) / small_height
+        score = (right - left) / small_width * density - DISTANCE_WEIGHT * distance
+        if score > best_score:
+            best, best_score = (left, top, right, bottom), score
+    if best is None:
+        return None
+
+    left, top, right, bottom = best
+    pad = (bottom - top) * PAD_RATIO
+    corners = np.array([[left - pad, top - pad], [right + pad, top - pad],
+                        [left - pad, bottom + pad], [right + pad, bottom + pad]])
+    if angle:
+        corners = cv2.transform(corners[None], cv2.invertAffineTransform(_rotation(mask.shape, angle)))[0]
+    (x1, y1), (x2, y2) = corners.min(axis=0) / scale, corners.max(axis=0) / scale
+    return (max(0, int(x1)), max(0, int(y1)), min(width, int(np.ceil(x2))), min(height, int(np.ceil(y2))))
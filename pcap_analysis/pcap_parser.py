@@ -1,84 +1,351 @@
 from collections import defaultdict
-import json
+import socket
+import shutil
+import tempfile
 import subprocess
+import threading
 import os
+from contextlib import contextmanager
 #============= 系统自定义模块 =============
-from pcap_analysis.flow_processor import process_flow
+from pcap_analysis.flow_processor import process_request, new_sensitive_info, SENSITIVE_ENDPOINTS
+from pcap_analysis.image_sink import resolve_image_sink
+from pcap_analysis import native_parser
+from pcap_analysis.flow_sharder import shard_pcap_by_flow, connection_key
+from pcap_analysis.request_store import RequestSegmentWriter
+from pcap_analysis.tshark_session import get_session, session_compatible, session_filter
+from pcap_analysis.compressed_capture import capture_compression, iter_decompressed
 #=========================================
 
-def extract_http_requests(pcap_file, tshark_path):
+# 解析后端：tshark（外部进程）或 native（纯Python解析pcap/pcapng）
+BACKEND_TSHARK = 'tshark'
+BACKEND_NATIVE = 'native'
+BACKENDS = (BACKEND_TSHARK, BACKEND_NATIVE)
+
+# tshark提取字段（源端口/流ID/请求体/请求URI）
+# -T fields以制表符分隔输出，URI放在最后，按前3个分隔符切分即可保留URI中的任意字符
+TSHARK_FIELDS = ('tcp.srcport', 'tcp.stream', 'http.file_data', 'http.request.uri')
+FIELD_SEPARATOR = '\t'
+
+# 两遍模式第一遍提取的字段（请求所属连接的两端地址与端口）
+ENDPOINT_FIELDS = ('ip.src', 'ipv6.src', 'tcp.srcport', 'ip.dst', 'ipv6.dst', 'tcp.dstport')
+
+# 管道读取缓冲区大小（tshark逐行输出，缓冲区仅影响系统调用次数）
+PIPE_BUFFER_SIZE = 1024 * 1024
+
+
+def endpoint_filter(endpoints):
+    """
+    功能: 把接口前缀列表编译为匹配请求URI的正则（tshark显示过滤器的matches表达式）
+    说明: 字母数字与'/_-'以外的字符写为\\x{..}转义，避免'.'等被当作正则元字符
+    """
+    patterns = '|'.join(
+        ''.join(c if c.isalnum() or c in '/_-' else f'\\\\x{{{ord(c):x}}}' for c in endpoint)
+        for endpoint in endpoints)
+    return f'http.request.uri matches "^({patterns})"'
+
+
+# tshark显示过滤器：只输出目标接口且带请求体的HTTP请求（与process_request的处理范围一致），
+# 其余请求（静态资源、无关接口等）不再序列化输出
+TSHARK_DISPLAY_FILTER = f'http.request and http.file_data and {endpoint_filter(SENSITIVE_ENDPOINTS)}'
+
+# 解析结果的请求范围（记录在请求存储中，接口列表变化后已保存的请求存储不再复用）
+REQUEST_SCOPE = list(SENSITIVE_ENDPOINTS)
+
+
+def in_scope(request):
+    """native后端的请求过滤条件（同TSHARK_DISPLAY_FILTER）"""
+    return bool(request['body']) and request['uri'].startswith(SENSITIVE_ENDPOINTS)
+
+
+def tshark_command(tshark_path, pcap_file, display_filter=TSHARK_DISPLAY_FILTER,
+                   fields=TSHARK_FIELDS, options=()):
+    """
+    功能: 生成tshark命令行（-T fields按字段输出，每个字段只取首个值）
+    输入:
+        tshark_path: TShark工具路径
+        pcap_file: 输入文件（'-'表示标准输入）
+        display_filter: 显示过滤器
+        fields: 输出字段
+        options: 其他tshark参数
     """
-    功能: 使用tshark解析PCAP文件, 提取HTTP请求数据
-    输入: 
+    cmd = [
+        tshark_path,
+        '-r', pcap_file,                       # 输入文件
+        '-Y', display_filter,                  # 显示过滤器（只输出匹配的数据包）
+        '-T', 'fields',                        # 按字段输出（每个数据包一行）
+        '-E', 'separator=/t',                  # 字段以制表符分隔
+        '-E', 'occurrence=f',                  # 同名字段只取首个值
+        *options,
+    ]
+    for field in fields:
+        cmd.extend(['-e', field])
+    return cmd
+
+
+def _feed_decompressed(pcap_file, pipe, errors):
+    """写入线程：流式解压抓包文件写入tshark标准输入；tshark提前退出时管道断开，停止写入"""
+    try:
+        with pipe:
+            for block in iter_decompressed(pcap_file):
+                pipe.write(block)
+    except OSError:  # BrokenPipeError
+        pass
+    except Exception as e:  # 解压失败，由读取方抛出
+        errors.append(e)
+
+
+@contextmanager
+def tshark_output(tshark_path, pcap_file, *args, **kwargs):
+    """
+    功能: 启动tshark并产出其标准输出（逐行文本）
+    输入: tshark_path/pcap_file及其余参数同tshark_command
+    输出: 上下文管理器，产出tshark的标准输出（文本流）
+    异常:
+        subprocess.CalledProcessError: tshark退出码非0
+        CaptureFormatError/ImportError: 压缩抓包文件无法解压
+    说明:
+    - 压缩抓包文件（gzip/zstd）以'-r -'从标准输入读取，由写入线程送入
+      compressed_capture流式解压的数据，不生成解压后的临时文件
+    - stderr丢弃，避免管道写满导致tshark阻塞
+    - 调用方提前退出（含提前终止迭代）时结束tshark
+    """
+    compressed = capture_compression(pcap_file) is not None
+    cmd = tshark_command(tshark_path, '-' if compressed else pcap_file, *args, **kwargs)
+    read_fd = write_fd = None
+    if compressed:
+        read_fd, write_fd = os.pipe()
+    proc = subprocess.Popen(
+        cmd,
+        stdin=read_fd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        encoding='utf-8',
+        errors='replace',
+        bufsize=PIPE_BUFFER_SIZE
+    )
+    writer, errors = None, []
+    if compressed:
+        os.close(read_fd)
+        writer = threading.Thread(target=_feed_decompressed,
+                                  args=(pcap_file, open(write_fd, 'wb'), errors), daemon=True)
+        writer.start()
+    try:
+        yield proc.stdout
+    except BaseException:
+        if proc.poll() is None:
+            proc.kill()
+        raise
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+        if writer is not None:
+            writer.join()
+
+    # 检查命令执行状态
+    if errors:
+        raise errors[0]
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _decode_hex_body(body):
+    """
+    功能: 把tshark输出的十六进制请求体转换为原始字节
+    说明: 兼容部分版本以':'分隔的字节串；无请求体或非法十六进制返回b''
+    """
+    if not body:
+        return b''
+    try:
+        return bytes.fromhex(body.replace(':', ''))
+    except ValueError:
+        return b''
+
+
+def _fields_request(line):
+    """
+    功能: 把tshark -T fields输出的一行（字段顺序同TSHARK_FIELDS）转换为 (flow_key, 请求字典)
+    说明: 单次运行的tshark与常驻会话共用；字段不足（空行等）返回None
+    """
+    parts = line.rstrip('\r\n').split(FIELD_SEPARATOR, 3)
+    if len(parts) < 4:
+        return None
+    src_port, stream_id, body, uri = parts  # 源端口 / 流ID / 请求体 / 请求URI
+
+    # 构建流标识键（源端口 + 流ID），请求体在入口处一次性转为原始字节
+    return (src_port, stream_id), {
+        'uri': uri,
+        'body': _decode_hex_body(body)
+    }
+
+
+def resolve_backend(backend, tshark_path):
+    """
+    功能: 确定实际使用的解析后端
+    输入:
+        backend: 'tshark' / 'native' / None（None表示自动选择）
+        tshark_path: TShark工具路径
+    输出: 后端名称 (str)
+    说明: 自动模式下tshark可执行时使用tshark，否则使用native后端
+         （如在Linux主机上只有随仓库分发的tshark.exe）
+    """
+    if backend is None:
+        executable = os.path.isfile(tshark_path) and os.access(tshark_path, os.X_OK)
+        return BACKEND_TSHARK if executable else BACKEND_NATIVE
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的解析后端: {backend}（可选: {', '.join(BACKENDS)}）")
+    return backend
+
+
+def iter_http_requests(pcap_file, tshark_path, backend=BACKEND_TSHARK, two_pass=False):
+    """
+    功能: 按指定后端逐条产出PCAP文件中的目标接口HTTP请求
+    输入:
+        pcap_file: PCAP文件路径 (str)
+        tshark_path: TShark工具路径 (str)，native后端忽略该参数
+        backend: 解析后端，'tshark'或'native'
+        two_pass: tshark后端使用两遍模式（见iter_two_pass_requests），native后端忽略
+    输出:
+        生成器，逐条产出 (flow_key, 请求字典)，两种后端输出格式与请求范围一致
+    调用关系: 被extract_http_requests、save_http_requests与iter_chunk_requests调用
+    """
+    if backend == BACKEND_NATIVE:
+        return (item for item in native_parser.iter_http_requests(pcap_file) if in_scope(item[1]))
+    if two_pass:
+        return iter_two_pass_requests(pcap_file, tshark_path)
+    return iter_tshark_requests(pcap_file, tshark_path)
+
+
+def iter_tshark_requests(pcap_file, tshark_path):
+    """
+    功能: 流式调用tshark解析PCAP文件, 逐条产出HTTP请求
+    输入:
         pcap_file: PCAP文件路径 (str)
         tshark_path: TShark工具路径 (str)
-    输出: 
+    输出:
+        生成器，逐条产出 (flow_key, 请求字典)
+            flow_key: (src_port, stream_id)
+            请求字典结构: {'uri': str, 'body': bytes}，无请求体时body为b''
+    异常:
+        subprocess.CalledProcessError: tshark退出码非0
+    调用关系: 被iter_http_requests调用
+
+    实现步骤：
+    1. 以显示过滤器TSHARK_DISPLAY_FILTER启动tshark（见tshark_output），只输出目标接口的请求，
+       以-T fields按制表符分隔输出所需字段，输出经管道读取
+    2. 逐行切分字段
+    3. 每解析一条请求立即产出，内存占用与单个请求相当，而非整个分片
+    """
+    with tshark_output(tshark_path, pcap_file) as lines:
+        for line in lines:
+            item = _fields_request(line)
+            if item is not None:
+                yield item
+
+
+def _parse_address(ipv4, ipv6):
+    """tshark输出的IPv4/IPv6地址文本转换为原始地址字节"""
+    if ipv4:
+        return socket.inet_pton(socket.AF_INET, ipv4)
+    return socket.inet_pton(socket.AF_INET6, ipv6)
+
+
+def find_target_connections(pcap_file, tshark_path):
+    """
+    功能: 两遍模式第一遍，找出包含目标接口请求的TCP连接
+    输入:
+        pcap_file: PCAP文件路径 (str)
+        tshark_path: TShark工具路径 (str)
+    输出: set，连接标识（flow_sharder.connection_key）
+    异常:
+        subprocess.CalledProcessError: tshark退出码非0
+    说明: 关闭HTTP请求体重组，只按请求头中的URI匹配，并只输出连接两端的地址与端口，
+         不重组、不输出任何请求体
+    """
+    connections = set()
+    with tshark_output(tshark_path, pcap_file, endpoint_filter(SENSITIVE_ENDPOINTS),
+                       ENDPOINT_FIELDS, ('-o', 'http.desegment_body:FALSE')) as lines:
+        for line in lines:
+            parts = line.rstrip('\r\n').split(FIELD_SEPARATOR)
+            if len(parts) != len(ENDPOINT_FIELDS):
+                continue
+            src4, src6, src_port, dst4, dst6, dst_port = parts
+            try:
+                connections.add(connection_key(_parse_address(src4, src6), int(src_port),
+                                               _parse_address(dst4, dst6), int(dst_port)))
+            except (OSError, ValueError):  # 地址或端口字段缺失
+                continue
+    return connections
+
+
+def iter_two_pass_requests(pcap_file, tshark_path):
+    """
+    功能: 两遍模式解析PCAP文件
+    输入/输出: 同iter_tshark_requests
+    实现步骤:
+    1. 第一遍（find_target_connections）找出包含目标接口请求的连接
+    2. 从抓包文件中只抽取这些连接的报文，写入临时文件
+    3. 第二遍对临时文件做完整解析（TCP/HTTP重组与请求体输出）
+    说明: 目标连接只占少数时，请求体重组与输出都只发生在目标连接上；
+         第二遍的tcp.stream按临时文件重新编号
+    """
+    connections = find_target_connections(pcap_file, tshark_path)
+    if not connections:
+        return
+    work_dir = tempfile.mkdtemp(prefix='sds_targets_')
+    try:
+        targets = shard_pcap_by_flow(pcap_file, work_dir, 1, 'targets', connections)
+        for target in targets:
+            yield from iter_tshark_requests(target, tshark_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def iter_chunk_requests(chunk_path, tshark_path, backend=BACKEND_TSHARK, session=False):
+    """
+    功能: 逐条产出分片文件中的HTTP请求
+    输入:
+        chunk_path: 分片文件路径 (str)
+        tshark_path: TShark工具路径 (str)
+        backend: 解析后端
+        session: 是否使用当前进程的常驻tshark会话 (bool)
+    输出: 生成器，格式同iter_http_requests
+    说明: 仅tshark后端且分片为flow_sharder输出的格式时使用常驻会话，其余情况每个分片单独解析
+    """
+    if session and backend == BACKEND_TSHARK and session_compatible(chunk_path):
+        command = tshark_command(tshark_path, '-', session_filter(TSHARK_DISPLAY_FILTER),
+                                 options=('-l',))  # -l: 每个数据包输出后立即刷新
+        return get_session(command).requests(chunk_path, _fields_request)
+    return iter_http_requests(chunk_path, tshark_path, backend)
+
+
+def extract_http_requests(pcap_file, tshark_path, backend=BACKEND_TSHARK, two_pass=False):
+    """
+    功能: 解析PCAP文件, 提取HTTP请求数据
+    输入:
+        pcap_file: PCAP文件路径 (str)
+        tshark_path: TShark工具路径 (str)
+        backend: 解析后端，'tshark'（默认）或'native'
+        two_pass: tshark后端使用两遍模式
+    输出:
         defaultdict: 按网络流分组的请求字典，结构为：
             {(src_port, stream_id): [请求字典1, 请求字典2...]}
-            请求字典结构: {'uri': str, 'body': str}
+            请求字典结构: {'uri': str, 'body': bytes}
+        解析失败时返回None
     调用关系: 被report_generator调用
 
     实现步骤：
-    1. 构建tshark命令行参数
-    2. 执行命令并捕获JSON输出
-    3. 解析JSON数据提取关键字段
-    4. 按网络流分组请求数据
+    1. 通过iter_http_requests流式读取解析后端输出
+    2. 按网络流分组请求数据
     """
     http_requests = defaultdict(list)
 
-    # 构建tshark命令行（过滤HTTP请求，输出JSON格式）
-    cmd = [
-        tshark_path,
-        '-r', pcap_file,        # 输入文件
-        '-Y', 'http.request',  # 过滤HTTP请求
-        '-T', 'json',          # 输出JSON格式
-        '-e', 'tcp.srcport',   # 提取源端口
-        '-e', 'tcp.stream',    # 提取流ID
-        '-e', 'http.request.uri',  # 提取请求URI
-        '-e', 'http.file_data'     # 提取请求体
-    ]
-
     try:
-        # 执行命令（超时由外部控制，编码使用UTF-8，替换错误字符）
-        result = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True, 
-            encoding='utf-8', 
-            errors='replace'
-        )
-        
-        # 检查命令执行状态
-        if result.returncode != 0:
-            return None
-
-        # 解析JSON输出（处理空输出情况）
-        packets = json.loads(result.stdout) if result.stdout else []
-
-        # 遍历所有数据包
-        for pkt in packets:
-            try:
-                layers = pkt['_source']['layers']
-                
-                # 提取关键字段（处理字段不存在的情况）
-                src_port = layers.get('tcp.srcport', [''])[0]    # 源端口
-                stream_id = layers.get('tcp.stream', [''])[0]    # 流ID
-                uri = layers.get('http.request.uri', [''])[0]    # 请求URI
-                body = layers.get('http.file_data', [''])[0]     # 请求体
-                
-                # 构建流标识键（源端口 + 流ID）
-                flow_key = (src_port, stream_id)
-                
-                # 存储请求数据（无请求体时填充占位符）
-                http_requests[flow_key].append({
-                    'uri': uri,
-                    'body': body if body else '无请求体'
-                })
-            except KeyError:  # 跳过字段缺失的数据包
-                continue
-
+        for flow_key, request in iter_http_requests(pcap_file, tshark_path, backend, two_pass):
+            http_requests[flow_key].append(request)
         return http_requests
 
+    except subprocess.CalledProcessError:  # tshark执行失败
+        return None
     except Exception as e:  # 捕获所有解析异常
         print(f"[解析异常] 文件: {os.path.basename(pcap_file)} | 错误: {str(e)}")
         return None
@@ -87,38 +354,69 @@ def process_chunk(args):
     """
     处理单个分片文件的完整流程
     输入:
-        args: 元组 (分片路径, tshark路径, 图片输出目录)
+        args: 元组 (分片路径, tshark路径, 图片输出目录[, 解析后端[, 严格模式[, 请求存储分段路径[, 常驻会话]]]])
             chunk_path: PCAP分片文件路径
             tshark_path: TShark工具路径
-            image_output_dir: 图片输出目录
+            image_output_dir: 图片输出目录或图片输出端对象
+            backend: 解析后端（可选，默认'tshark'）
+            strict: 严格模式（可选，默认False），解析异常直接抛出且不删除分片，
+                由检查点记为失败后重试
+            segment_path: 请求存储分段路径（可选），解析出的请求同时写入该分段，
+                之后的运行可跳过协议解析
+            session: 使用常驻tshark会话（可选，默认False），同一工作进程处理的分片
+                共用一个tshark进程，避免每个分片重复初始化解析器
     输出:
         list: 处理结果列表，元素为 (流标识, 敏感信息字典)
-    
+
     处理流程:
-    1. 调用extract_http_requests解析分片中的HTTP请求
-    2. 遍历所有网络流进行敏感数据处理
+    1. 调用iter_chunk_requests（tshark单次运行/常驻会话或native后端）流式解析分片中的HTTP请求
+    2. 每条请求到达后立即交给所属网络流处理（process_request），随后释放请求体
     3. 清理临时分片文件（如果分片在临时目录中）
     4. 返回当前分片的所有处理结果
-    
+
     注意:
     - 使用串行处理替代内部进程池，避免多级并行带来的复杂性
+    - 仅保留每个流的敏感信息字典，峰值内存取决于单个请求而非整个分片
     - 临时分片文件会在处理后立即删除，防止磁盘空间占用
     """
     # 解包参数
-    chunk_path, tshark_path, image_output_dir = args
-    
-    # 提取当前分片的HTTP请求数据
-    http_requests = extract_http_requests(chunk_path, tshark_path)
-    results = []
-
-    if http_requests:
-        # 生成流处理参数列表（flow_key, 请求列表, 输出目录）
-        flow_args_list = [(flow_key, reqs, image_output_dir) 
-                         for flow_key, reqs in http_requests.items()]
-        
-        # 串行处理每个网络流（保持与上层并行逻辑的解耦）
-        for flow_args in flow_args_list:
-            results.append(process_flow(flow_args))
+    chunk_path, tshark_path, image_output_dir = args[:3]
+    backend = args[3] if len(args) > 3 else BACKEND_TSHARK
+    strict = args[4] if len(args) > 4 else False
+    segment_path = args[5] if len(args) > 5 else None
+    session = args[6] if len(args) > 6 else False
+
+    # 按流维护敏感信息（保持流首次出现的顺序）
+    image_sink = resolve_image_sink(image_output_dir)
+    segment = RequestSegmentWriter(segment_path) if segment_path else None
+    flow_states = {}
+    try:
+        for flow_key, request in iter_chunk_requests(chunk_path, tshark_path, backend, session):
+            if segment is not None:
+                segment.append(flow_key, request)
+            sensitive_info = flow_states.get(flow_key)
+            if sensitive_info is None:
+                sensitive_info = flow_states[flow_key] = new_sensitive_info()
+            process_request(flow_key, request, sensitive_info, image_sink)
+        if segment is not None:
+            segment.close()
+    except subprocess.CalledProcessError:  # tshark执行失败，丢弃不完整结果
+        if segment is not None:
+            segment.abort()
+        if strict:
+            raise
+        flow_states = {}
+    except Exception as e:  # 捕获所有解析异常
+        if segment is not None:
+            segment.abort()
+        if strict:
+            raise
+        print(f"[解析异常] 文件: {os.path.basename(chunk_path)} | 错误: {str(e)}")
+        flow_states = {}
+
+    results = list(flow_states.items())
+    if strict:
+        return results  # 分片由调用方在结果保存后删除
 
     # 清理临时文件（仅处理分片生成的文件）
     if "temp_pcap_chunks" in chunk_path:
@@ -127,4 +425,32 @@ def process_chunk(args):
         except Exception:  # 忽略所有删除异常（文件可能已被删除）
             pass
 
-    return results
\ No newline at end of file
+    return results
+
+
+def save_http_requests(pcap_file, tshark_path, segment_path, backend=BACKEND_TSHARK, two_pass=False):
+    """
+    功能: 解析PCAP文件，把HTTP请求写入请求存储分段（不在内存中保留请求体）
+    输入:
+        pcap_file: PCAP文件路径 (str)
+        tshark_path: TShark工具路径 (str)
+        segment_path: 分段文件路径 (str)
+        backend: 解析后端，'tshark'（默认）或'native'
+        two_pass: tshark后端使用两遍模式
+    输出:
+        int: 写入的请求数；解析失败时返回None（不留下分段文件）
+    调用关系: 被report_generator调用
+    """
+    segment = RequestSegmentWriter(segment_path)
+    try:
+        for flow_key, request in iter_http_requests(pcap_file, tshark_path, backend, two_pass):
+            segment.append(flow_key, request)
+        segment.close()
+        return segment.count
+    except subprocess.CalledProcessError:  # tshark执行失败
+        segment.abort()
+        return None
+    except Exception as e:  # 捕获所有解析异常
+        segment.abort()
+        print(f"[解析异常] 文件: {os.path.basename(pcap_file)} | 错误: {str(e)}")
+        return None
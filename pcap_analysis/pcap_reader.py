@@ -0,0 +1,444 @@
+import mmap
+import struct
+from contextlib import contextmanager
+
+# 链路层类型（参见 https://www.tcpdump.org/linktypes.html）
+LINKTYPE_NULL = 0           # BSD环回（主机字节序协议族）
+LINKTYPE_ETHERNET = 1       # 以太网
+LINKTYPE_RAW = 101          # 原始IP
+LINKTYPE_LOOP = 108         # OpenBSD环回（网络字节序协议族）
+LINKTYPE_LINUX_SLL = 113    # Linux cooked capture v1
+LINKTYPE_LINUX_SLL2 = 276   # Linux cooked capture v2
+RAW_IP_LINKTYPES = (LINKTYPE_RAW, 12, 14)  # 部分平台上DLT_RAW取值为12/14
+
+# 以太网类型
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# TCP标志位
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+# pcapng块类型
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_IDB = 0x00000001
+_PCAPNG_PB = 0x00000002
+_PCAPNG_SPB = 0x00000003
+_PCAPNG_EPB = 0x00000006
+
+# IPv6扩展头（逐跳/路由/目的选项）
+_IPV6_EXT_HEADERS = (0, 43, 60)
+
+_U16 = struct.Struct('!H')
+_U32 = struct.Struct('!I')
+
+# 写出pcap时使用的文件头/记录头（小端、微秒精度）
+_PCAP_GLOBAL_HEADER = struct.Struct('<IHHiIII')
+_PCAP_RECORD_HEADER = struct.Struct('<IIII')
+PCAP_SNAPLEN = 262144
+
+
+class CaptureFormatError(ValueError):
+    """抓包文件格式无法识别或已损坏"""
+
+
+@contextmanager
+def mapped_capture(path):
+    """
+    功能: 以只读内存映射方式打开抓包文件
+    输入: path: pcap/pcapng文件路径
+    输出: 上下文管理器，产出可切片的mmap对象（空文件产出b''）
+    说明: 由操作系统按需调页，解析过程不会把整个文件读入进程内存
+    """
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空文件无法映射
+            yield b''
+            return
+        try:
+            yield mm
+        finally:
+            try:
+                mm.close()
+            except BufferError:  # 仍有切片引用时交由垃圾回收释放映射
+                pass
+
+
+def pcap_global_header(linktype, snaplen=PCAP_SNAPLEN):
+    """生成经典pcap文件头（24字节）"""
+    return _PCAP_GLOBAL_HEADER.pack(0xA1B2C3D4, 2, 4, 0, 0, snaplen, linktype)
+
+
+def pcap_record_header(timestamp, length):
+    """生成经典pcap记录头（16字节），timestamp为秒（float）"""
+    ts_sec = int(timestamp)
+    ts_usec = min(999999, int(round((timestamp - ts_sec) * 1e6)))
+    return _PCAP_RECORD_HEADER.pack(ts_sec, ts_usec, length, length)
+
+
+def iter_packets(buf):
+    """
+    功能: 遍历pcap/pcapng缓冲区中的所有数据包记录
+    输入: buf: 抓包文件内容（bytes/mmap等支持切片的缓冲区）
+    输出:
+        生成器，逐个产出 (offset, timestamp, linktype, data)
+            offset: 记录（pcap记录头/pcapng块）在文件中的起始偏移
+            timestamp: 时间戳（秒，float）
+            linktype: 链路层类型
+            data: 捕获到的帧内容（memoryview，零拷贝）
+    异常:
+        CaptureFormatError: 文件头无法识别
+    说明: 文件末尾被截断的记录会被忽略
+    """
+    if len(buf) < 4:
+        return
+    magic = bytes(buf[:4])
+    if magic == b'\x0a\x0d\x0d\x0a':
+        yield from _iter_pcapng(buf)
+    else:
+        yield from _iter_pcap(buf)
+
+
+def capture_format(buf):
+    """
+    功能: 识别抓包文件格式与字节序（按偏移随机读取数据包时使用）
+    输入: buf: 抓包文件内容
+    输出: ('pcap' | 'pcapng', 字节序'<'/'>')，pcapng取第一个节的字节序
+    异常:
+        CaptureFormatError: 文件头无法识别
+    """
+    if bytes(buf[:4]) == b'\x0a\x0d\x0d\x0a':
+        blocks = _PcapngBlocks()
+        blocks.header(buf, 0)
+        return 'pcapng', blocks.endian
+    return 'pcap', _pcap_header(buf)[0].format[0]
+
+
+def packet_at(buf, offset, fmt, endian):
+    """
+    功能: 读取offset处记录中的帧内容
+    输入:
+        buf: 抓包文件内容
+        offset: 记录起始偏移（iter_packets产出的offset）
+        fmt/endian: capture_format的结果
+    输出: memoryview（零拷贝）；记录不是数据包块或已截断时返回None
+    说明: 链路层类型与时间戳不在此读取（由调用方按记录所属的流保存）
+    """
+    if fmt == 'pcap':
+        caplen = struct.unpack_from(endian + 'I', buf, offset + 8)[0]
+        start = offset + 16
+    else:
+        block_type, block_len, value = struct.unpack_from(endian + 'III', buf, offset)
+        if block_type in (_PCAPNG_EPB, _PCAPNG_PB):
+            caplen = struct.unpack_from(endian + 'I', buf, offset + 20)[0]
+            start = offset + 28
+        elif block_type == _PCAPNG_SPB:
+            caplen = min(value, block_len - 16)  # value为原始长度
+            start = offset + 12
+        else:
+            return None
+    if start + caplen > len(buf):
+        return None
+    return memoryview(buf)[start:start + caplen]
+
+
+def _pcap_header(buf):
+    """解析经典pcap文件头，返回 (记录头结构, 时间戳单位, 链路层类型)"""
+    if len(buf) < 24:
+        raise CaptureFormatError("pcap文件头不完整")
+    magic = bytes(buf[:4])
+    if magic in (b'\xd4\xc3\xb2\xa1', b'\x4d\x3c\xb2\xa1'):
+        endian = '<'
+    elif magic in (b'\xa1\xb2\xc3\xd4', b'\xa1\xb2\x3c\x4d'):
+        endian = '>'
+    else:
+        raise CaptureFormatError(f"未知的抓包文件格式: {magic.hex()}")
+    ts_scale = 1e-9 if magic in (b'\x4d\x3c\xb2\xa1', b'\xa1\xb2\x3c\x4d') else 1e-6
+    linktype = struct.unpack_from(endian + 'I', buf, 20)[0] & 0x0FFFFFFF
+    return struct.Struct(endian + 'IIII'), ts_scale, linktype
+
+
+def _iter_pcap(buf):
+    """解析经典pcap格式（微秒/纳秒精度，大小端均支持）"""
+    record, ts_scale, linktype = _pcap_header(buf)
+    view = memoryview(buf)
+    offset, end = 24, len(buf)
+    while offset + 16 <= end:
+        ts_sec, ts_frac, caplen, _ = record.unpack_from(buf, offset)
+        data_start = offset + 16
+        if data_start + caplen > end:  # 截断的末尾记录
+            break
+        yield offset, ts_sec + ts_frac * ts_scale, linktype, view[data_start:data_start + caplen]
+        offset = data_start + caplen
+
+
+class _PcapngBlocks:
+    """pcapng块解析状态（字节序与接口表），文件遍历与增量解析共用"""
+
+    def __init__(self):
+        self.endian = '<'
+        self.interfaces = []  # [(linktype, snaplen, 时间戳单位)]
+
+    def header(self, buf, offset):
+        """读取块类型与块长度（至少需要12字节）；每个SHB重新确定字节序并重置接口表"""
+        block_type = struct.unpack_from(self.endian + 'I', buf, offset)[0]
+        if block_type == _PCAPNG_SHB:
+            bom = bytes(buf[offset + 8:offset + 12])
+            if bom == b'\x4d\x3c\x2b\x1a':
+                self.endian = '<'
+            elif bom == b'\x1a\x2b\x3c\x4d':
+                self.endian = '>'
+            else:
+                raise CaptureFormatError("pcapng字节序标识无效")
+            self.interfaces = []
+        return block_type, struct.unpack_from(self.endian + 'I', buf, offset + 4)[0]
+
+    def packet(self, buf, view, offset, block_type, block_len):
+        """解析一个完整的块：数据包块返回 (timestamp, linktype, data)，接口描述块登记接口，其余返回None"""
+        endian, interfaces = self.endian, self.interfaces
+        body = offset + 8
+        if block_type == _PCAPNG_EPB:
+            if_id, ts_high, ts_low, caplen = struct.unpack_from(endian + 'IIII', buf, body)
+            if if_id < len(interfaces):
+                linktype, _, ts_unit = interfaces[if_id]
+                data_start = body + 20
+                return (((ts_high << 32) | ts_low) * ts_unit, linktype,
+                        view[data_start:data_start + caplen])
+        elif block_type == _PCAPNG_IDB:
+            linktype, snaplen = struct.unpack_from(endian + 'HxxI', buf, body)
+            interfaces.append((linktype, snaplen,
+                               _pcapng_ts_unit(buf, body + 8, offset + block_len - 4, endian)))
+        elif block_type == _PCAPNG_SPB:
+            if interfaces:
+                linktype, snaplen, _ = interfaces[0]
+                orig_len = struct.unpack_from(endian + 'I', buf, body)[0]
+                caplen = min(orig_len, block_len - 16, snaplen or orig_len)
+                data_start = body + 4
+                return 0.0, linktype, view[data_start:data_start + caplen]
+        elif block_type == _PCAPNG_PB:
+            if_id, _, ts_high, ts_low, caplen = struct.unpack_from(endian + 'HHIII', buf, body)
+            if if_id < len(interfaces):
+                linktype, _, ts_unit = interfaces[if_id]
+                data_start = body + 20
+                return (((ts_high << 32) | ts_low) * ts_unit, linktype,
+                        view[data_start:data_start + caplen])
+        return None
+
+
+def _iter_pcapng(buf):
+    """解析pcapng格式（SHB/IDB/EPB/SPB/PB块）"""
+    view = memoryview(buf)
+    end = len(buf)
+    offset = 0
+    blocks = _PcapngBlocks()
+    while offset + 12 <= end:
+        block_type, block_len = blocks.header(buf, offset)
+        if block_len < 12 or offset + block_len > end:  # 截断或损坏的块
+            break
+        packet = blocks.packet(buf, view, offset, block_type, block_len)
+        if packet is not None:
+            yield (offset, *packet)
+        offset += block_len
+
+
+class PcapStreamParser:
+    """
+    增量抓包解析器（pcap/pcapng）
+
+    用于标准输入、FIFO与增长中的文件：数据按任意大小的块推入，
+    每次产出已完整到达的数据包，只保留末尾尚未完整的记录等待后续数据
+    """
+
+    def __init__(self):
+        self._tail = b''
+        self._format = None   # 'pcap' / 'pcapng'，读到文件头后确定
+        self._pcap = None     # 经典pcap的 (记录头结构, 时间戳单位, 链路层类型)
+        self._blocks = _PcapngBlocks()
+
+    def feed(self, data):
+        """
+        功能: 推入一块数据
+        输入: data: 新到达的字节（bytes）
+        输出: list[(timestamp, linktype, data)]，data为memoryview（引用本次数据块，零拷贝）
+        异常:
+            CaptureFormatError: 文件头无法识别或块长度非法
+        """
+        buf = self._tail + data if self._tail else bytes(data)
+        offset = 0
+        if self._format is None:
+            if len(buf) < 4:
+                self._tail = buf
+                return []
+            if buf[:4] == b'\x0a\x0d\x0d\x0a':
+                self._format = 'pcapng'
+            else:
+                if len(buf) < 24:
+                    self._tail = buf
+                    return []
+                self._format, self._pcap = 'pcap', _pcap_header(buf)
+                offset = 24
+
+        packets = []
+        view = memoryview(buf)
+        end = len(buf)
+        if self._format == 'pcap':
+            record, ts_scale, linktype = self._pcap
+            while offset + 16 <= end:
+                ts_sec, ts_frac, caplen, _ = record.unpack_from(buf, offset)
+                data_start = offset + 16
+                if data_start + caplen > end:
+                    break
+                packets.append((ts_sec + ts_frac * ts_scale, linktype, view[data_start:data_start + caplen]))
+                offset = data_start + caplen
+        else:
+            while offset + 12 <= end:
+                block_type, block_len = self._blocks.header(buf, offset)
+                if block_len < 12:
+                    raise CaptureFormatError(f"pcapng块长度无效: {block_len}")
+                if offset + block_len > end:
+                    break
+                packet = self._blocks.packet(buf, view, offset, block_type, block_len)
+                if packet is not None:
+                    packets.append(packet)
+                offset += block_len
+        self._tail = buf[offset:]
+        return packets
+
+
+def _pcapng_ts_unit(buf, start, end, endian):
+    """解析IDB选项中的if_tsresol，返回时间戳单位（秒），默认微秒"""
+    while start + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', buf, start)
+        if code == 0:  # opt_endofopt
+            break
+        if code == 9 and length >= 1:  # if_tsresol
+            resol = buf[start + 4]
+            return 2.0 ** -(resol & 0x7F) if resol & 0x80 else 10.0 ** -resol
+        start += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def ip_payload(linktype, data):
+    """
+    功能: 剥离链路层头部，返回IP层数据
+    输入:
+        linktype: 链路层类型
+        data: 帧内容（memoryview）
+    输出: (IP版本, IP报文memoryview)，非IP帧返回None
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        ethertype = _U16.unpack_from(data, 12)[0]
+        offset = 14
+        while ethertype in ETHERTYPE_VLAN and len(data) >= offset + 4:
+            ethertype = _U16.unpack_from(data, offset + 2)[0]
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None
+        ethertype, offset = _U16.unpack_from(data, 14)[0], 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20:
+            return None
+        ethertype, offset = _U16.unpack_from(data, 0)[0], 20
+    elif linktype in RAW_IP_LINKTYPES:
+        if not data:
+            return None
+        version = data[0] >> 4
+        ethertype, offset = (ETHERTYPE_IPV4 if version == 4 else
+                             ETHERTYPE_IPV6 if version == 6 else 0), 0
+    elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if len(data) < 4:
+            return None
+        family = struct.unpack_from('<I', data, 0)[0]
+        if family > 0xFFFF:  # 网络字节序存储
+            family = _U32.unpack_from(data, 0)[0]
+        ethertype, offset = (ETHERTYPE_IPV4 if family == 2 else
+                             ETHERTYPE_IPV6 if family in (10, 24, 28, 30) else 0), 4
+    else:
+        return None
+
+    if ethertype == ETHERTYPE_IPV4:
+        return 4, data[offset:]
+    if ethertype == ETHERTYPE_IPV6:
+        return 6, data[offset:]
+    return None
+
+
+def locate_tcp(linktype, data):
+    """
+    功能: 定位帧中的IP报文与TCP报文段
+    输入:
+        linktype: 链路层类型
+        data: 帧内容（memoryview）
+    输出:
+        元组 (ip_packet, src_ip, dst_ip, segment)
+            ip_packet: 完整IP报文（已去除链路层头部与以太网填充）
+            src_ip/dst_ip: 原始地址字节（IPv4为4字节，IPv6为16字节）
+            segment: TCP报文段（含TCP头部）
+        非TCP报文、分片报文或截断报文返回None
+    """
+    ip = ip_payload(linktype, data)
+    if ip is None:
+        return None
+    version, pkt = ip
+
+    if version == 4:
+        if len(pkt) < 20:
+            return None
+        ihl = (pkt[0] & 0x0F) * 4
+        total_len = _U16.unpack_from(pkt, 2)[0]
+        if pkt[9] != 6 or _U16.unpack_from(pkt, 6)[0] & 0x3FFF:  # 非TCP或分片
+            return None
+        if ihl <= total_len <= len(pkt):
+            pkt = pkt[:total_len]  # 以IP总长度为准截掉以太网填充
+        src, dst = bytes(pkt[12:16]), bytes(pkt[16:20])
+        segment = pkt[ihl:]
+    else:
+        if len(pkt) < 40:
+            return None
+        next_header = pkt[6]
+        payload_len = _U16.unpack_from(pkt, 4)[0]
+        if payload_len and 40 + payload_len <= len(pkt):
+            pkt = pkt[:40 + payload_len]
+        src, dst = bytes(pkt[8:24]), bytes(pkt[24:40])
+        offset, end = 40, len(pkt)
+        while next_header in _IPV6_EXT_HEADERS and offset + 8 <= end:
+            next_header = pkt[offset]
+            offset += (pkt[offset + 1] + 1) * 8
+        if next_header != 6:
+            return None
+        segment = pkt[offset:]
+
+    if len(segment) < 20:
+        return None
+    return pkt, src, dst, segment
+
+
+def decode_tcp(linktype, data):
+    """
+    功能: 解码帧中的TCP报文段
+    输入:
+        linktype: 链路层类型
+        data: 帧内容（memoryview）
+    输出:
+        元组 (src_ip, dst_ip, src_port, dst_port, seq, flags, payload)
+            src_ip/dst_ip: 原始地址字节（IPv4为4字节，IPv6为16字节）
+            payload: TCP载荷（memoryview，零拷贝）
+        非TCP报文、分片报文或截断报文返回None
+    """
+    located = locate_tcp(linktype, data)
+    if located is None:
+        return None
+    _, src, dst, segment = located
+
+    src_port, dst_port, seq = struct.unpack_from('!HHI', segment, 0)
+    data_offset = (segment[12] >> 4) * 4
+    if data_offset < 20 or data_offset > len(segment):
+        return None
+    return src, dst, src_port, dst_port, seq, segment[13], segment[data_offset:]
@@ -1,18 +1,206 @@
 import os
-import csv
-import subprocess
-import glob
-from collections import defaultdict
 from multiprocessing import cpu_count, get_context
 from tqdm import tqdm
 #============= 系统自定义模块 =============
-from pcap_analysis.pcap_parser import process_chunk
+from pcap_analysis.pcap_parser import (
+    process_chunk, extract_http_requests, save_http_requests, resolve_backend,
+    find_target_connections, BACKEND_TSHARK, REQUEST_SCOPE
+)
+from pcap_analysis.flow_processor import (
+    batch_flows_by_bytes, batch_store_flows, process_flow_batch, process_store_batch
+)
+from pcap_analysis.request_store import (
+    open_request_store, create_request_store, finalize_request_store, segment_path, segment_reader
+)
+from pcap_analysis.flow_sharder import shard_pcap_by_flow
+from pcap_analysis.tshark_session import init_session_worker
+from pcap_analysis.compressed_capture import capture_size
+from utils.image_manifest import reset_manifest
+from utils.image_pack import reset_pack
+from utils.columnar import TableWriter, FLOW_COLUMNS
+from utils.checkpoint import (
+    CheckpointJournal, DEFAULT_MAX_RETRIES, file_fingerprint, guarded_call, run_units, unit_key
+)
 import shutil
 #=========================================
 
+def process_chunks_parallel(chunks, tshark_path, image_output_dir, backend, max_workers,
+                            result_store=None, journal=None, max_retries=DEFAULT_MAX_RETRIES,
+                            store_dir=None, tshark_sessions=True):
+    """
+    功能: 多进程并行处理分片文件（每个进程独立解析并处理一个分片）
+    输入:
+        chunks: 分片文件路径列表
+        tshark_path: TShark工具路径
+        image_output_dir: 图片输出目录
+        backend: 解析后端
+        max_workers: 最大进程数
+        result_store: 结果库（utils.result_store.ResultStore），每个分片完成后写入
+        journal: 检查点日志（utils.checkpoint.CheckpointJournal），None表示不保存进度
+        max_retries: 失败分片的重试轮数
+        store_dir: 请求存储目录（None表示不保存），每个分片解析出的请求写入同名分段
+        tshark_sessions: tshark后端时每个工作进程使用常驻tshark会话依次解析多个分片
+    输出:
+        list: 各网络流的敏感信息字典
+
+    注意:
+    - 启用检查点时分片以文件名为单元标识，解析异常不再被吞掉而是记为失败并重试；
+      分片文件在结果写入检查点后才删除，中断后重新运行可直接使用剩余分片
+    """
+    num_chunks = len(chunks)
+    pool_size = max(1, min(num_chunks, max_workers))
+    print(f"分割为 {num_chunks} 个分片")
+    print(f"使用 {pool_size} 个处理器并行分析分片...")
+
+    def run_round(tasks, count):
+        # 多进程处理分片（使用spawn上下文避免继承锁问题）
+        # 工作进程退出时关闭常驻tshark会话（需正常close/join，terminate不执行退出回调）
+        with get_context('spawn').Pool(max(1, min(count, pool_size)),
+                                       initializer=init_session_worker) as pool:
+            # 使用tqdm显示整体进度（每个分片处理完成后更新进度条）
+            yield from tqdm(pool.imap_unordered(guarded_call, tasks), total=count, desc="处理分片")
+            pool.close()
+            pool.join()
+
+    def on_result(unit, chunk_result):
+        if result_store is not None:
+            result_store.upsert_flows(info for _, info in chunk_result)
+        if journal is not None:
+            try:
+                os.remove(os.path.join(os.path.dirname(chunks[0]), unit))  # 结果已保存，删除分片
+            except FileNotFoundError:
+                pass
+
+    # 任务参数（分片路径，tshark路径，图片输出目录，解析后端，是否抛出解析异常，请求存储分段，常驻会话）
+    strict = journal is not None
+    units = [(os.path.basename(chunk), process_chunk,
+              (chunk, tshark_path, image_output_dir, backend, strict,
+               segment_path(store_dir, os.path.basename(chunk)) if store_dir else None,
+               tshark_sessions))
+             for chunk in chunks]
+    results = run_units(units, run_round, journal, on_result, max_retries)
+    # 同一TCP流不会跨分片，分片结果按分片顺序直接拼接
+    return [info for unit in units for _, info in results[unit[0]]]
+
+
+def process_flows_parallel(pcap_file, tshark_path, image_output_dir, backend, max_workers,
+                           result_store=None, journal=None, max_retries=DEFAULT_MAX_RETRIES,
+                           store_dir=None, fingerprint=None, two_pass=False):
+    """
+    功能: 单个抓包文件内的流级并行处理
+    输入:
+        pcap_file: PCAP文件路径
+        tshark_path: TShark工具路径
+        image_output_dir: 图片输出目录
+        backend: 解析后端
+        max_workers: 最大进程数
+        result_store: 结果库（utils.result_store.ResultStore），每个工作单元完成后写入
+        journal: 检查点日志（utils.checkpoint.CheckpointJournal），None表示不保存进度
+        max_retries: 失败工作单元的重试轮数
+        store_dir: 请求存储目录（None表示不保存）；指定时解析结果写入请求存储，
+            再由各进程从请求存储读取请求处理（同process_store_parallel）
+        fingerprint: 抓包文件指纹（写入请求存储清单）
+        two_pass: tshark后端使用两遍模式（先定位目标连接，再只解析这些连接）
+    输出:
+        list: 各网络流的敏感信息字典（保持流出现顺序）
+
+    处理流程:
+    1. 主进程完成解析阶段，得到按流分组的请求
+    2. 按请求体字节数把网络流划分为工作单元（图片密集的流均衡分布到各进程）
+    3. 进程池以无序方式领取工作单元，空闲进程立即领取下一单元；
+       检查点中已完成的单元（按单元内流标识识别）直接恢复结果
+    4. 按单元序号还原结果顺序
+
+    注意:
+    - 请求体为原始bytes，跨spawn进程边界时按原始字节序列化，
+      传输量约为原十六进制字符串的一半
+    """
+    print("解析HTTP请求...")
+    if store_dir:
+        segment = segment_path(store_dir, 'capture')
+        if save_http_requests(pcap_file, tshark_path, segment, backend, two_pass) is None:
+            return []
+        finalize_request_store(store_dir, fingerprint, [segment], REQUEST_SCOPE)
+        return process_store_parallel([segment], image_output_dir, max_workers,
+                                      result_store, journal, max_retries)
+
+    http_requests = extract_http_requests(pcap_file, tshark_path, backend, two_pass)
+    if not http_requests:
+        return []
+
+    batches = batch_flows_by_bytes(http_requests, max_workers)
+    del http_requests  # 请求数据已转移到工作单元中
+    pool_size = max(1, min(len(batches), max_workers))
+    print(f"划分为 {len(batches)} 个工作单元")
+    print(f"使用 {pool_size} 个处理器并行分析网络流...")
+
+    def run_round(tasks, count):
+        with get_context('spawn').Pool(max(1, min(count, pool_size))) as pool:
+            yield from tqdm(pool.imap_unordered(guarded_call, tasks), total=count, desc="处理网络流")
+
+    def on_result(unit, batch_result):
+        if result_store is not None:
+            result_store.upsert_flows(info for _, info in batch_result[1])
+
+    # 单元标识由单元内的流标识计算，重新运行时同一单元得到相同标识
+    unit_ids = [unit_key(flow_key for flow_key, _ in batch) for batch in batches]
+
+    def iter_units():
+        for i, unit in enumerate(unit_ids):
+            batch, batches[i] = batches[i], None  # 工作单元只由待处理任务持有，完成后尽早释放请求体
+            yield unit, process_flow_batch, (i, batch, image_output_dir)
+
+    results = run_units(iter_units(), run_round, journal, on_result, max_retries)
+    return [info for unit in unit_ids for _, info in results[unit][1]]
+
+
+def process_store_parallel(segments, image_output_dir, max_workers,
+                           result_store=None, journal=None, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    功能: 从请求存储直接进行流级并行处理（跳过协议解析）
+    输入:
+        segments: 请求存储分段路径列表（见pcap_analysis.request_store）
+        image_output_dir: 图片输出目录
+        max_workers: 最大进程数
+        result_store/journal/max_retries: 同process_flows_parallel
+    输出:
+        list: 各网络流的敏感信息字典（按分段顺序、流出现顺序）
+
+    说明:
+    - 工作单元按分段索引中的请求体长度划分，只读取索引
+    - 任务只传递分段路径与流序号，各进程mmap分段按索引读取请求体
+    - 不同分段（分片）的流标识相互独立，单元不跨分段
+    """
+    units = []
+    for path in segments:
+        name = os.path.basename(path)
+        for flow_nos in batch_store_flows(segment_reader(path), max_workers):
+            units.append((unit_key([name, *flow_nos]), process_store_batch,
+                          (path, flow_nos, image_output_dir)))
+    if not units:
+        return []
+    pool_size = max(1, min(len(units), max_workers))
+    print(f"划分为 {len(units)} 个工作单元")
+    print(f"使用 {pool_size} 个处理器并行分析网络流...")
+
+    def run_round(tasks, count):
+        with get_context('spawn').Pool(max(1, min(count, pool_size))) as pool:
+            yield from tqdm(pool.imap_unordered(guarded_call, tasks), total=count, desc="处理网络流")
+
+    def on_result(unit, flow_results):
+        if result_store is not None:
+            result_store.upsert_flows(info for _, info in flow_results)
+
+    results = run_units(units, run_round, journal, on_result, max_retries)
+    return [info for unit in units for _, info in results[unit[0]]]
+
+
 def process_large_pcap(pcap_file, tshark_path,
                        csv_output_file='sensitive_data.csv',
-                       image_output_dir='extracted_images'):
+                       image_output_dir='extracted_images',
+                       backend=None, result_store=None, output_format=None,
+                       checkpoint=True, max_retries=DEFAULT_MAX_RETRIES, reuse_requests=False,
+                       tshark_sessions=True, tshark_two_pass=False):
     """
     功能: 处理大文件同时提取图片与敏感数据, 生成CSV报告
     调用链: 
@@ -22,77 +210,123 @@ def process_large_pcap(pcap_file, tshark_path,
         4. 生成最终CSV报告
         5. 调用logger记录日志
     输入: 
-        pcap_file: PCAP文件路径 (str)
+        pcap_file: PCAP文件路径 (str)，也可以是gzip/zstd压缩文件（.pcap.gz / .pcap.zst），
+            边解压边解析，不生成解压后的临时文件
         tshark_path: TShark工具路径 (str)
-        csv_output_file: 输出CSV文件路径，默认'sensitive_data.csv' (str)
-        image_output_dir: 图片输出目录，默认'extracted_images' (str)
+        csv_output_file: 结果文件路径，默认'sensitive_data.csv' (str)
+        image_output_dir: 图片输出目录，默认'extracted_images' (str)；
+            也可传入图片输出端对象（如SharedMemoryImageSink），图片直接交给OCR进程
+        backend: 解析后端，'tshark'/'native'，默认None表示tshark可用时使用tshark (str)
+        result_store: 结果库（utils.result_store.ResultStore），默认None表示不写入；
+            开始处理时清空（从检查点恢复时保留），网络流结果随处理完成按手机号upsert，供Step_3关联
+        output_format: 结果文件格式，'csv'/'parquet'/'arrow'，默认None表示按扩展名推断 (str)
+        checkpoint: 是否启用检查点（仅图片输出为目录时生效），默认True (bool)；
+            按输入文件指纹记录已完成的分片/工作单元及其结果，中断后重新运行只处理未完成的单元
+        max_retries: 失败单元的重试轮数 (int)
+        reuse_requests: 是否保存并复用解析结果，默认False (bool)；
+            启用后首次运行把解析出的HTTP请求写入抓包文件旁的请求存储（<抓包文件>.reqs），
+            抓包文件未变化时之后的运行跳过tshark/native解析，直接进行流处理
+            （只修改flow_processor中的提取规则时无需重新解析）
+            请求存储是目标请求体（含证件图片）的完整副本，只在调用方明确要求时写入
+        tshark_sessions: 分片处理时是否使用常驻tshark会话，默认True (bool)；
+            每个工作进程只启动一次tshark，分片依次从标准输入送入，省去每个分片的解析器初始化
+        tshark_two_pass: tshark后端是否使用两遍模式，默认False (bool)；
+            第一遍不重组请求体、只输出目标接口请求所属的连接，之后只对这些连接的报文
+            做完整解析（大文件时只把这些连接写入分片），目标请求稀疏时减少重组与输出量
     输出: 
-        生成CSV文件 + 图片文件
-        返回: None
+        生成结果文件 + 图片包及图片清单（csv_output_file为None时不生成结果文件）
+        返回: list，各网络流的敏感信息字典
     """
-    # 初始化输出目录（自动创建不存在的目录）
-    os.makedirs(image_output_dir, exist_ok=True)
+    # 检查点（按输入文件指纹区分；图片直接交给OCR进程时无法恢复已输出的图片，不启用）
+    journal = None
+    use_journal = checkpoint and isinstance(image_output_dir, str)
+    fingerprint = file_fingerprint(pcap_file) if use_journal or reuse_requests else None
+    if use_journal:
+        journal = CheckpointJournal('pcap', fingerprint)
+        if journal.resumed:
+            print(f"检测到未完成的检查点，已完成 {len(journal.done)} 个单元，继续处理")
 
-    # 分片处理逻辑（当文件大小超过1GB时进行分片）
-    temp_dir = None
-    if os.path.getsize(pcap_file) > 1 * 1024 ** 3:  # 1GB阈值
-        temp_dir = "temp_pcap_chunks"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # 使用editcap工具分割大文件（每50万包为一个分片）
-        editcap_path = os.path.join(os.path.dirname(tshark_path), "editcap")
-        subprocess.run([
-            editcap_path,
-            '-c', '500000',  # 每个分片包含的包数量
-            pcap_file,
-            os.path.join(temp_dir, "chunk")  # 分片文件前缀
-        ], check=True)
-
-        # 获取排序后的分片文件列表
-        chunks = sorted(glob.glob(os.path.join(temp_dir, "chunk*")))
-    else:
-        chunks = [pcap_file]  # 小文件直接处理
+    # 初始化输出目录（自动创建不存在的目录），清空上次解析的图片清单与图片包
+    # （从检查点恢复时保留，已完成单元输出的图片不会重新生成）
+    if isinstance(image_output_dir, str):
+        os.makedirs(image_output_dir, exist_ok=True)
+        if journal is None or not journal.resumed:
+            reset_manifest(image_output_dir)
+            reset_pack(image_output_dir)
+    # 清空结果库中上一个抓包文件的结果（恢复时已完成单元的结果会重新写入）
+    if result_store is not None and (journal is None or not journal.resumed):
+        result_store.reset()
+    backend = resolve_backend(backend, tshark_path)
+    print(f"使用 {backend} 后端解析PCAP")
 
     # 动态计算核心数（使用75%的CPU核心，至少保留2个核心）
-    num_chunks = len(chunks)
     cpu_cores = cpu_count()
-    pool_size = min(num_chunks, max(2, int(cpu_cores * 0.75)))
-    print(f"分割为 {num_chunks} 个分片")
-    print(f"使用 {pool_size} 个处理器并行分析分片...")
+    max_workers = max(2, int(cpu_cores * 0.75))
+
+    # 已有与抓包文件匹配的请求存储时跳过协议解析
+    segments = open_request_store(pcap_file, fingerprint, REQUEST_SCOPE) if reuse_requests else None
+    store_dir = None
+    if reuse_requests and segments is None:
+        store_dir = create_request_store(pcap_file, fingerprint,
+                                         reset=journal is None or not journal.resumed)
+
+    two_pass = tshark_two_pass and backend == BACKEND_TSHARK
+
+    def shard(output_dir, num_shards):
+        # 两遍模式下只把包含目标接口请求的连接写入分片
+        connections = find_target_connections(pcap_file, tshark_path) if two_pass else None
+        return shard_pcap_by_flow(pcap_file, output_dir, num_shards, connections=connections)
+
+    # 分片处理逻辑（当文件原始大小超过1GB时按TCP流分片；压缩文件按解压后的大小判断）
+    temp_dir = None
+    if segments is not None:
+        print("使用已保存的请求存储，跳过协议解析")
+        final_results = process_store_parallel(
+            segments, image_output_dir, max_workers, result_store, journal, max_retries)
+    elif capture_size(pcap_file) > 1 * 1024 ** 3:  # 1GB阈值
+        if journal is None:
+            temp_dir = "temp_pcap_chunks"
+            chunks = shard(temp_dir, max_workers)
+        else:
+            # 分片目录随检查点保留；上次的分片完整且未完成的分片都还在时直接使用
+            chunk_dir = journal.work_dir("temp_pcap_chunks")
+            chunks = [os.path.join(chunk_dir, name) for name in journal.meta.get('chunks', [])]
+            if not chunks or not all(os.path.exists(c) for c in chunks
+                                     if os.path.basename(c) not in journal.done):
+                # 一次顺序扫描按五元组哈希分片，每个TCP流完整落在同一分片中
+                # （分片数沿用上次的值，同一TCP流总是落在同名分片中）
+                num_shards = journal.meta.get('num_shards', max_workers)
+                chunks = shard(chunk_dir, num_shards)
+                journal.set_meta('num_shards', num_shards)
+                journal.set_meta('chunks', [os.path.basename(c) for c in chunks])
+                for chunk in chunks:
+                    if os.path.basename(chunk) in journal.done:
+                        os.remove(chunk)
+        final_results = process_chunks_parallel(
+            chunks, tshark_path, image_output_dir, backend, max_workers, result_store,
+            journal, max_retries, store_dir, tshark_sessions)
+        # 所有分片的请求都已写入分段时，请求存储才可复用
+        if store_dir:
+            chunk_segments = [segment_path(store_dir, os.path.basename(c)) for c in chunks]
+            if all(os.path.exists(path) for path in chunk_segments):
+                finalize_request_store(store_dir, fingerprint, chunk_segments, REQUEST_SCOPE)
+    else:
+        # 小文件：解析阶段与流处理阶段解耦，网络流按字节数分批并行处理
+        final_results = process_flows_parallel(
+            pcap_file, tshark_path, image_output_dir, backend, max_workers, result_store,
+            journal, max_retries, store_dir, fingerprint, two_pass)
+
+    # 生成最终报告（按记录批次写出，CSV为UTF-8编码，Parquet/Arrow为带类型的列式文件）
+    if csv_output_file:
+        with TableWriter(csv_output_file, FLOW_COLUMNS, output_format) as writer:
+            writer.write_rows(final_results)
 
-    # 多进程处理分片（使用spawn上下文避免继承锁问题）
-    final_results = defaultdict(dict)
-    with get_context('spawn').Pool(pool_size) as pool:
-        # 准备任务参数（分片路径，tshark路径，图片输出目录）
-        args = [(chunk, tshark_path, image_output_dir) for chunk in chunks]
-
-        # 使用tqdm显示整体进度（每个分片处理完成后更新进度条）
-        with tqdm(total=len(chunks), desc="处理分片") as pbar:
-            for chunk_result in pool.imap(process_chunk, args):
-                # 合并分片处理结果（保留最新出现的数据）
-                for flow_key, sensitive_info in chunk_result:
-                    current = final_results.get(flow_key, {})
-                    # 按字段优先级更新数据（后出现的值覆盖先出现的）
-                    for k in ['username', 'password', 'phone', 'name']:
-                        if sensitive_info.get(k):
-                            current[k] = sensitive_info[k]
-                    final_results[flow_key] = current
-                pbar.update(1)
-
-    # 生成最终报告（CSV格式，UTF-8编码）
-    with open(csv_output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(["username", "password", "name", "phone"])  # CSV表头
-        for info in final_results.values():
-            writer.writerow([
-                info.get('username', ''),
-                info.get('password', ''),
-                info.get('name', ''),
-                info.get('phone', '')
-            ])
-
-    # 清理临时目录（仅当创建过分片目录时执行）
+    # 清理临时目录（仅当创建过分片目录时执行）；最终报告已生成，删除检查点
     if temp_dir and os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
+    if journal is not None:
+        journal.finish()
 
-    print(f"处理完成，结果已保存到: {csv_output_file}")
\ No newline at end of file
+    if csv_output_file:
+        print(f"处理完成，结果已保存到: {csv_output_file}")
+    return final_results
@@ -0,0 +1,208 @@
+import os
+import json
+import mmap
+import shutil
+import struct
+#============= 系统自定义模块 =============
+from config.PATH import Cache_path
+#=========================================
+
+# 请求存储目录（位于抓包文件旁：<抓包文件>.reqs；抓包所在目录不可写时放在持久缓存目录下）
+STORE_SUFFIX = '.reqs'
+STORE_MANIFEST = 'store.json'
+STORE_VERSION = 1
+SEGMENT_SUFFIX = '.seg'
+
+# 分段文件: 文件头 + 数据段（URI与请求体依次追加）+ 流表（JSON）+ 定长索引
+# 文件头: 魔数(8) + 版本(4) + 请求数(8) + 流表偏移(8) + 流表长度(8) + 索引偏移(8)
+SEGMENT_MAGIC = b'SDSREQS\x00'
+SEGMENT_HEADER = struct.Struct('<8sIQQQQ')
+# 索引记录: 流序号(4) + URI偏移(8) + URI长度(4) + 请求体偏移(8) + 请求体长度(4)
+SEGMENT_RECORD = struct.Struct('<IQIQI')
+
+
+class RequestSegmentWriter:
+    """
+    请求存储分段写入器
+
+    解析后端逐条产出的请求按顺序追加到数据段，流表与索引在close时写在文件末尾；
+    写入临时文件，完成后原子替换，中途失败不会留下不完整的分段
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp = path + '.tmp'
+        self._file = open(self._tmp, 'wb')
+        self._file.write(bytes(SEGMENT_HEADER.size))
+        self._offset = SEGMENT_HEADER.size
+        self._flows = {}
+        self._index = bytearray()
+        self.count = 0
+
+    def _put(self, data):
+        offset = self._offset
+        self._file.write(data)
+        self._offset += len(data)
+        return offset
+
+    def append(self, flow_key, request):
+        """追加一条请求（flow_key为(源端口, 流ID)，请求字典结构同解析后端输出）"""
+        flow_no = self._flows.setdefault(tuple(flow_key), len(self._flows))
+        uri = (request.get('uri') or '').encode('utf-8')
+        body = request.get('body') or b''
+        uri_offset = self._put(uri)
+        body_offset = self._put(body)
+        self._index += SEGMENT_RECORD.pack(flow_no, uri_offset, len(uri), body_offset, len(body))
+        self.count += 1
+
+    def close(self):
+        """写出流表、索引与文件头，替换为正式分段文件"""
+        flows = json.dumps(list(self._flows), ensure_ascii=False).encode('utf-8')
+        flows_offset = self._put(flows)
+        index_offset = self._put(bytes(self._index))
+        self._file.seek(0)
+        self._file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, STORE_VERSION, self.count,
+                                             flows_offset, len(flows), index_offset))
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        self._file.close()
+        try:
+            os.remove(self._tmp)
+        except FileNotFoundError:
+            pass
+
+
+class RequestSegmentReader:
+    """
+    请求存储分段读取器（mmap随机访问）
+
+    可按请求序号或按网络流读取，请求体按索引中的偏移直接从映射中切出
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, flows_offset, flows_length, self._index_offset = \
+            SEGMENT_HEADER.unpack_from(self._map, 0)
+        if magic != SEGMENT_MAGIC or version != STORE_VERSION:
+            self.close()
+            raise ValueError(f"不是有效的请求存储分段: {path}")
+        self.flows = [tuple(key) for key in
+                      json.loads(self._map[flows_offset:flows_offset + flows_length].decode('utf-8'))]
+        self._flow_records = None
+
+    def record(self, number):
+        """第number条请求的索引记录 (流序号, URI偏移, URI长度, 请求体偏移, 请求体长度)"""
+        return SEGMENT_RECORD.unpack_from(self._map, self._index_offset + number * SEGMENT_RECORD.size)
+
+    def request(self, number):
+        """读取第number条请求，返回 (flow_key, 请求字典)"""
+        flow_no, uri_offset, uri_length, body_offset, body_length = self.record(number)
+        return self.flows[flow_no], {
+            'uri': self._map[uri_offset:uri_offset + uri_length].decode('utf-8', errors='replace'),
+            'body': self._map[body_offset:body_offset + body_length],
+        }
+
+    def flow_records(self):
+        """各网络流的请求序号列表（按抓包顺序），只扫描索引"""
+        if self._flow_records is None:
+            records = [[] for _ in self.flows]
+            end = self._index_offset + self.count * SEGMENT_RECORD.size
+            for number, (flow_no, _, _, _, body_length) in enumerate(
+                    SEGMENT_RECORD.iter_unpack(self._map[self._index_offset:end])):
+                records[flow_no].append((number, body_length))
+            self._flow_records = records
+        return self._flow_records
+
+    def flow_requests(self, flow_no):
+        """按抓包顺序读取一个网络流的全部请求"""
+        return [self.request(number)[1] for number, _ in self.flow_records()[flow_no]]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _store_locations(pcap_file, fingerprint):
+    """请求存储的候选目录：抓包文件旁，其次为持久缓存目录"""
+    name = f"{os.path.basename(pcap_file)}-{fingerprint[:16]}{STORE_SUFFIX}"
+    return [pcap_file + STORE_SUFFIX, os.path.join(Cache_path, 'requests', name)]
+
+
+def open_request_store(pcap_file, fingerprint, scope=None):
+    """
+    功能: 查找与抓包文件匹配的完整请求存储
+    输入:
+        pcap_file: 抓包文件路径
+        fingerprint: 抓包文件指纹（utils.checkpoint.file_fingerprint）
+        scope: 请求范围（如解析时过滤的接口列表，见pcap_parser.REQUEST_SCOPE）
+    输出: 分段文件路径列表；不存在、不完整、抓包文件已变化或请求范围不同时返回None
+    """
+    for store_dir in _store_locations(pcap_file, fingerprint):
+        try:
+            with open(os.path.join(store_dir, STORE_MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if manifest.get('version') != STORE_VERSION or manifest.get('fingerprint') != fingerprint \
+                or manifest.get('scope') != scope:
+            continue
+        segments = [os.path.join(store_dir, name) for name in manifest.get('segments', [])]
+        if all(os.path.exists(path) for path in segments):
+            return segments
+    return None
+
+
+def create_request_store(pcap_file, fingerprint, reset=True):
+    """
+    功能: 创建请求存储目录
+    输入:
+        pcap_file/fingerprint: 同open_request_store
+        reset: 是否清空已有内容（从检查点恢复时保留已完成分片写出的分段）
+    输出: 存储目录路径；两个候选位置都不可写时返回None
+    """
+    for store_dir in _store_locations(pcap_file, fingerprint):
+        try:
+            if reset:
+                shutil.rmtree(store_dir, ignore_errors=True)
+            os.makedirs(store_dir, exist_ok=True)
+            return store_dir
+        except OSError:
+            continue
+    return None
+
+
+def segment_path(store_dir, name):
+    """存储目录下的分段文件路径"""
+    return os.path.join(store_dir, name + SEGMENT_SUFFIX)
+
+
+def finalize_request_store(store_dir, fingerprint, segments, scope=None):
+    """所有分段写完后写入存储清单（清单存在即表示存储完整可用）"""
+    manifest = {
+        'version': STORE_VERSION,
+        'fingerprint': fingerprint,
+        'scope': scope,
+        'segments': [os.path.basename(path) for path in segments],
+    }
+    tmp = os.path.join(store_dir, STORE_MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(store_dir, STORE_MANIFEST))
+
+
+# 每个进程每个分段一个读取器
+_readers = {}
+
+
+def segment_reader(path):
+    """获取当前进程的分段读取器（按需打开）"""
+    key = (os.getpid(), path)
+    reader = _readers.get(key)
+    if reader is None:
+        reader = _readers[key] = RequestSegmentReader(path)
+    return reader
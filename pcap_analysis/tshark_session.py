@@ -0,0 +1,224 @@
+import os
+import struct
+import atexit
+import threading
+import subprocess
+from multiprocessing.util import Finalize
+#============= 系统自定义模块 =============
+from pcap_analysis.pcap_reader import pcap_global_header, pcap_record_header, LINKTYPE_RAW
+#=========================================
+
+# 常驻会话的输入格式：分片统一为LINKTYPE_RAW的经典pcap（见flow_sharder），
+# 文件头相同的分片去掉文件头后即可直接拼接到同一输入流中
+SESSION_HEADER = pcap_global_header(LINKTYPE_RAW)
+
+# 单个会话累计输入的字节数上限（tshark为每个数据包与每条TCP流保留状态，
+# 超过上限后重启会话，限制常驻进程的内存增长）
+SESSION_MAX_BYTES = 2 * 1024 ** 3
+
+# 向tshark标准输入写数据的块大小
+FEED_BLOCK_SIZE = 1024 * 1024
+
+# 哨兵请求：每个分片之后追加一个HTTP请求，读到它的URI即表示该分片的输出已全部到达
+# （使用TEST-NET保留地址，不会与抓包中的真实连接冲突）
+SENTINEL_PREFIX = '/__sds_chunk_end__/'
+SENTINEL_SRC = bytes([192, 0, 2, 1])
+SENTINEL_DST = bytes([192, 0, 2, 2])
+SENTINEL_SRC_PORT = 9
+SENTINEL_DST_PORT = 80
+
+_IPV4_HEADER = struct.Struct('!BBHHHBBH4s4s')
+_TCP_HEADER = struct.Struct('!HHIIBBHHH')
+_TCP_PSH_ACK = 0x18
+
+
+def _ipv4_checksum(header):
+    total = sum(struct.unpack(f'!{len(header) // 2}H', header))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def sentinel_packet(seq, token):
+    """
+    功能: 构造哨兵请求报文（原始IPv4 + TCP + HTTP GET）
+    输入:
+        seq: TCP序列号（哨兵请求在同一连接上依次发送，序列号按载荷长度递增）
+        token: 哨兵编号
+    输出: (报文字节, 载荷长度)
+    """
+    payload = f"GET {SENTINEL_PREFIX}{token} HTTP/1.1\r\nHost: sds\r\n\r\n".encode('ascii')
+    tcp = _TCP_HEADER.pack(SENTINEL_SRC_PORT, SENTINEL_DST_PORT, seq, 1,
+                           5 << 4, _TCP_PSH_ACK, 65535, 0, 0)
+    total_length = _IPV4_HEADER.size + len(tcp) + len(payload)
+    ip = _IPV4_HEADER.pack(0x45, 0, total_length, 0, 0, 64, 6, 0, SENTINEL_SRC, SENTINEL_DST)
+    ip = ip[:10] + struct.pack('!H', _ipv4_checksum(ip)) + ip[12:]
+    return ip + tcp + payload, len(payload)
+
+
+def session_filter(display_filter):
+    """在显示过滤器上追加哨兵请求的匹配条件（哨兵请求不带请求体，也不属于目标接口）"""
+    return f'({display_filter}) or http.request.uri contains "{SENTINEL_PREFIX}"'
+
+
+def session_compatible(chunk_path):
+    """分片文件头与会话输入格式一致时才能拼接到常驻会话中"""
+    try:
+        with open(chunk_path, 'rb') as f:
+            return f.read(len(SESSION_HEADER)) == SESSION_HEADER
+    except OSError:
+        return False
+
+
+class TsharkSession:
+    """
+    常驻tshark解析会话
+
+    tshark以'-r -'从标准输入读取一个持续增长的pcap流：启动时写入一次文件头，
+    之后每个分片去掉文件头后依次写入，分片末尾追加一个哨兵请求；
+    读取输出直到遇到该分片的哨兵URI，即完成一个分片，进程保持运行等待下一个分片。
+    解析器与插件的初始化只在会话启动时进行一次，而不是每个分片一次
+    """
+
+    def __init__(self, command):
+        """
+        参数:
+            command: tshark命令行（以'-r -'从标准输入读取，且带-l逐包刷新输出；
+                显示过滤器须经session_filter追加哨兵条件，见pcap_parser.iter_chunk_requests）
+        """
+        self.command = list(command)
+        self.proc = None
+        self.fed_bytes = 0
+        self.chunks = 0
+        self._seq = 1
+        self._token = 0
+        self._returncode = None
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.proc.stdin.write(SESSION_HEADER)
+        self.fed_bytes = len(SESSION_HEADER)
+        self.chunks = 0
+        self._seq = 1
+
+    def _feed(self, proc, chunk_path, packet):
+        """写入线程：分片数据（跳过文件头）+ 哨兵请求；写入失败时结束tshark，读取方随即读到EOF"""
+        stdin = proc.stdin
+        try:
+            with open(chunk_path, 'rb') as f:
+                f.seek(len(SESSION_HEADER))
+                while True:
+                    block = f.read(FEED_BLOCK_SIZE)
+                    if not block:
+                        break
+                    stdin.write(block)
+            stdin.write(pcap_record_header(0.0, len(packet)))
+            stdin.write(packet)
+            stdin.flush()
+        except (OSError, ValueError):  # BrokenPipeError、分片读取失败等
+            self._kill(proc)
+
+    def requests(self, chunk_path, line_reader):
+        """
+        功能: 解析一个分片，逐条产出HTTP请求
+        输入:
+            chunk_path: 分片文件路径（文件头须与SESSION_HEADER一致）
+            line_reader: 函数 (输出行) -> (flow_key, 请求字典)，无法解析的行返回None
+        输出: 生成器，逐条产出 (flow_key, 请求字典)
+        异常:
+            subprocess.CalledProcessError: tshark在分片结束前退出
+        注意:
+            写入与读取分别在两个线程中进行，避免双方管道都写满时互相等待；
+            调用方提前终止迭代或出现异常时会话被关闭，下一个分片重新启动会话
+        """
+        if self.proc is None or self.proc.poll() is not None \
+                or self.fed_bytes + os.path.getsize(chunk_path) > SESSION_MAX_BYTES:
+            self.close()
+            self._start()
+
+        self._token += 1
+        token = f"{os.getpid()}-{self._token}"
+        packet, payload_length = sentinel_packet(self._seq, token)
+        self._seq = (self._seq + payload_length) & 0xFFFFFFFF
+        sentinel = SENTINEL_PREFIX + token
+
+        writer = threading.Thread(target=self._feed, args=(self.proc, chunk_path, packet), daemon=True)
+        writer.start()
+        finished = False
+        try:
+            for line in self.proc.stdout:
+                item = line_reader(line.decode('utf-8', errors='replace'))
+                if item is None:
+                    continue
+                flow_key, request = item
+                if request['uri'].startswith(SENTINEL_PREFIX):
+                    if request['uri'] == sentinel:
+                        finished = True
+                        break
+                    continue
+                yield flow_key, request
+        finally:
+            if not finished:  # 结束tshark后写入线程因管道断开而退出
+                self._kill(self.proc)
+            writer.join()
+            if not finished:
+                self.close()
+
+        if not finished:
+            raise subprocess.CalledProcessError(self._returncode, self.command)
+        self.fed_bytes += os.path.getsize(chunk_path) - len(SESSION_HEADER)
+        self.chunks += 1
+
+    def close(self):
+        """结束会话（剩余输出不再需要，直接结束tshark进程）"""
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        self._kill(proc)
+        for pipe in (proc.stdin, proc.stdout):
+            try:
+                pipe.close()
+            except OSError:  # 管道已断开
+                pass
+
+    def _kill(self, proc):
+        if proc.poll() is None:
+            proc.kill()
+        self._returncode = proc.wait()
+
+
+# 每个进程每条命令行一个会话（进程池工作进程在多个分片之间复用）
+_sessions = {}
+
+
+def get_session(command):
+    """获取当前进程的常驻tshark会话（按需创建，进程退出时关闭）"""
+    key = (os.getpid(), tuple(command))
+    session = _sessions.get(key)
+    if session is None:
+        session = _sessions[key] = TsharkSession(command)
+    return session
+
+
+@atexit.register
+def close_sessions():
+    """关闭当前进程的所有会话"""
+    for key in [k for k in _sessions if k[0] == os.getpid()]:
+        _sessions.pop(key).close()
+
+
+def init_session_worker():
+    """
+    功能: 进程池工作进程初始化函数，工作进程退出时关闭其常驻会话
+    说明:
+        进程池terminate时工作进程被直接结束，fork方式启动的工作进程以os._exit退出，
+        都不会执行atexit回调；Finalize注册的回调在工作进程正常退出前执行，
+        因此进程池须先close/join再退出，常驻tshark随工作进程一起结束，
+        不会在进程池结束后继续运行到读到EOF
+    """
+    Finalize(None, close_sessions, exitpriority=10)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接从仓库根目录导入各模块（与Step_*.py的运行方式一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,111 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+try:
+    import paddleocr  # noqa: F401
+except ImportError:  # 识别模型在测试中全部替换为FakeModel，不需要真实的PaddleOCR
+    sys.modules['paddleocr'] = types.ModuleType('paddleocr')
+    sys.modules['paddleocr'].PaddleOCR = None
+
+from image_ocr.card_processor import OptimizedCardProcessor, CARD_PATTERNS, REC_BATCH_SIZE, REC_IMAGE_HEIGHT
+from image_ocr.validators import luhn_valid
+
+
+def bankcard(k, valid=True):
+    """第k张裁剪图对应的16位卡号（valid=False时校验位错误）"""
+    prefix = f'411111111111{k:03d}'
+    check = next(d for d in '0123456789' if luhn_valid(prefix + d))
+    return prefix + (check if valid else str((int(check) + 1) % 10))
+
+
+class FakeModel:
+    """
+    模拟PaddleOCR：裁剪图的像素值即图片序号k
+        text_recognizer: 按批返回每张图各自的识别结果
+        ocr（检测+识别）: 返回无法通过校验的文本
+    """
+
+    def __init__(self, tier, valid):
+        self.tier = tier
+        self.valid = valid          # valid(k) -> 该层级的识别结果能否通过校验
+        self.batches = []
+        self.full_calls = 0
+
+    def text_recognizer(self, img_list):
+        assert isinstance(img_list, list)
+        assert all(img.shape[0] == REC_IMAGE_HEIGHT[self.tier] and img.ndim == 3 for img in img_list)
+        ks = [int(img[0, 0, 0]) for img in img_list]
+        self.batches.append(ks)
+        return [(bankcard(k, self.valid(k)), 0.99) for k in ks], 0.0
+
+    def ocr(self, img, det=True, cls=False):
+        assert det and not isinstance(img, list)
+        self.full_calls += 1
+        return [[[[[0, 0], [1, 0], [1, 1], [0, 1]], ('no number', 0.9)]]]
+
+
+def crops(count):
+    return [np.full((20, 60 + k), k, dtype=np.uint8) for k in range(count)]
+
+
+@pytest.fixture
+def processor():
+    processor = OptimizedCardProcessor()
+    processor.light_ocr = FakeModel('light', lambda k: k % 2 == 0)
+    processor.server_ocr = FakeModel('server', lambda k: True)
+    return processor
+
+
+def test_every_crop_in_batch_gets_its_own_result(processor):
+    count = REC_BATCH_SIZE + 5
+    results = processor.recognize_batch(crops(count), 'bankcard', CARD_PATTERNS)
+    assert results == [(bankcard(k), True) for k in range(count)]
+    # 轻量模型每REC_BATCH_SIZE张调用一次识别器，覆盖全部裁剪图
+    assert processor.light_ocr.batches == [list(range(REC_BATCH_SIZE)), list(range(REC_BATCH_SIZE, count))]
+    # 只有轻量模型未通过校验的图片升级到服务端模型
+    odd = [k for k in range(count) if k % 2]
+    assert processor.server_ocr.batches == [odd]
+    assert processor.light_ocr.full_calls == len(odd)
+
+
+def test_unresolved_crops_keep_last_number_unvalidated(processor):
+    processor.server_ocr.valid = lambda k: False
+    results = processor.recognize_batch(crops(3), 'bankcard', CARD_PATTERNS)
+    assert results[0] == (bankcard(0), True)
+    assert results[1] == (bankcard(1, valid=False), False)
+    assert results[2] == (bankcard(2), True)
+
+
+def test_low_confidence_falls_back_to_full_pipeline(processor):
+    processor.light_ocr.text_recognizer = lambda img_list: ([(bankcard(0), 0.1)] * len(img_list), 0.0)
+    results = processor.recognize_batch(crops(2), 'bankcard', CARD_PATTERNS)
+    assert processor.light_ocr.full_calls == 2
+    assert results == [(bankcard(0), True), (bankcard(1), True)]  # 由服务端模型识别
+
+
+def test_result_count_mismatch_raises(processor):
+    processor.light_ocr.text_recognizer = lambda img_list: ([(bankcard(0), 0.99)], 0.0)
+    with pytest.raises(RuntimeError):
+        processor.recognize_batch(crops(2), 'bankcard', CARD_PATTERNS)
+
+
+def test_only_validated_results_are_cached(processor, tmp_path):
+    from image_ocr.ocr_cache import OcrCache
+    processor.server_ocr.valid = lambda k: False
+    processor.cache = OcrCache(str(tmp_path / 'ocr_cache.sqlite3'))
+    try:
+        images = crops(2)
+        keys = ['even', 'odd']
+        first = processor.recognize_keyed(keys, lambda i: images[i], 'bankcard', CARD_PATTERNS)
+        assert first == [(bankcard(0), True), (bankcard(1, valid=False), False)]
+        # 第二次只重新识别未通过校验的图片
+        processor.light_ocr.batches.clear()
+        processor.server_ocr.valid = lambda k: True
+        second = processor.recognize_keyed(keys, lambda i: images[i], 'bankcard', CARD_PATTERNS)
+        assert second == [(bankcard(0), True), (bankcard(1), True)]
+        assert processor.light_ocr.batches == [[1]]
+    finally:
+        processor.cache.close()
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from utils.checkpoint import CheckpointJournal, file_fingerprint, guarded_call, run_units, unit_key
+
+
+def test_fingerprint_tracks_size_mtime_and_content(tmp_path):
+    path = tmp_path / 'capture.pcap'
+    path.write_bytes(b'a' * 1000)
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    base = file_fingerprint(str(path))
+    assert file_fingerprint(str(path)) == base
+
+    path.write_bytes(b'b' + b'a' * 999)            # 同样大小，内容改变
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    assert file_fingerprint(str(path)) != base
+
+    path.write_bytes(b'a' * 1000)                  # 内容恢复，修改时间不同
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert file_fingerprint(str(path)) != base
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    assert file_fingerprint(str(path)) == base
+
+
+def test_unit_key_is_stable():
+    assert unit_key([('1', '2'), 'a']) == unit_key([('1', '2'), 'a'])
+    assert unit_key([('1', '2')]) != unit_key([('1', '3')])
+
+
+def square(x):
+    if x < 0:
+        raise ValueError('negative')
+    return x * x
+
+
+def serial_round(tasks, count):
+    for task in tasks:
+        yield guarded_call(task)
+
+
+def test_journal_resumes_completed_units(tmp_path):
+    units = [(f'u{i}', square, i) for i in range(5)]
+    journal = CheckpointJournal('test', 'key', root=str(tmp_path))
+    assert not journal.resumed
+    # 前两个单元完成后中断
+    for unit, func, args in units[:2]:
+        journal.record_done(unit, func(args))
+    journal.set_meta('num_shards', 4)
+    journal.close()
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"unit": "u2", "sta')                    # 中断时写了一半的记录
+
+    journal = CheckpointJournal('test', 'key', root=str(tmp_path))
+    assert journal.resumed and journal.done == {'u0', 'u1'} and journal.meta == {'num_shards': 4}
+    computed, seen = [], []
+
+    def run_round(tasks, count):
+        for task in tasks:
+            computed.append(task[0])
+            yield guarded_call(task)
+
+    results = run_units(units, run_round, journal, lambda unit, value: seen.append(unit))
+    assert results == {f'u{i}': i * i for i in range(5)}
+    assert computed == ['u2', 'u3', 'u4']
+    assert sorted(seen) == [f'u{i}' for i in range(5)]   # 恢复的单元同样回调
+    journal.finish()
+    assert not os.path.exists(journal.dir)
+
+
+def test_failed_units_are_retried_then_reported(tmp_path):
+    attempts = []
+
+    def flaky(x):
+        attempts.append(x)
+        if x == 1 and attempts.count(1) < 2:
+            raise RuntimeError('transient')
+        return x
+
+    results = run_units([('a', flaky, 0), ('b', flaky, 1)], serial_round, max_retries=2)
+    assert results == {'a': 0, 'b': 1}
+
+    journal = CheckpointJournal('test', 'fail', root=str(tmp_path))
+    with pytest.raises(RuntimeError):
+        run_units([('ok', square, 2), ('bad', square, -1)], serial_round, journal, max_retries=1)
+    assert journal.done == {'ok'} and journal.failures == {'bad': 2}
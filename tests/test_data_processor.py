@@ -0,0 +1,56 @@
+from pcap_analysis.data_processor import (
+    iter_multipart_parts, parse_multipart_data, parse_sensitive_data
+)
+
+BOUNDARY = b'----WebKitFormBoundaryX'
+IMAGE = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 4 + b'\r\n--not-the-boundary\r\n' + b'\xff\xd9'
+
+
+def multipart(parts, boundary=BOUNDARY, closing=True):
+    body = b''
+    for headers, content in parts:
+        body += b'--' + boundary + b'\r\n' + b''.join(h + b'\r\n' for h in headers) + b'\r\n' + content + b'\r\n'
+    return body + (b'--' + boundary + b'--\r\n' if closing else b'')
+
+
+BODY = multipart([
+    ([b'Content-Disposition: form-data; name="phone"'], b'13800000001'),
+    ([b'Content-Disposition: form-data; name="name"'], '张三'.encode('utf-8')),
+    ([b'Content-Disposition: form-data; name="bankcard"; filename="13800000001.jpg"',
+      b'Content-Type: image/jpeg'], IMAGE),
+    ([b'Content-Disposition: form-data; name="doc"; filename="a.txt"', b'Content-Type: text/plain'], b'ignored'),
+])
+
+
+def test_parse_multipart_fields_and_images():
+    fields, images = parse_multipart_data(BODY)
+    assert fields == {'phone': '13800000001', 'name': '张三'}
+    assert [(name, bytes(content)) for name, content in images] == [('13800000001.jpg', IMAGE)]
+
+
+def test_image_content_is_zero_copy_view_of_body():
+    body = bytearray(BODY)
+    _, images = parse_multipart_data(body)
+    content = images[0][1]
+    assert isinstance(content, memoryview)
+    offset = body.find(IMAGE)
+    body[offset] = 0   # 修改请求体后视图随之变化
+    assert content[0] == 0
+
+
+def test_truncated_body_yields_partial_last_part():
+    body = BODY[:BODY.find(IMAGE) + 100]
+    parts = list(iter_multipart_parts(body))
+    assert len(parts) == 3
+    assert bytes(parts[2][1]) == IMAGE[:100]
+
+
+def test_missing_or_empty_body():
+    assert parse_multipart_data(b'') == ({}, [])
+    assert parse_multipart_data(b'no multipart here') == ({}, [])
+
+
+def test_parse_sensitive_data():
+    assert parse_sensitive_data(b'username=admin&password=p%40ss&phone=138&phone=139') == {
+        'username': 'admin', 'password': 'p@ss', 'phone': '138'}
+    assert parse_sensitive_data(b'') == {}
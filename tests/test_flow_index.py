@@ -0,0 +1,157 @@
+import gzip
+import shutil
+import struct
+from collections import defaultdict
+
+import pytest
+
+from pcap_analysis.flow_index import build_flow_index, open_flow_index, reextract_flows, iter_indexed_requests
+from pcap_analysis.flow_processor import process_flow
+from pcap_analysis.native_parser import iter_http_requests
+from pcap_analysis.pcap_parser import in_scope
+from pcap_analysis.pcap_reader import (
+    pcap_global_header, pcap_record_header, LINKTYPE_RAW, CaptureFormatError, TCP_SYN, TCP_ACK, TCP_FIN
+)
+
+CLIENT, SERVER = bytes([10, 0, 0, 2]), bytes([10, 0, 0, 1])
+BOUNDARY = b'----sds'
+
+
+def ip_packet(src, dst, src_port, dst_port, seq, flags, payload=b''):
+    tcp = struct.pack('!HHIIBBHHH', src_port, dst_port, seq, 0, 5 << 4, flags, 65535, 0, 0)
+    total = 20 + len(tcp) + len(payload)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, total, 0, 0, 64, 6, 0, src, dst)
+    return ip + tcp + payload
+
+
+def post(uri, body):
+    return b'POST ' + uri + b' HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body) + body
+
+
+def survey(phone, name):
+    fields = [(b'phone', phone), (b'name', name.encode('utf-8'))]
+    body = b''.join(b'--' + BOUNDARY + b'\r\nContent-Disposition: form-data; name="' + key + b'"\r\n\r\n'
+                    + value + b'\r\n' for key, value in fields)
+    return post(b'/survey.php', body + b'--' + BOUNDARY + b'--\r\n')
+
+
+def build_packets():
+    """交错的多个连接：登录、分段乱序的调查表、非HTTP流量、范围外接口"""
+    login = post(b'/login.php', b'username=alice&password=pw&phone=13800000001')
+    form = survey(b'13800000002', '张三')
+    other = post(b'/other.php', b'x=1')
+    c = lambda port, seq, flags, payload=b'': ip_packet(CLIENT, SERVER, port, 80, seq, flags, payload)
+    s = lambda port, seq, flags, payload=b'': ip_packet(SERVER, CLIENT, 80, port, seq, flags, payload)
+    half = len(form) // 2
+    return [
+        c(40000, 100, TCP_SYN), c(40001, 500, TCP_SYN), c(40002, 900, TCP_SYN),
+        c(40000, 101, TCP_ACK, login),
+        c(40001, 501 + half, TCP_ACK, form[half:]),                  # 乱序
+        c(40002, 901, TCP_ACK, b'\x16\x03\x01 not http at all'),
+        s(40000, 7000, TCP_ACK, b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n'),
+        c(40001, 501, TCP_ACK, form[:half]),
+        c(40003, 300, TCP_SYN), c(40003, 301, TCP_ACK, other),
+        c(40000, 101 + len(login), TCP_FIN | TCP_ACK),
+        c(40001, 501 + len(form), TCP_FIN | TCP_ACK),
+        c(40003, 301 + len(other), TCP_FIN | TCP_ACK),
+    ]
+
+
+def write_pcap(path, packets):
+    with open(path, 'wb') as f:
+        f.write(pcap_global_header(LINKTYPE_RAW))
+        for i, packet in enumerate(packets):
+            f.write(pcap_record_header(1000.0 + i, len(packet)))
+            f.write(packet)
+
+
+def write_pcapng(path, packets):
+    def block(block_type, body):
+        body += b'\0' * (-len(body) % 4)
+        length = len(body) + 12
+        return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+    with open(path, 'wb') as f:
+        f.write(block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        f.write(block(0x00000001, struct.pack('<HHI', LINKTYPE_RAW, 0, 0)))
+        for i, packet in enumerate(packets):
+            ts = (1000 + i) * 1000000
+            f.write(block(0x00000006, struct.pack('<IIIII', 0, ts >> 32, ts & 0xFFFFFFFF,
+                                                  len(packet), len(packet)) + packet))
+
+
+@pytest.fixture(params=['pcap', 'pcapng'])
+def capture(request, tmp_path):
+    path = str(tmp_path / f'capture.{request.param}')
+    (write_pcap if request.param == 'pcap' else write_pcapng)(path, build_packets())
+    return path
+
+
+def full_run(pcap_file, image_dir):
+    """全量处理的结果（同native后端：in_scope过滤后按流标识分组）"""
+    flows = defaultdict(list)
+    for flow_key, request in iter_http_requests(pcap_file):
+        if in_scope(request):
+            flows[flow_key].append(request)
+    return sorted(process_flow((key, requests, image_dir)) for key, requests in flows.items())
+
+
+def test_index_records_flows_with_requests(capture):
+    assert build_flow_index(capture) == capture + '.flows'
+    index = open_flow_index(capture)
+    entries = index.select()
+    assert [e['stream_id'] for e in entries] == [0, 1, 3]   # 非HTTP连接不写入
+    login, form, other = entries
+    assert (login['src_ip'], login['src_port'], login['dst_ip'], login['dst_port']) == ('10.0.0.2', 40000, '10.0.0.1', 80)
+    assert login['client_port'] == 40000 and login['packets'] == 4
+    assert login['uris'] == ['/login.php'] and login['phones'] == ['13800000001']
+    assert form['phones'] == ['13800000002'] and form['first_ts'] < form['last_ts']
+    assert other['uris'] == ['/other.php'] and other['phones'] == []
+    assert len(index.offsets(1)) == form['packets'] == 4
+    index.close()
+
+
+def test_select_by_phone_stream_and_uri(capture):
+    build_flow_index(capture)
+    index = open_flow_index(capture)
+    ids = lambda entries: [e['stream_id'] for e in entries]
+    assert ids(index.select(phones=['13800000002'])) == [1]
+    assert ids(index.select(streams=[0, 3])) == [0, 3]
+    assert ids(index.select(phones=['13800000002'], streams=[0])) == [0, 1]
+    assert ids(index.select(uri_prefix='/survey')) == [1]
+    assert ids(index.select(streams=[0, 3], uri_prefix='/other')) == [3]
+    assert index.select(phones=['nobody']) == []
+    index.close()
+
+
+def test_reextract_matches_full_run(capture, tmp_path):
+    build_flow_index(capture)
+    index = open_flow_index(capture)
+    image_dir = str(tmp_path / 'img')
+    assert sorted(reextract_flows(capture, index, index.select(), image_dir)) == full_run(capture, image_dir)
+
+    selected = reextract_flows(capture, index, index.select(phones=['13800000002']), image_dir)
+    assert selected == [(('40001', '1'), {'username': None, 'password': None,
+                                          'phone': '13800000002', 'name': '张三'})]
+    # 范围外接口的流只产出范围内的请求（没有请求）
+    assert list(iter_indexed_requests(capture, index, index.select(streams=[3]))) == []
+    index.close()
+
+
+def test_stale_or_missing_index_is_ignored(tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    write_pcap(path, build_packets())
+    assert open_flow_index(path) is None
+    build_flow_index(path)
+    with open(path, 'ab') as f:                   # 抓包文件变化
+        f.write(pcap_record_header(2000.0, 0))
+    assert open_flow_index(path) is None
+
+
+def test_compressed_capture_is_refused(tmp_path):
+    path = str(tmp_path / 'capture.pcap')
+    write_pcap(path, build_packets())
+    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    with pytest.raises(CaptureFormatError):
+        build_flow_index(path + '.gz')
+    assert open_flow_index(path + '.gz') is None
@@ -0,0 +1,44 @@
+from utils.image_manifest import (
+    ManifestWriter, read_manifest, reset_manifest, has_manifest, manifest_writer, content_hash
+)
+
+
+def write(writer, flow_key, phone, card_type, data):
+    writer.append(writer.next_image_id(), flow_key, phone, card_type, 'images.pack', 0, len(data),
+                  content_hash(data))
+
+
+def test_read_manifest_across_segments(tmp_path):
+    first, second = ManifestWriter(str(tmp_path)), ManifestWriter(str(tmp_path))
+    write(first, ('5000', '1'), '138', 'bankcard', b'a')
+    write(second, ('5001', '2'), '139', 'idcard', b'b')
+    write(first, ('5000', '1'), '138', 'idcard', b'c')
+    for writer in (first, second):
+        writer.close()
+    entries = read_manifest(str(tmp_path))
+    assert sorted((e.stream_id, e.card_type) for e in entries) == [('1', 'bankcard'), ('1', 'idcard'), ('2', 'idcard')]
+    assert read_manifest(str(tmp_path), 1, 2) == entries[1:2]
+
+
+def test_duplicate_images_from_retried_units_are_read_once(tmp_path):
+    original, retry = ManifestWriter(str(tmp_path)), ManifestWriter(str(tmp_path))
+    write(original, ('5000', '1'), '138', 'bankcard', b'card')
+    write(retry, ('5000', '1'), '138', 'bankcard', b'card')       # 重试单元再次输出
+    write(retry, ('5000', '1'), '138', 'bankcard', b'other')      # 同一流的另一张图片
+    write(retry, ('5001', '2'), '138', 'bankcard', b'card')       # 其他流的相同图片
+    for writer in (original, retry):
+        writer.close()
+    entries = read_manifest(str(tmp_path))
+    assert len(entries) == 3
+    assert len({e.image_id for e in entries}) == 3
+
+
+def test_partial_line_is_ignored_and_reset_removes_manifest(tmp_path):
+    writer = manifest_writer(str(tmp_path))
+    write(writer, ('5000', '1'), '138', 'bankcard', b'a')
+    with open(writer.path, 'a', encoding='utf-8') as f:
+        f.write('half-written\t5000')
+    assert len(read_manifest(str(tmp_path))) == 1
+    reset_manifest(str(tmp_path))
+    assert not has_manifest(str(tmp_path))
+    assert read_manifest(str(tmp_path)) == []
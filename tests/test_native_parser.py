@@ -0,0 +1,77 @@
+from pcap_analysis.native_parser import TcpReassembler, HttpRequestParser, CLOSED_LINGER
+from pcap_analysis.pcap_reader import TCP_SYN, TCP_ACK, TCP_FIN, TCP_RST
+
+CLIENT, SERVER = bytes([10, 0, 0, 2]), bytes([10, 0, 0, 1])
+
+
+def segment(port, seq, flags, payload=b'', from_client=True):
+    if from_client:
+        return CLIENT, SERVER, port, 80, seq, flags, memoryview(payload)
+    return SERVER, CLIENT, 80, port, seq, flags, memoryview(payload)
+
+
+def connection(reassembler, port, timestamp, request, close=TCP_FIN):
+    """一个完整的连接：SYN、请求、关闭；返回产出的请求"""
+    requests = reassembler.feed(segment(port, 100, TCP_SYN), timestamp)
+    requests += reassembler.feed(segment(port, 101, TCP_ACK, request), timestamp)
+    requests += reassembler.feed(segment(port, 101 + len(request), close | TCP_ACK), timestamp)
+    return requests
+
+
+def post(uri, body):
+    return b'POST ' + uri + b' HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(body) + body
+
+
+def test_http_parser_content_length_and_chunked():
+    parser = HttpRequestParser()
+    data = post(b'/a', b'xyz') + b'POST /b HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n0\r\n\r\n'
+    requests = []
+    for i in range(len(data)):  # 逐字节送入
+        requests += parser.feed(data[i:i + 1])
+    assert requests == [('/a', b'xyz'), ('/b', b'abc')]
+
+
+def test_out_of_order_and_retransmitted_segments():
+    reassembler = TcpReassembler()
+    request = post(b'/survey.php', b'0123456789')
+    reassembler.feed(segment(5000, 100, TCP_SYN))
+    head, tail = request[:20], request[20:]
+    assert reassembler.feed(segment(5000, 121, TCP_ACK, tail)) == []
+    assert reassembler.pending_bytes(reassembler.connection_key(segment(5000, 0, 0))[0]) == len(tail)
+    out = reassembler.feed(segment(5000, 101, TCP_ACK, head))
+    assert out == [(('5000', '0'), {'uri': '/survey.php', 'body': b'0123456789'})]
+    assert reassembler.feed(segment(5000, 101, TCP_ACK, head)) == []  # 重传
+
+
+def test_closed_connections_are_released_after_linger():
+    reassembler = TcpReassembler()
+    flow_keys = []
+    for i in range(50):
+        timestamp = i * CLOSED_LINGER / 4
+        close = TCP_RST if i % 2 else TCP_FIN
+        flow_keys += [key for key, _ in connection(reassembler, 40000 + i, timestamp, post(b'/x', b'1'), close)]
+        assert len(reassembler.connections) <= 10  # linger + 一个检查周期内的连接
+    # 流ID按连接顺序连续编号，不受释放影响
+    assert flow_keys == [(str(40000 + i), str(i)) for i in range(50)]
+
+
+def test_late_packet_within_linger_keeps_stream_id():
+    reassembler = TcpReassembler()
+    connection(reassembler, 40000, 0.0, post(b'/x', b'1'))
+    key = reassembler.connection_key(segment(40000, 0, 0))[0]
+    reassembler.feed(segment(40000, 1, TCP_ACK, from_client=False), CLOSED_LINGER / 2)
+    assert reassembler.stream_id(key) == 0
+    assert reassembler.next_stream_id == 1
+    # 端口重用的新连接
+    connection(reassembler, 40000, CLOSED_LINGER * 3, post(b'/x', b'1'))
+    assert reassembler.stream_id(key) == 1
+
+
+def test_open_connections_are_kept_and_linger_none_disables_release():
+    for linger, expected in ((CLOSED_LINGER, 1), (None, 2)):
+        reassembler = TcpReassembler(linger=linger)
+        reassembler.feed(segment(40000, 100, TCP_SYN), 0.0)               # 未关闭
+        connection(reassembler, 40001, 0.0, post(b'/x', b'1'))           # 已关闭
+        reassembler.feed(segment(40002, 100, TCP_SYN), CLOSED_LINGER * 2)
+        reassembler.feed(segment(40002, 100, TCP_SYN), CLOSED_LINGER * 4)
+        assert len(reassembler.connections) == expected + 1
@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+from image_ocr.ocr_cache import OcrCache, SCHEMA_VERSION
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = OcrCache(str(tmp_path / 'ocr_cache.sqlite3'), max_entries=10)
+    yield cache
+    cache.close()
+
+
+def test_results_are_scoped_by_model_version(cache):
+    cache.put_many('bankcard', 'v1', [('k1', None, '4111111111111111', 0.97)])
+    assert cache.get_many('bankcard', 'v1', ['k1', 'k2']) == {'k1': ('4111111111111111', 0.97)}
+    assert cache.get_many('bankcard', 'v2', ['k1']) == {}
+    assert cache.get_many('idcard', 'v1', ['k1']) == {}
+
+
+def test_eviction_counts_only_when_estimate_exceeds_limit(cache):
+    for batch in range(4):
+        cache.put_many('bankcard', 'v1', [(f'k{batch}-{i}', None, str(i), 0.9) for i in range(3)])
+    conn = cache._connection()
+    assert conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0] == 9  # 12条超出上限10，保留90%
+    assert cache._count == 9
+    # 最早写入的条目被淘汰
+    assert cache.get_many('bankcard', 'v1', ['k0-0', 'k3-2']) == {'k3-2': ('2', 0.9)}
+
+
+def test_old_schema_is_dropped(tmp_path):
+    path = str(tmp_path / 'ocr_cache.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE ocr_results (card_type TEXT, key TEXT, dhash INTEGER, number TEXT, "
+                 "validated INTEGER, last_used REAL, PRIMARY KEY (card_type, key))")
+    conn.execute("INSERT INTO ocr_results VALUES ('bankcard', 'k1', NULL, '', 0, 0)")
+    conn.commit()
+    conn.close()
+
+    cache = OcrCache(path)
+    try:
+        assert cache.get_many('bankcard', 'v1', ['k1']) == {}
+        assert cache._connection().execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    finally:
+        cache.close()
@@ -0,0 +1,63 @@
+import csv
+
+import pytest
+
+from utils.result_store import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'result_store.sqlite3'))
+    yield store
+    store.close()
+
+
+def flow(phone, username=None, password=None, name=None):
+    return {'phone': phone, 'username': username, 'password': password, 'name': name}
+
+
+def card(phone, **fields):
+    return dict(phone=phone, **fields)
+
+
+def test_flow_upsert_keeps_existing_values_for_empty_fields(store):
+    assert store.upsert_flows([flow('138', 'alice', 'pw1'), flow(None, 'nobody')]) == 1
+    store.upsert_flows([flow('138', name='张三'), flow('138', password='pw2')])
+    store.upsert_cards([card('138', idcard='X')])
+    assert [row[:4] for row in store.joined_rows()] == [['alice', 'pw2', '张三', '138']]
+
+
+def test_card_merge_keeps_first_and_prefers_validated(store):
+    store.upsert_flows([flow('138'), flow('139')])
+    store.upsert_cards([card('138', idcard='A', idcard_validated=False, bankcard='B1', bankcard_validated=True)])
+    store.upsert_cards([card('138', idcard='', bankcard='B2', bankcard_validated=True)])    # 已有有效号码
+    store.upsert_cards([card('138', idcard='C', idcard_validated=False)])                     # 同为未校验
+    assert list(store.joined_rows())[0][4:] == ['A', 'B1', False, True]
+    store.upsert_cards([card('138', idcard='D', idcard_validated=True)])                      # 通过校验的替换
+    store.upsert_cards([card('138', idcard='E', idcard_validated=True)])                      # 首个有效号码保留
+    assert list(store.joined_rows())[0][4:] == ['D', 'B1', True, True]
+
+
+def test_join_outputs_only_phones_on_both_sides_in_order(store):
+    store.upsert_flows([flow('139', 'b'), flow('137', 'a'), flow('140', 'c')])
+    store.upsert_cards([card('140', bankcard='1'), card('139', bankcard='2'), card('141', bankcard='3')])
+    assert [row[3] for row in store.joined_rows()] == ['139', '140']
+
+
+def test_reset_clears_both_stages(store):
+    store.upsert_flows([flow('138', 'alice')])
+    store.upsert_cards([card('138', idcard='A')])
+    store.reset()
+    store.upsert_flows([flow('138', 'bob')])
+    store.upsert_cards([card('139', idcard='B')])
+    assert list(store.joined_rows()) == []
+
+
+def test_export_csv(store, tmp_path):
+    store.upsert_flows([flow('138', 'alice', 'pw', '张三')])
+    store.upsert_cards([card('138', idcard='A', idcard_validated=True, bankcard='B')])
+    path = tmp_path / 'result.csv'
+    assert store.export(str(path)) == 1
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[1][:6] == ['alice', 'pw', '张三', '138', 'A', 'B']
@@ -0,0 +1,60 @@
+import pytest
+
+from image_ocr.validators import luhn_valid, id_number_valid, is_valid_number, iter_candidates
+
+VALID_BANKCARD = '4111111111111111'
+VALID_ID = '11010519491231002X'
+
+
+@pytest.mark.parametrize('number, expected', [
+    (VALID_BANKCARD, True),
+    ('4111111111111112', False),
+    ('79927398713', True),
+    ('4111-1111', False),
+    ('', False),
+])
+def test_luhn(number, expected):
+    assert luhn_valid(number) is expected
+
+
+@pytest.mark.parametrize('number, expected', [
+    (VALID_ID, True),
+    (VALID_ID.lower(), True),
+    ('110105194912310021', False),   # 校验位错误
+    ('11010519491231002', False),    # 长度错误
+    ('110105491231002', True),       # 15位旧号码：出生日期491231合法
+    ('110105491332002', False),      # 15位旧号码：13月
+    ('1101054912310X2', False),
+])
+def test_id_number(number, expected):
+    assert id_number_valid(number) is expected
+
+
+def test_is_valid_number_checks_length_and_type():
+    assert is_valid_number(VALID_BANKCARD, 'bankcard')
+    assert not is_valid_number('79927398713', 'bankcard')  # Luhn通过但长度不是卡号长度
+    assert is_valid_number(VALID_ID, 'idcard')
+    assert not is_valid_number(VALID_BANKCARD, 'idcard')
+    assert not is_valid_number('', 'bankcard')
+    assert not is_valid_number(None, 'idcard')
+
+
+def test_candidates_join_printed_groups():
+    candidates = list(iter_candidates('卡号 4111 1111 1111 1111 有效期 12/30', 'bankcard'))
+    assert VALID_BANKCARD in candidates
+
+
+def test_candidates_fix_confusable_characters():
+    assert VALID_BANKCARD in iter_candidates('4lll 1111 IIII 1111', 'bankcard')
+    assert VALID_ID in iter_candidates('公民身份号码 11O1O5194912310O2x', 'idcard')
+
+
+def test_candidates_do_not_slide_inside_long_runs():
+    # 长数字串中恰好含有合法卡号，但不截取
+    assert VALID_BANKCARD not in iter_candidates('99' + VALID_BANKCARD + '99', 'bankcard')
+
+
+def test_idcard_x_only_at_end_of_joined_candidate():
+    candidates = list(iter_candidates('110105 19491231002X 123', 'idcard'))
+    assert VALID_ID in candidates
+    assert all('X' not in c[:-1] for c in candidates)
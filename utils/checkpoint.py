@@ -0,0 +1,222 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+#============= 系统自定义模块 =============
+from config.PATH import Checkpoint_path
+#=========================================
+
+# 失败单元在一次运行中的最大重试轮数
+DEFAULT_MAX_RETRIES = 2
+# 输入文件指纹的采样大小（文件头尾各取一段，避免对几十GB的抓包做全量哈希）
+FINGERPRINT_SAMPLE = 4 * 1024 * 1024
+
+JOURNAL_FILE = 'journal.jsonl'
+UNITS_DIR = 'units'
+
+
+def file_fingerprint(path):
+    """
+    功能: 计算输入文件指纹（文件大小 + 修改时间 + 头尾采样内容的哈希）
+    说明:
+        抓包文件只追加写入，大小、修改时间与头尾内容都未变化即视为同一输入；
+        不做全量哈希，保持大小与修改时间不变、只改动中间内容的文件无法识别
+        （复制文件等改变修改时间的操作会使检查点、请求存储与流索引失效，重新计算）
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    digest = hashlib.blake2b(f"{size}:{stat.st_mtime_ns}".encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE))
+        if size > FINGERPRINT_SAMPLE:
+            f.seek(max(FINGERPRINT_SAMPLE, size - FINGERPRINT_SAMPLE))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def unit_key(items):
+    """由单元内容（如流标识、图片ID）计算稳定的单元标识"""
+    digest = hashlib.blake2b(digest_size=12)
+    for item in items:
+        digest.update(repr(item).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def guarded_call(task):
+    """
+    功能: 进程池任务包装，捕获单元异常而不中断整个进程池
+    输入: task: (单元标识, 处理函数, 处理函数参数)
+    输出: (单元标识, 是否成功, 结果或错误信息)
+    """
+    unit, func, args = task
+    try:
+        return unit, True, func(args)
+    except Exception as e:
+        return unit, False, f"{type(e).__name__}: {e}"
+
+
+class CheckpointJournal:
+    """
+    检查点日志（按处理阶段与输入指纹区分）
+
+    每个完成的单元先把结果写入units/下的独立文件（写临时文件后原子替换），
+    再向journal.jsonl追加一条完成记录并fsync；中途退出或断电后重新运行时
+    重放日志，已完成单元直接读取保存的结果，只计算未完成和失败的单元。
+    全部完成并输出最终结果后调用finish删除检查点
+    """
+
+    def __init__(self, stage, key, root=Checkpoint_path):
+        """
+        参数:
+            stage: 处理阶段名（如'pcap'、'ocr'）
+            key: 输入指纹（见file_fingerprint）
+            root: 检查点根目录
+        """
+        self.dir = os.path.join(root, f"{stage}-{key}")
+        self.units_dir = os.path.join(self.dir, UNITS_DIR)
+        self.journal_path = os.path.join(self.dir, JOURNAL_FILE)
+        self.done = set()
+        self.failures = {}
+        self.meta = {}
+        self._replay()
+        os.makedirs(self.units_dir, exist_ok=True)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    @property
+    def resumed(self):
+        """是否存在上次运行留下的进度"""
+        return bool(self.done or self.meta)
+
+    def _replay(self):
+        """重放日志（最后一行可能因中断而不完整，直接忽略）"""
+        try:
+            f = open(self.journal_path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'meta' in record:
+                    self.meta[record['meta']] = record['value']
+                elif record.get('status') == 'done':
+                    if os.path.exists(self._unit_path(record['unit'])):
+                        self.done.add(record['unit'])
+                elif record.get('status') == 'failed':
+                    self.failures[record['unit']] = self.failures.get(record['unit'], 0) + 1
+
+    def _unit_path(self, unit):
+        return os.path.join(self.units_dir, f"{unit}.pkl")
+
+    def _append(self, record):
+        self._journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def work_dir(self, name):
+        """检查点目录下的工作目录（如分片目录），随检查点一起保留与删除"""
+        path = os.path.join(self.dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def set_meta(self, name, value):
+        """记录阶段元数据（如分片列表），value需可JSON序列化"""
+        self.meta[name] = value
+        self._append({'meta': name, 'value': value})
+
+    def load(self, unit):
+        """读取已完成单元保存的结果"""
+        with open(self._unit_path(unit), 'rb') as f:
+            return pickle.load(f)
+
+    def record_done(self, unit, result):
+        """保存单元结果并记录完成"""
+        path = self._unit_path(unit)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self._append({'unit': unit, 'status': 'done'})
+        self.done.add(unit)
+
+    def record_failure(self, unit, error):
+        """记录单元失败"""
+        self._append({'unit': unit, 'status': 'failed', 'error': error})
+        self.failures[unit] = self.failures.get(unit, 0) + 1
+
+    def close(self):
+        self._journal.close()
+
+    def finish(self):
+        """全部完成后删除检查点（包括工作目录）"""
+        self.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def run_units(units, run_round, journal=None, on_result=None, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    功能: 按检查点执行一组处理单元
+    输入:
+        units: 可迭代的 (单元标识, 处理函数, 参数)，只遍历一次
+        run_round: 函数 (任务迭代器, 任务数) -> 可迭代的guarded_call结果，由调用方创建进程池
+        journal: CheckpointJournal（None表示不保存进度）
+        on_result: 回调 (单元标识, 结果)，恢复的单元与新计算的单元都会调用
+        max_retries: 失败单元的重试轮数
+    输出: dict {单元标识: 结果}
+    说明:
+        已完成的单元从检查点恢复，不提交给进程池；
+        一轮结束后失败的单元（包括进程池异常时未返回的单元）进入下一轮重试，
+        超过重试轮数仍失败时抛出RuntimeError，已完成的单元保留在检查点中，重新运行即可继续
+    """
+    results = {}
+    pending = {}
+    restored = 0
+    for unit in units:
+        if journal is not None and unit[0] in journal.done:
+            results[unit[0]] = journal.load(unit[0])
+            restored += 1
+            if on_result is not None:
+                on_result(unit[0], results[unit[0]])
+        else:
+            pending[unit[0]] = unit
+
+    recomputed = 0
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"重试 {len(pending)} 个失败单元（第 {attempt}/{max_retries} 轮）")
+        failed = {}
+        try:
+            # 任务按需取出，成功的单元立即释放其参数（如请求体）
+            tasks = (pending[unit] for unit in list(pending) if unit in pending)
+            for unit, ok, value in run_round(tasks, len(pending)):
+                if ok:
+                    pending.pop(unit)
+                    if journal is not None:
+                        journal.record_done(unit, value)
+                    results[unit] = value
+                    recomputed += 1
+                    if on_result is not None:
+                        on_result(unit, value)
+                else:
+                    print(f"[单元失败] {unit} | {value}")
+                    if journal is not None:
+                        journal.record_failure(unit, value)
+                    failed[unit] = pending.pop(unit)
+        except Exception as e:  # 进程池异常（如工作进程崩溃），本轮未返回的单元全部重试
+            print(f"[进程池异常] {type(e).__name__}: {e}")
+        failed.update(pending)
+        pending = failed
+
+    if journal is not None:
+        print(f"检查点：恢复 {restored} 个单元，重新计算 {recomputed} 个单元")
+    if pending:
+        raise RuntimeError(f"{len(pending)} 个单元重试 {max_retries} 轮后仍失败，"
+                           f"已完成的单元已保存，重新运行即可继续")
+    return results
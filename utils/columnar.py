@@ -0,0 +1,184 @@
+import os
+import csv
+import pandas as pd
+
+try:
+    import pyarrow as pa  # 可选依赖：Parquet/Arrow列式输出
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = pq = ds = None
+
+# 输出格式（按文件扩展名推断）
+FORMAT_SUFFIXES = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+# 每个记录批次的行数
+DEFAULT_BATCH_ROWS = 4096
+
+# 各阶段输出的字段与类型
+FLOW_COLUMNS = {'username': 'string', 'password': 'string', 'name': 'string', 'phone': 'string'}
+CARD_COLUMNS = {'phone': 'string', 'idcard': 'string', 'bankcard': 'string',
+                'idcard_validated': 'bool', 'bankcard_validated': 'bool'}
+RESULT_COLUMNS = {**FLOW_COLUMNS, **CARD_COLUMNS}  # 最终结果（Step_3及一体化流程的输出列）
+
+
+def resolve_format(path, output_format=None):
+    """
+    功能: 确定文件格式
+    输入:
+        path: 文件路径
+        output_format: 'csv'/'parquet'/'arrow'，None表示按扩展名推断（未知扩展名按CSV）
+    输出: 格式名
+    """
+    fmt = output_format or FORMAT_SUFFIXES.get(os.path.splitext(path)[1].lower(), 'csv')
+    if fmt not in ('csv', 'parquet', 'arrow'):
+        raise ValueError(f"不支持的输出格式: {fmt}")
+    if fmt != 'csv' and pa is None:
+        raise ImportError(f"输出 {fmt} 格式需要安装pyarrow")
+    return fmt
+
+
+def _normalize(value, kind):
+    if kind == 'bool':
+        return bool(value) and value != 'False'
+    return '' if value is None else str(value)
+
+
+class TableWriter:
+    """
+    按记录批次写出的表格写入器
+
+    行先在内存中累积，每DEFAULT_BATCH_ROWS行编码为一个记录批次写出：
+    CSV批量写入，Parquet写为一个行组，Arrow写为IPC文件中的一个记录批次；
+    列式格式按声明的类型写出（字符串/布尔），读取时无需再按字符串解析
+    """
+
+    def __init__(self, path, columns, output_format=None, batch_rows=DEFAULT_BATCH_ROWS):
+        """
+        参数:
+            path: 输出文件路径
+            columns: 字段与类型字典（如FLOW_COLUMNS）
+            output_format: 输出格式，None表示按扩展名推断
+            batch_rows: 每个记录批次的行数
+        """
+        self.path = path
+        self.columns = columns
+        self.format = resolve_format(path, output_format)
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self._buffer = []
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        if self.format == 'csv':
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(list(columns))
+        else:
+            self._schema = pa.schema([(name, pa.bool_() if kind == 'bool' else pa.string())
+                                      for name, kind in columns.items()])
+            if self.format == 'parquet':
+                self._writer = pq.ParquetWriter(path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(path, self._schema)
+
+    def write(self, row):
+        """写入一行（字典按字段名取值，缺失为空；序列按字段顺序）"""
+        if isinstance(row, dict):
+            row = [row.get(name) for name in self.columns]
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_rows:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """把缓存的行写为一个记录批次"""
+        if not self._buffer:
+            return
+        if self.format == 'csv':
+            self._csv.writerows(self._buffer)
+            self._file.flush()  # 流式处理时边写边读
+        else:
+            arrays = [[_normalize(row[i], kind) for row in self._buffer]
+                      for i, kind in enumerate(self.columns.values())]
+            self._writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(arrays, self._schema)],
+                schema=self._schema))
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self.format == 'csv':
+            self._file.close()
+        else:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _csv_filter(df, filters):
+    """在DataFrame上应用(字段, 运算符, 值)条件（CSV没有谓词下推，读取后过滤）"""
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        col = df[column]
+        if op in ('=', '=='):
+            mask &= col == value
+        elif op == '!=':
+            mask &= col != value
+        elif op == 'in':
+            mask &= col.isin(value)
+        elif op == 'not in':
+            mask &= ~col.isin(value)
+        elif op == '<':
+            mask &= col < value
+        elif op == '<=':
+            mask &= col <= value
+        elif op == '>':
+            mask &= col > value
+        elif op == '>=':
+            mask &= col >= value
+        else:
+            raise ValueError(f"不支持的过滤运算符: {op}")
+    return df[mask]
+
+
+def read_table(path, columns=None, filters=None, input_format=None):
+    """
+    功能: 读取各阶段输出的表格
+    输入:
+        path: 文件路径
+        columns: 只读取的字段列表（None表示全部）
+        filters: 过滤条件，[(字段, 运算符, 值), ...] 之间为"与"关系，
+            运算符支持 = != < <= > >= in "not in"（同pyarrow的filters写法）
+        input_format: 文件格式，None表示按扩展名推断
+    输出: pandas.DataFrame
+    说明:
+        Parquet/Arrow只读取所需的列，过滤条件下推到扫描（Parquet可按行组统计跳过整组数据）；
+        CSV只解析所需的列，读取后再过滤
+    示例: read_table(path, columns=['phone', 'idcard'], filters=[('idcard_validated', '=', True)])
+    """
+    fmt = resolve_format(path, input_format)
+    if fmt == 'parquet':
+        return pq.read_table(path, columns=columns, filters=filters or None).to_pandas()
+    if fmt == 'arrow':
+        expression = pq.filters_to_expression(filters) if filters else None
+        return ds.dataset(path, format='ipc').to_table(columns=columns, filter=expression).to_pandas()
+
+    header = pd.read_csv(path, nrows=0).columns
+    needed = [c for c in header if columns is None or c in columns
+              or any(c == f[0] for f in filters or ())]
+    df = pd.read_csv(path, usecols=needed, dtype=str, keep_default_na=False)
+    for column in df.columns:
+        if RESULT_COLUMNS.get(column) == 'bool':
+            df[column] = df[column] == 'True'
+    if filters:
+        df = _csv_filter(df, filters)
+    return df[columns] if columns is not None else df
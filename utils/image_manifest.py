@@ -0,0 +1,145 @@
+import os
+import uuid
+import shutil
+import hashlib
+from collections import namedtuple
+
+# 清单目录（位于图片输出目录下）
+MANIFEST_DIR = 'manifest'
+MANIFEST_SUFFIX = '.tsv'
+
+# 清单字段：图片ID、流标识、手机号标识、证件类型、数据文件（相对图片目录）、偏移、长度、内容哈希
+MANIFEST_FIELDS = ('image_id', 'src_port', 'stream_id', 'phone', 'card_type',
+                   'file', 'offset', 'length', 'digest')
+ImageEntry = namedtuple('ImageEntry', MANIFEST_FIELDS)
+
+# 每个进程每个输出目录一个清单写入器
+_writers = {}
+
+
+def content_hash(data):
+    """图片字节的内容哈希（与OCR结果缓存的键一致）"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _clean_field(value):
+    """去除字段中的分隔符"""
+    return str(value).replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+
+
+class ManifestWriter:
+    """
+    图片清单写入器（每个写入进程独立的清单分段文件）
+
+    多个解析进程同时输出图片时各自追加自己的分段，无需跨进程加锁；
+    每条记录写入后立即flush，读取方可以在解析阶段尚未结束时读取已完成的记录
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.segment = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        manifest_dir = os.path.join(output_dir, MANIFEST_DIR)
+        os.makedirs(manifest_dir, exist_ok=True)
+        self.path = os.path.join(manifest_dir, self.segment + MANIFEST_SUFFIX)
+        self._file = open(self.path, 'a', encoding='utf-8', newline='')
+        self._seq = 0
+
+    def next_image_id(self):
+        """分配一个全局唯一的图片ID（分段名 + 序号）"""
+        self._seq += 1
+        return f"{self.segment}-{self._seq}"
+
+    def append(self, image_id, flow_key, phone, card_type, file, offset, length, digest):
+        """追加一条图片记录"""
+        src_port, stream_id = flow_key
+        fields = (image_id, src_port, stream_id, phone, card_type, file, offset, length, digest)
+        self._file.write('\t'.join(_clean_field(f) for f in fields) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def manifest_writer(output_dir):
+    """获取当前进程在指定目录下的清单写入器（按需创建）"""
+    key = (os.getpid(), os.path.abspath(output_dir))
+    writer = _writers.get(key)
+    if writer is None:
+        writer = _writers[key] = ManifestWriter(output_dir)
+    return writer
+
+
+def reset_manifest(output_dir):
+    """清空指定目录下的清单（开始新一次解析前调用，避免重复识别上次的图片）"""
+    for key in [k for k in _writers if k[1] == os.path.abspath(output_dir)]:
+        _writers.pop(key).close()
+    shutil.rmtree(os.path.join(output_dir, MANIFEST_DIR), ignore_errors=True)
+
+
+def has_manifest(output_dir):
+    """目录下是否存在清单"""
+    return os.path.isdir(os.path.join(output_dir, MANIFEST_DIR))
+
+
+def read_manifest(output_dir, start=0, stop=None):
+    """
+    功能: 读取图片清单
+    输入:
+        output_dir: 图片输出目录
+        start/stop: 记录范围（按分段文件名排序后的全局序号），用于按范围切分工作
+    输出: list[ImageEntry]
+    说明:
+        只读取以换行结尾的完整记录，解析阶段仍在写入时也可以安全读取；
+        分段按文件名排序，清单写完后同一范围总是对应相同的记录；
+        流标识、归属标识、证件类型与内容哈希都相同的记录只保留第一条
+        （重试或从检查点恢复的处理单元会再次输出同一网络流的图片）
+    """
+    manifest_dir = os.path.join(output_dir, MANIFEST_DIR)
+    try:
+        segments = sorted(f for f in os.listdir(manifest_dir) if f.endswith(MANIFEST_SUFFIX))
+    except FileNotFoundError:
+        return []
+
+    entries = []
+    seen = set()
+    for segment in segments:
+        with open(os.path.join(manifest_dir, segment), encoding='utf-8', newline='') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # 正在写入的记录
+                fields = line[:-1].split('\t')
+                if len(fields) != len(MANIFEST_FIELDS):
+                    continue
+                entry = ImageEntry(*fields)
+                key = (entry.src_port, entry.stream_id, entry.phone, entry.card_type, entry.digest)
+                if key in seen:
+                    continue
+                seen.add(key)
+                entries.append(entry._replace(offset=int(entry.offset), length=int(entry.length)))
+                if stop is not None and len(entries) >= stop:
+                    return entries[start:]
+    return entries[start:stop]
+
+
+def entries_from_directory(folder_path):
+    """
+    功能: 按旧版文件名规则（<手机号>_<证件类型>.jpeg）从目录生成图片记录
+    说明: 用于读取没有清单的旧图片目录，流标识未知，内容哈希留空（读取时计算）
+    """
+    entries = []
+    for filename in os.listdir(folder_path):
+        if not filename.lower().endswith('.jpeg'):
+            continue
+        card_type = 'idcard' if 'idcard' in filename else 'bankcard' if 'bankcard' in filename else None
+        if card_type is None:
+            continue
+        entries.append(ImageEntry(filename, '', '', filename.split('_')[0], card_type,
+                                  filename, 0, -1, ''))
+    return entries
+
+
+def load_image_entries(folder_path):
+    """读取图片目录的全部记录：优先使用清单，没有清单时扫描目录"""
+    if has_manifest(folder_path):
+        return read_manifest(folder_path)
+    return entries_from_directory(folder_path)
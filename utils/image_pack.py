@@ -0,0 +1,187 @@
+import os
+import mmap
+import struct
+import numpy as np
+
+# 图片包文件（数据段）与定长索引文件
+PACK_FILE = 'images.pack'
+INDEX_FILE = 'images.idx'
+LOCK_FILE = 'images.lock'
+
+# 索引记录: 数据偏移(8) + 长度(4) + 内容哈希(16) + 保留(4)，共32字节
+INDEX_RECORD = struct.Struct('<QI16s4x')
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:  # LK_LOCK重试10次后仍未获得锁，继续等待
+                continue
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ImagePackWriter:
+    """
+    图片包追加写入器
+
+    所有图片顺序追加到同一个数据文件，索引文件为定长记录；
+    多个写入进程通过文件锁串行化"取偏移 + 写数据 + 写索引"，
+    数据先于索引落盘，读取方看到的索引记录总是对应完整的数据
+    """
+
+    def __init__(self, pack_dir):
+        os.makedirs(pack_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(pack_dir, LOCK_FILE), 'a+b')
+        self._data = open(os.path.join(pack_dir, PACK_FILE), 'ab', buffering=0)
+        self._index = open(os.path.join(pack_dir, INDEX_FILE), 'ab', buffering=0)
+
+    @staticmethod
+    def _write_all(f, data):
+        view = memoryview(data)
+        while view:
+            view = view[f.write(view):]
+
+    def append(self, data, digest):
+        """
+        功能: 追加一张图片
+        输入:
+            data: 图片字节
+            digest: 内容哈希（32位十六进制字符串）
+        输出: (记录序号, 数据偏移)
+        """
+        _lock(self._lock_file)
+        try:
+            offset = os.fstat(self._data.fileno()).st_size
+            self._write_all(self._data, data)
+            number = os.fstat(self._index.fileno()).st_size // INDEX_RECORD.size
+            self._write_all(self._index, INDEX_RECORD.pack(offset, len(data), bytes.fromhex(digest)))
+        finally:
+            _unlock(self._lock_file)
+        return number, offset
+
+    def close(self):
+        for f in (self._data, self._index, self._lock_file):
+            f.close()
+
+
+class ImagePackReader:
+    """
+    图片包读取器
+
+    以mmap映射数据文件与索引文件，按偏移返回零拷贝的numpy视图，可直接交给cv2.imdecode；
+    写入方仍在追加时，访问超出已映射范围的数据会自动重新映射
+    """
+
+    def __init__(self, pack_dir):
+        self.pack_dir = pack_dir
+        self._data = self._index = None
+        self._data_map = self._index_map = None
+        self.refresh()
+
+    def _map(self, name):
+        f = open(os.path.join(self.pack_dir, name), 'rb')
+        size = os.fstat(f.fileno()).st_size
+        return f, (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b'')
+
+    def refresh(self):
+        """重新映射文件（写入方追加了新数据后调用）"""
+        self.close()
+        self._data, self._data_map = self._map(PACK_FILE)
+        self._index, self._index_map = self._map(INDEX_FILE)
+
+    def __len__(self):
+        return len(self._index_map) // INDEX_RECORD.size
+
+    def record(self, number):
+        """返回第number条索引记录 (偏移, 长度, 内容哈希)"""
+        if number >= len(self):
+            self.refresh()
+        offset, length, digest = INDEX_RECORD.unpack_from(self._index_map, number * INDEX_RECORD.size)
+        return offset, length, digest.hex()
+
+    def read(self, offset, length):
+        """返回数据段中指定范围的只读视图 (numpy uint8数组，不复制)"""
+        if offset + length > len(self._data_map):
+            self.refresh()
+        return np.frombuffer(self._data_map, dtype=np.uint8, count=length, offset=offset)
+
+    def close(self):
+        """关闭映射（此前返回的视图不得再访问）"""
+        for m in (self._data_map, self._index_map):
+            if isinstance(m, mmap.mmap):
+                try:
+                    m.close()
+                except BufferError:  # 仍有视图引用该映射，交给垃圾回收释放
+                    pass
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = self._index = None
+        self._data_map = self._index_map = None
+
+
+# 每个进程每个目录一个写入器/读取器
+_writers = {}
+_readers = {}
+
+
+def pack_writer(pack_dir):
+    """获取当前进程在指定目录下的图片包写入器（按需创建）"""
+    key = (os.getpid(), os.path.abspath(pack_dir))
+    writer = _writers.get(key)
+    if writer is None:
+        writer = _writers[key] = ImagePackWriter(pack_dir)
+    return writer
+
+
+def pack_reader(pack_dir):
+    """获取当前进程在指定目录下的图片包读取器（按需创建）"""
+    key = (os.getpid(), os.path.abspath(pack_dir))
+    reader = _readers.get(key)
+    if reader is None:
+        reader = _readers[key] = ImagePackReader(pack_dir)
+    return reader
+
+
+def reset_pack(pack_dir):
+    """删除指定目录下的图片包（清理只需删除这几个文件）"""
+    path = os.path.abspath(pack_dir)
+    for cache in (_writers, _readers):
+        for key in [k for k in cache if k[1] == path]:
+            cache.pop(key).close()
+    for name in (PACK_FILE, INDEX_FILE, LOCK_FILE):
+        try:
+            os.remove(os.path.join(pack_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def read_entry_bytes(folder_path, entry):
+    """
+    功能: 读取图片清单记录对应的图片字节
+    输入:
+        folder_path: 图片目录
+        entry: utils.image_manifest.ImageEntry
+    输出: numpy uint8数组（图片包中的记录为零拷贝视图）
+    说明: 旧版目录中的单个JPEG文件按偏移与长度读取
+    """
+    if entry.file == PACK_FILE:
+        return pack_reader(folder_path).read(entry.offset, entry.length)
+    return np.fromfile(os.path.join(folder_path, entry.file), dtype=np.uint8,
+                       count=entry.length, offset=entry.offset)
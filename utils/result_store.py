@@ -0,0 +1,142 @@
+import os
+import sqlite3
+#============= 系统自定义模块 =============
+from config.PATH import Result_store
+from utils.columnar import RESULT_COLUMNS, TableWriter
+#=========================================
+
+# SQLite锁等待时间（秒）
+BUSY_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    phone    TEXT PRIMARY KEY,
+    username TEXT NOT NULL DEFAULT '',
+    password TEXT NOT NULL DEFAULT '',
+    name     TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS cards (
+    phone              TEXT PRIMARY KEY,
+    idcard             TEXT NOT NULL DEFAULT '',
+    idcard_validated   INTEGER NOT NULL DEFAULT 0,
+    bankcard           TEXT NOT NULL DEFAULT '',
+    bankcard_validated INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# 网络流敏感信息：同一手机号后出现的非空值覆盖前值（同流内请求的合并规则）
+_UPSERT_SUBJECT = """
+INSERT INTO subjects (phone, username, password, name) VALUES (?, ?, ?, ?)
+ON CONFLICT (phone) DO UPDATE SET
+    username = COALESCE(NULLIF(excluded.username, ''), subjects.username),
+    password = COALESCE(NULLIF(excluded.password, ''), subjects.password),
+    name     = COALESCE(NULLIF(excluded.name, ''), subjects.name)
+"""
+
+
+def _card_update(card_type):
+    """证件号码合并规则（同merge_results）：保留首个有效号码，通过校验的号码替换未通过校验的号码"""
+    replace = (f"excluded.{card_type} != '' AND (cards.{card_type} = '' OR "
+               f"(excluded.{card_type}_validated AND NOT cards.{card_type}_validated))")
+    return (f"{card_type} = CASE WHEN {replace} THEN excluded.{card_type} ELSE cards.{card_type} END, "
+            f"{card_type}_validated = CASE WHEN {replace} "
+            f"THEN excluded.{card_type}_validated ELSE cards.{card_type}_validated END")
+
+
+_UPSERT_CARD = f"""
+INSERT INTO cards (phone, idcard, idcard_validated, bankcard, bankcard_validated)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (phone) DO UPDATE SET {_card_update('idcard')}, {_card_update('bankcard')}
+"""
+
+# 按手机号主键关联（两侧都存在的手机号各输出一行）
+_JOIN = """
+SELECT s.username, s.password, s.name, s.phone,
+       c.idcard, c.bankcard, c.idcard_validated, c.bankcard_validated
+FROM subjects AS s JOIN cards AS c ON c.phone = s.phone
+ORDER BY s.phone
+"""
+
+
+class ResultStore:
+    """
+    分步流程的结果库（SQLite，按手机号建主键索引）
+
+    解析阶段随网络流处理完成写入账号信息，OCR阶段随批次完成写入证件号码，均为按键upsert：
+    重新运行某一阶段只更新涉及的手机号，另一阶段已有的结果保持不变；
+    Step_3按主键流式关联，每个手机号输出一行，不再整表读入pandas合并
+    """
+
+    def __init__(self, path=Result_store):
+        self.path = path
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def upsert_flows(self, infos):
+        """
+        功能: 写入网络流敏感信息
+        输入: infos: 各网络流的敏感信息字典（process_flow的结果），没有手机号的流无法关联，跳过
+        输出: 写入的记录数
+        """
+        rows = [(info['phone'], info.get('username') or '', info.get('password') or '',
+                 info.get('name') or '') for info in infos if info.get('phone')]
+        if rows:
+            conn = self._connection()
+            with conn:
+                conn.executemany(_UPSERT_SUBJECT, rows)
+        return len(rows)
+
+    def upsert_cards(self, items):
+        """
+        功能: 写入OCR识别结果
+        输入: items: 按手机号的识别结果字典（process_batch的结果）
+        输出: 写入的记录数
+        """
+        rows = [(item['phone'], item.get('idcard') or '', int(bool(item.get('idcard_validated'))),
+                 item.get('bankcard') or '', int(bool(item.get('bankcard_validated'))))
+                for item in items if item.get('phone')]
+        if rows:
+            conn = self._connection()
+            with conn:
+                conn.executemany(_UPSERT_CARD, rows)
+        return len(rows)
+
+    def joined_rows(self):
+        """逐行产出关联结果（字段顺序同RESULT_COLUMNS），游标流式读取"""
+        for row in self._connection().execute(_JOIN):
+            yield list(row[:6]) + [bool(row[6]), bool(row[7])]
+
+    def export(self, output_path, output_format=None):
+        """
+        功能: 把关联结果按记录批次导出
+        输入:
+            output_path: 输出路径
+            output_format: 'csv'/'parquet'/'arrow'，None表示按扩展名推断
+        输出: 导出的记录数
+        """
+        with TableWriter(output_path, RESULT_COLUMNS, output_format) as writer:
+            writer.write_rows(self.joined_rows())
+        return writer.rows
+
+    def reset(self):
+        """清空账号信息与证件号码（开始处理新的抓包文件时调用，避免与上一个抓包的结果关联）"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM subjects")
+            conn.execute("DELETE FROM cards")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
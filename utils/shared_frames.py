@@ -0,0 +1,128 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def _attach(name):
+    """
+    以非所有者身份连接已存在的共享内存块
+
+    连接方均为帧池所有者经multiprocessing创建的子进程，与所有者共用同一个resource_tracker，
+    重复登记不会产生额外记录，内存块统一由所有者在close时注销并删除；
+    连接方不能自行注销登记，否则所有者unlink时resource_tracker会报KeyError
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+class FrameChannel:
+    """
+    共享内存帧通道（可跨进程传递的句柄）
+
+    生产者通过put写入图像，消费者通过get取回图像视图；
+    槽位由空闲队列分配，用完后由消费者归还，因此通道天然有界
+    """
+
+    def __init__(self, slot_names, slot_size, free_slots, ready):
+        self.slot_names = slot_names
+        self.slot_size = slot_size
+        self.free_slots = free_slots  # 空闲槽位编号队列
+        self.ready = ready            # 待消费帧描述队列
+        self._blocks = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_blocks'] = {}  # 已连接的内存块不随句柄传递
+        return state
+
+    def _block(self, slot):
+        block = self._blocks.get(slot)
+        if block is None:
+            block = self._blocks[slot] = _attach(self.slot_names[slot])
+        return block
+
+    def put(self, array, meta):
+        """
+        功能: 写入一帧图像（槽位耗尽时阻塞）
+        输入:
+            array: 图像数组
+            meta: 随帧传递的描述信息（需可序列化）
+        说明: 超过槽位大小的图像随描述一起序列化传递
+        """
+        array = np.ascontiguousarray(array)
+        if array.nbytes > self.slot_size:
+            self.ready.put(('inline', array, meta))
+            return
+        slot = self.free_slots.get()
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=self._block(slot).buf)
+        view[...] = array
+        del view
+        self.ready.put(('slot', slot, array.shape, array.dtype.str, meta))
+
+    def get(self, block=True):
+        """
+        功能: 取出一帧图像
+        输入:
+            block: 为False时不等待，没有待消费帧则抛出queue.Empty
+        输出:
+            None（收到结束标记）或 (array, meta, release)
+                array: 图像数组（位于共享内存中的视图）
+                release: 用完后调用以归还槽位，调用后不得再访问array
+        """
+        item = self.ready.get(block)
+        if item is None:
+            return None
+        if item[0] == 'inline':
+            _, array, meta = item
+            return array, meta, lambda: None
+        _, slot, shape, dtype, meta = item
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._block(slot).buf)
+        return array, meta, lambda: self.free_slots.put(slot)
+
+    def close_input(self, consumers):
+        """为每个消费者放入一个结束标记"""
+        for _ in range(consumers):
+            self.ready.put(None)
+
+    def detach(self):
+        """断开本进程对所有内存块的连接"""
+        for block in self._blocks.values():
+            block.close()
+        self._blocks = {}
+
+
+class SharedFramePool:
+    """
+    共享内存帧池（所有者）
+
+    由主进程创建固定数量、固定大小的内存块并在整个生命周期内持有，
+    生产者/消费者只通过FrameChannel连接和归还槽位；
+    Windows下命名共享内存在最后一个句柄关闭时即被回收，固定槽位可避免帧在传递途中失效
+    """
+
+    def __init__(self, manager, num_slots, slot_size):
+        """
+        参数:
+            manager: multiprocessing.Manager实例（队列需可随任务参数传给进程池）
+            num_slots: 槽位数量（即在途帧数上限）
+            slot_size: 单个槽位字节数
+        """
+        self._blocks = [shared_memory.SharedMemory(create=True, size=slot_size)
+                        for _ in range(num_slots)]
+        free_slots = manager.Queue()
+        for slot in range(num_slots):
+            free_slots.put(slot)
+        ready = manager.Queue(maxsize=num_slots * 2)
+        self.channel = FrameChannel([b.name for b in self._blocks], slot_size, free_slots, ready)
+
+    def close(self):
+        """释放全部内存块"""
+        self.channel.detach()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()